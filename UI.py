@@ -2,9 +2,41 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import math
 import os
+import threading
 import time
 from datetime import datetime
 
+from decimal_io import DISPLAY_DIGITS, abbreviate, parse_int, to_decimal
+from dynamic_closest import DynamicClosestPair
+from engine import (DivideConquerEngine, RunCancelled, RunMonitor, detect_algorithm,
+                    parse_integers, read_tokens)
+from point_io import file_preview, load_points
+from point_store import PointMatrix, PointStore, point_dims
+from profiler import RecursionProfile
+from render import PointView, density_ppm
+from replay import EventLog, ReplayState
+from result_cache import ResultCache
+from spatial_index import KDTree
+from subproduct_cache import SubproductCache
+from tracing import DEPTH, FULL, OFF, SUMMARY, Tracer
+
+STEPS_PAGE_SIZE = 500  # Lines shown per page in the Algorithm Steps tab
+TRACE_BUFFER_SIZE = 200000  # Most recent steps kept in memory
+POLL_INTERVAL_MS = 100  # How often the UI checks on a running worker
+RESULT_CHUNK_CHARS = 65536  # Result text inserted per event loop tick
+LOD_POINT_LIMIT = 2000  # Above this many visible points, draw a density image
+RESULT_CACHE_ENTRIES = 64  # Results kept in memory for reruns of the same input
+MAX_TOP_PAIRS = 100  # Upper bound of the top-k pairs control
+POINT_RADIUS = 5  # Radius of a point on the canvas, in pixels
+REPLAY_FRAME_MS = 33  # Time between replay animation frames
+REPLAY_BUDGET_MS = 12  # Time a frame may spend advancing the replay
+REPLAY_CHUNK_STEPS = 4096  # Steps advanced between budget checks
+# Replay speeds, in steps per frame
+REPLAY_SPEEDS = {"1": 1, "10": 10, "100": 100, "1k": 1000, "10k": 10000, "100k": 100000}
+REPLAY_DEPTH_COLORS = ("#ffff00", "#00ff66", "#3399ff", "#cc66ff", "#ff6699")
+# Display names of the multiplication engines
+MULTIPLY_ALGORITHMS = {"toom3": "Toom-Cook-3", "ntt": "Number-Theoretic Transform"}
+
 class DivideConquerVisualizer:
     def __init__(self, root):
         self.root = root
@@ -13,11 +45,32 @@ class DivideConquerVisualizer:
         self.root.configure(bg="#000000")  # Black background
         
         # Track algorithm steps and points
-        self.steps = []
+        self.steps_page = 0
         self.execution_time = 0
         self.comparisons = 0
         self.points = []  # Store points for visualization
         self.closest_pair = None  # Store closest pair
+        self.spatial_index = None  # KD-tree over self.points, built on demand
+        self.top_pairs = []  # (distance, i, j) of the k closest pairs
+        self.dynamic = None  # DynamicClosestPair once points are edited on the canvas
+        self.point_ids = None  # Dynamic ids of self.points, None while ids are indices
+        self.points_dirty = False  # self.points lags behind self.dynamic
+        self.view_state = None  # (width, height, scale) of the last full redraw
+        self.point_view = None  # Cached normalized coordinates for the canvas
+        self.density_image = None  # Keeps the density PhotoImage alive
+        self.engine = DivideConquerEngine()
+        self.worker = None  # Thread running the current algorithm, if any
+        self.worker_outcome = None
+        self.result_job = None
+        self.result_cache = ResultCache(max_entries=RESULT_CACHE_ENTRIES)
+        self.cached_time = None  # Original run time when the result came from the cache
+        self.profile = None  # RecursionProfile of the last profiled run
+        self.integer_text = None  # (text, digits) of the operands and product, built off the Tk thread
+        self.replay = None  # ReplayState over the event log of the last recorded run
+        self.replay_columns = None  # x-sorted (xs, ys) the replay positions refer to
+        self.replay_items = None  # Canvas items of the replay overlay, reused every frame
+        self.replay_job = None  # Pending animation frame while playing
+        self.projection = None  # (PointMatrix, axes) when the canvas shows 2 of d coordinates
         
         self.create_widgets()
         
@@ -57,15 +110,67 @@ class DivideConquerVisualizer:
                           bg="#1a1a1a", fg="#00ffff", selectcolor="#333333",  # Cyan text
                           font=("Arial", 9), activebackground="#1a1a1a").pack(anchor=tk.W, padx=20)
         
+        # Trace Level Selection
+        tk.Label(left_panel, text="Step Trace:", font=("Arial", 10, "bold"),
+                bg="#1a1a1a", fg="#ff9900").pack(pady=5)  # Orange
+        
+        self.trace_level_var = tk.StringVar(value="Full")
+        self.trace_levels = {"Off": OFF, "Summary": SUMMARY, "Per-depth": DEPTH, "Full": FULL}
+        trace_menu = tk.OptionMenu(left_panel, self.trace_level_var, *self.trace_levels)
+        trace_menu.config(bg="#333333", fg="#00ffff", activebackground="#333333",
+                         highlightthickness=0, font=("Arial", 9))
+        trace_menu.pack(padx=20, fill=tk.X)
+        
+        depth_frame = tk.Frame(left_panel, bg="#1a1a1a")
+        depth_frame.pack(padx=20, fill=tk.X)
+        tk.Label(depth_frame, text="Max depth:", bg="#1a1a1a", fg="#00ffff",
+                font=("Arial", 9)).pack(side=tk.LEFT)
+        self.trace_depth_var = tk.IntVar(value=3)
+        tk.Spinbox(depth_frame, from_=0, to=64, width=4, textvariable=self.trace_depth_var,
+                  bg="#333333", fg="#ffffff", buttonbackground="#333333").pack(side=tk.LEFT, padx=5)
+        
+        self.trace_file_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(left_panel, text="Stream trace to file", variable=self.trace_file_var,
+                      bg="#1a1a1a", fg="#00ffff", selectcolor="#333333",
+                      font=("Arial", 9), activebackground="#1a1a1a").pack(anchor=tk.W, padx=20)
+        
+        self.cache_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(left_panel, text="Reuse cached results", variable=self.cache_var,
+                      bg="#1a1a1a", fg="#00ffff", selectcolor="#333333",
+                      font=("Arial", 9), activebackground="#1a1a1a").pack(anchor=tk.W, padx=20)
+        
+        self.profile_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(left_panel, text="Profile recursion levels", variable=self.profile_var,
+                      bg="#1a1a1a", fg="#00ffff", selectcolor="#333333",
+                      font=("Arial", 9), activebackground="#1a1a1a").pack(anchor=tk.W, padx=20)
+        
+        self.replay_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(left_panel, text="Record replay", variable=self.replay_var,
+                      bg="#1a1a1a", fg="#00ffff", selectcolor="#333333",
+                      font=("Arial", 9), activebackground="#1a1a1a").pack(anchor=tk.W, padx=20)
+        
+        self.memo_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(left_panel, text="Memoize sub-products", variable=self.memo_var,
+                      bg="#1a1a1a", fg="#00ffff", selectcolor="#333333",
+                      font=("Arial", 9), activebackground="#1a1a1a").pack(anchor=tk.W, padx=20)
+        
         # File Selection Button
         tk.Button(left_panel, text="📁 Select Input File", command=self.select_file,
                  bg="#0066cc", fg="white", font=("Arial", 11, "bold"),  # Blue button
                  padx=20, pady=10, relief=tk.RAISED, bd=3, activebackground="#004499").pack(pady=15)
         
         # Run Button
-        tk.Button(left_panel, text="▶ Run Algorithm", command=self.run_algorithm,
+        self.run_button = tk.Button(left_panel, text="▶ Run Algorithm", command=self.run_algorithm,
                  bg="#00aa00", fg="white", font=("Arial", 11, "bold"),  # Green button
-                 padx=20, pady=10, relief=tk.RAISED, bd=3, activebackground="#008800").pack(pady=5)
+                 padx=20, pady=10, relief=tk.RAISED, bd=3, activebackground="#008800")
+        self.run_button.pack(pady=5)
+        
+        # Cancel Button, only active while a run is in progress
+        self.cancel_button = tk.Button(left_panel, text="⏹ Cancel", command=self.cancel_algorithm,
+                 bg="#aa6600", fg="white", font=("Arial", 11, "bold"),  # Amber button
+                 padx=20, pady=10, relief=tk.RAISED, bd=3, activebackground="#884400",
+                 state=tk.DISABLED)
+        self.cancel_button.pack(pady=5)
         
         # Clear Button
         tk.Button(left_panel, text="🗑 Clear Results", command=self.clear_results,
@@ -117,6 +222,19 @@ class DivideConquerVisualizer:
         steps_frame = tk.Frame(self.notebook, bg="#000000")
         self.notebook.add(steps_frame, text="📝 Algorithm Steps")
         
+        # Paging controls, only one page of the trace is inserted at a time
+        steps_control_frame = tk.Frame(steps_frame, bg="#000000")
+        steps_control_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        tk.Button(steps_control_frame, text="◀ Prev", command=lambda: self.show_steps_page(self.steps_page - 1),
+                 bg="#333333", fg="#ffffff", font=("Arial", 9)).pack(side=tk.LEFT, padx=5)
+        tk.Button(steps_control_frame, text="Next ▶", command=lambda: self.show_steps_page(self.steps_page + 1),
+                 bg="#333333", fg="#ffffff", font=("Arial", 9)).pack(side=tk.LEFT, padx=5)
+        
+        self.steps_page_label = tk.Label(steps_control_frame, text="", bg="#000000",
+                                        fg="#ffffff", font=("Arial", 9))
+        self.steps_page_label.pack(side=tk.LEFT, padx=10)
+        
         self.steps_text = tk.Text(steps_frame, height=20, width=70,
                                  font=("Consolas", 9), bg="#1a1a1a", fg="#ff9900",  # Orange text
                                  relief=tk.SUNKEN, bd=2)
@@ -155,10 +273,70 @@ class DivideConquerVisualizer:
                 variable=self.viz_scale, label="Zoom:", bg="#000000", fg="#ffffff",
                 troughcolor="#333333", command=self.update_visualization).pack(side=tk.LEFT, padx=20)
         
+        tk.Label(viz_control_frame, text="Top-k pairs:", bg="#000000", fg="#ffffff",
+                font=("Arial", 9)).pack(side=tk.LEFT)
+        self.top_k_var = tk.IntVar(value=0)
+        tk.Spinbox(viz_control_frame, from_=0, to=MAX_TOP_PAIRS, width=4, textvariable=self.top_k_var,
+                  command=self.update_top_pairs, bg="#333333", fg="#ffffff",
+                  buttonbackground="#333333").pack(side=tk.LEFT, padx=5)
+        
+        tk.Label(viz_control_frame, text="Click: add point | Right-click: remove point",
+                bg="#000000", fg="#999999", font=("Arial", 8)).pack(side=tk.LEFT, padx=20)
+        
+        # Replay controls
+        replay_frame = tk.Frame(visualization_frame, bg="#000000")
+        replay_frame.pack(fill=tk.X, padx=5)
+        
+        self.replay_button = tk.Button(replay_frame, text="▶ Play", command=self.toggle_replay,
+                                      bg="#333333", fg="#ffffff", font=("Arial", 9), width=8)
+        self.replay_button.pack(side=tk.LEFT, padx=5)
+        
+        self.replay_seek = tk.Scale(replay_frame, from_=0, to=0, orient=tk.HORIZONTAL, showvalue=0,
+                                   length=300, bg="#000000", fg="#ffffff", troughcolor="#333333",
+                                   highlightthickness=0, command=self.seek_replay)
+        self.replay_seek.pack(side=tk.LEFT, padx=5)
+        
+        tk.Label(replay_frame, text="Steps/frame:", bg="#000000", fg="#ffffff",
+                font=("Arial", 9)).pack(side=tk.LEFT)
+        self.replay_speed_var = tk.StringVar(value="100")
+        speed_menu = tk.OptionMenu(replay_frame, self.replay_speed_var, *REPLAY_SPEEDS)
+        speed_menu.config(bg="#333333", fg="#ffffff", activebackground="#333333",
+                         highlightthickness=0, font=("Arial", 9))
+        speed_menu.pack(side=tk.LEFT, padx=5)
+        
+        self.replay_label = tk.Label(replay_frame, text="No replay recorded", bg="#000000",
+                                    fg="#999999", font=("Arial", 9), anchor=tk.W)
+        self.replay_label.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=10)
+        
         # Canvas for visualization
         self.canvas = tk.Canvas(visualization_frame, bg="#000000", highlightthickness=1,
                                highlightbackground="#333333")
         self.canvas.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.canvas.bind("<Button-1>", self.insert_point_at)
+        self.canvas.bind("<Button-3>", self.delete_point_at)
+        
+        # Profile Tab
+        profile_frame = tk.Frame(self.notebook, bg="#000000")
+        self.notebook.add(profile_frame, text="⏱ Profile")
+        
+        profile_control_frame = tk.Frame(profile_frame, bg="#000000")
+        profile_control_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        tk.Button(profile_control_frame, text="Export Chrome Trace", command=self.export_profile,
+                 bg="#333333", fg="#ffffff", font=("Arial", 9)).pack(side=tk.LEFT, padx=5)
+        
+        self.profile_label = tk.Label(profile_control_frame, text="Profiling is off", bg="#000000",
+                                     fg="#ffffff", font=("Arial", 9))
+        self.profile_label.pack(side=tk.LEFT, padx=10)
+        
+        self.profile_text = tk.Text(profile_frame, height=20, width=70,
+                                   font=("Consolas", 9), bg="#1a1a1a", fg="#00ff00",
+                                   relief=tk.SUNKEN, bd=2)
+        self.profile_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        profile_scroll = tk.Scrollbar(profile_frame, command=self.profile_text.yview)
+        profile_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.profile_text.config(yscrollcommand=profile_scroll.set)
         
         # Status Bar
         self.status_bar = tk.Label(self.root, text="Ready", relief=tk.SUNKEN,
@@ -171,7 +349,7 @@ class DivideConquerVisualizer:
     def select_file(self):
         file_path = filedialog.askopenfilename(
             title="Select Input File",
-            filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")]
+            filetypes=[("Text Files", "*.txt"), ("Binary Points", "*.pts"), ("All Files", "*.*")]
         )
         
         if not file_path:
@@ -180,179 +358,421 @@ class DivideConquerVisualizer:
         self.current_file = file_path
         self.status_bar.config(text=f"Loaded: {os.path.basename(file_path)}")
         
-        # Display input data
-        with open(file_path, 'r') as f:
-            data = f.read()
+        # Display a bounded preview of the input data
+        preview, size, count = file_preview(file_path)
         
         self.input_text.delete("1.0", tk.END)
         self.input_text.insert(tk.END, f"File: {os.path.basename(file_path)}\n")
+        self.input_text.insert(tk.END, f"Size: {size:,} bytes\n")
+        if detect_algorithm(file_path) != "integer":
+            self.input_text.insert(tk.END, f"Points: {count:,}\n")
         self.input_text.insert(tk.END, f"{'='*60}\n\n")
-        self.input_text.insert(tk.END, data)
+        self.input_text.insert(tk.END, preview)
+        if len(preview) < size:
+            self.input_text.insert(tk.END, "\n... (preview only, rest of file not shown)\n")
         
         messagebox.showinfo("Success", f"File loaded successfully!\n{os.path.basename(file_path)}")
     
     def clear_results(self):
+        if self.worker is not None:
+            return
+        if self.result_job is not None:
+            self.root.after_cancel(self.result_job)
+            self.result_job = None
         self.result_text.delete("1.0", tk.END)
         self.steps_text.delete("1.0", tk.END)
         self.input_text.delete("1.0", tk.END)
         self.stats_label.config(text="No data loaded")
         self.status_bar.config(text="Ready")
-        self.steps = []
+        self.engine.reset()
+        self.steps_page = 0
+        self.steps_page_label.config(text="")
+        self.profile = None
+        self.profile_text.delete("1.0", tk.END)
+        self.profile_label.config(text="Profiling is off")
+        self.set_replay(None)
         self.points = []
+        self.point_view = None
         self.closest_pair = None
+        self.spatial_index = None
+        self.top_pairs = []
+        self.dynamic = None
+        self.point_ids = None
+        self.points_dirty = False
+        self.projection = None
         self.canvas.delete("all")
         
     def run_algorithm(self):
+        if self.worker is not None:
+            return
         if not self.current_file:
             messagebox.showerror("Error", "Please select an input file first!")
             return
         
-        self.steps = []
+        # Detect algorithm type
+        algo_type = self.algo_var.get()
+        if algo_type == "auto":
+            algo_type = detect_algorithm(self.current_file)
+            if algo_type is None:
+                messagebox.showerror("Error", "Cannot auto-detect algorithm. Please select manually.")
+                return
+        
         self.comparisons = 0
         self.points = []
+        self.point_view = None
         self.closest_pair = None
-        
+        self.spatial_index = None
+        self.top_pairs = []
+        self.dynamic = None
+        self.point_ids = None
+        self.points_dirty = False
+        self.projection = None
+        self.engine.tracer.close()
+        self.engine.tracer = self.create_tracer()
+        self.engine.reset()
+        self.engine.monitor = RunMonitor()
+        self.profile = RecursionProfile() if self.profile_var.get() else None
+        self.engine.profile = self.profile
+        self.set_replay(None)
+        self.engine.events = EventLog() if self.replay_var.get() else None
+        # A fresh memo per run, so the recursion is never served whole from an earlier one
+        self.engine.memo = SubproductCache() if self.memo_var.get() else None
+        
+        # The computation runs on a worker thread; poll_worker picks up the
+        # outcome on the Tk main loop
+        self.worker_outcome = None
+        self.cached_time = None
+        # Profiled and recorded runs always recompute, a cache hit has no
+        # timings or events to show
+        use_cache = self.cache_var.get() and self.profile is None and self.engine.events is None
+        top_k = self.top_k_var.get()
+        self.worker = threading.Thread(target=self.run_worker, args=(algo_type, use_cache, top_k),
+                                       daemon=True)
+        self.run_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status_bar.config(text=f"Running: {algo_type}...")
+        self.worker.start()
+        self.root.after(POLL_INTERVAL_MS, self.poll_worker)
+    
+    def run_worker(self, algo_type, use_cache, top_k):
         try:
-            with open(self.current_file, 'r') as f:
-                data = f.read().strip().split()
-            
-            # Detect algorithm type
-            algo_type = self.algo_var.get()
-            if algo_type == "auto":
-                if "closest" in self.current_file.lower():
-                    algo_type = "closest"
-                elif "integer" in self.current_file.lower():
-                    algo_type = "integer"
-                else:
-                    messagebox.showerror("Error", "Cannot auto-detect algorithm. Please select manually.")
-                    return
-            
-            start_time = time.time()
+            # Results are keyed on the file contents, so a renamed copy still hits
+            key = self.result_cache.key(self.current_file, algo_type) if use_cache else None
+            cached = self.result_cache.get(key) if key else None
             
             if algo_type == "closest":
-                self.run_closest_pair(data)
-                # Switch to visualization tab after running closest pair
-                self.notebook.select(3)  # Index 3 is the visualization tab
-                self.update_visualization()
-            elif algo_type == "integer":
-                self.run_integer_multiplication(data)
+                data = load_points(self.current_file)
+                data_size = point_dims(data) * len(data)
+            else:
+                data = read_tokens(self.current_file)
+                data_size = len(data)
             
-            self.execution_time = (time.time() - start_time) * 1000  # Convert to ms
+            start_time = time.perf_counter()
             
-            # Update statistics
-            self.update_statistics(algo_type, len(data))
+            if cached is not None:
+                output = self.use_cached_result(algo_type, data, cached)
+            elif algo_type == "closest":
+                output = self.run_closest_pair(data)
+            else:
+                output = self.run_integer_multiplication(data)
             
+            self.execution_time = (time.perf_counter() - start_time) * 1000  # Convert to ms
+            if key and cached is None:
+                self.result_cache.put(key, self.cache_record(algo_type, data_size, output))
+            if algo_type != "closest":
+                self.integer_text = self.describe_integers(*output)
+            if algo_type == "closest" and top_k > 0 and self.projection is None:
+                self.find_top_pairs(top_k)
+            self.worker_outcome = ("done", algo_type, data_size, output)
+        except RunCancelled:
+            self.worker_outcome = ("cancelled",)
         except Exception as e:
-            messagebox.showerror("Error", f"An error occurred:\n{str(e)}")
-            self.status_bar.config(text=f"Error: {str(e)}")
+            self.worker_outcome = ("error", e)
+        finally:
+            self.engine.tracer.close()
+    
+    def cache_record(self, algo_type, data_size, output):
+        # Same fields as engine.run_file, so batch and UI cache entries match
+        record = {"data_size": data_size, "engine": self.engine.last_engine,
+                  "operations": self.comparisons, "time_ms": self.execution_time}
+        if algo_type == "closest":
+            dist, pair = output
+            record["points"] = len(self.points)
+            record["dims"] = self.projection[0].dims if self.projection else 2
+            record["pair"] = [list(pair[0]), list(pair[1])] if pair else None
+            record["indices"] = list(self.engine.last_pair_indices) if pair else None
+            record["distance"] = dist
+        else:
+            x, y, product, expected = output
+            record["product"] = to_decimal(product)
+            record["correct"] = product == expected
+            record["multiply_stats"] = self.engine.multiply_stats
+        return record
+    
+    def find_top_pairs(self, k):
+        # The index is built once per point set; later queries reuse it
+        if self.spatial_index is None:
+            self.spatial_index = KDTree(self.points)
+        self.top_pairs = self.spatial_index.closest_pairs(k)
+    
+    def update_top_pairs(self):
+        if self.worker is not None or len(self.points) == 0:
+            return
+        if self.projection is not None:
+            self.status_bar.config(text="Top-k pairs are found in 2-D only")
+            return
+        try:
+            k = self.top_k_var.get()
+        except tk.TclError:
+            return
+        self.sync_points()
+        self.status_bar.config(text=f"Finding the {k} closest pairs...")
+        self.root.update_idletasks()
+        self.find_top_pairs(k)
+        self.status_bar.config(text=f"Top {len(self.top_pairs)} pairs highlighted")
+        self.update_visualization()
+    
+    def use_cached_result(self, algo_type, data, cached):
+        # Runs on the worker thread; rebuilds the run_* return value from a cache hit
+        self.comparisons = cached["operations"]
+        self.cached_time = cached["time_ms"]
+        self.engine.last_engine = cached["engine"]
+        if algo_type == "closest":
+            self.set_points(data)
+            pair = tuple(tuple(p) for p in cached["pair"]) if cached["pair"] else None
+            self.engine.last_pair_indices = tuple(cached["indices"]) if pair else None
+            self.closest_pair = self.canvas_pair(pair)
+            return cached["distance"], pair
+        self.engine.multiply_stats = cached.get("multiply_stats", {})
+        x, y = parse_integers(data)
+        product = parse_int(cached["product"])
+        # The product was checked against x * y when it was cached
+        return x, y, product, product if cached["correct"] else None
     
-    def run_closest_pair(self, data):
-        self.points = [(float(data[i]), float(data[i + 1])) for i in range(0, len(data), 2)]
-        points_sorted = sorted(self.points, key=lambda x: x[0])
+    def cancel_algorithm(self):
+        if self.worker is not None and self.engine.monitor is not None:
+            self.engine.monitor.cancel()
+            self.status_bar.config(text="Cancelling...")
+    
+    def poll_worker(self):
+        monitor = self.engine.monitor
+        if self.worker.is_alive():
+            if not monitor.cancelled:
+                progress = f"Running... depth {monitor.depth_reached}"
+                if monitor.points_done:
+                    progress += f" | points processed: {monitor.points_done}"
+                if monitor.subproducts_done:
+                    progress += f" | subproducts done: {monitor.subproducts_done}"
+                self.status_bar.config(text=progress)
+            self.root.after(POLL_INTERVAL_MS, self.poll_worker)
+            return
         
-        self.steps.append("="*60)
-        self.steps.append("CLOSEST PAIR OF POINTS ALGORITHM")
-        self.steps.append("="*60)
-        self.steps.append(f"\nInput: {len(points_sorted)} points")
-        self.steps.append(f"Points (sorted by x-coordinate):")
-        for i, p in enumerate(points_sorted[:10]):  # Show first 10
-            self.steps.append(f"  {i+1}. ({p[0]:.2f}, {p[1]:.2f})")
-        if len(points_sorted) > 10:
-            self.steps.append(f"  ... and {len(points_sorted)-10} more points")
+        self.worker = None
+        self.engine.monitor = None
+        self.run_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        
+        outcome = self.worker_outcome
+        if outcome[0] == "cancelled":
+            self.points = []
+            self.point_view = None
+            self.closest_pair = None
+            self.spatial_index = None
+            self.top_pairs = []
+            self.dynamic = None
+            self.point_ids = None
+            self.points_dirty = False
+            self.projection = None
+            self.status_bar.config(text="Cancelled")
+            return
+        if outcome[0] == "error":
+            e = outcome[1]
+            messagebox.showerror("Error", f"An error occurred:\n{str(e)}")
+            self.status_bar.config(text=f"Error: {str(e)}")
+            return
         
-        dist, pair = self.closest_pair_recursive(points_sorted, 0)
-        self.closest_pair = pair
+        _, algo_type, data_size, output = outcome
+        if algo_type == "closest":
+            # The d-dimensional engine records no recursion
+            self.set_replay(self.engine.events if self.projection is None else None)
+            self.show_closest_pair_results(*output)
+            # Switch to visualization tab after running closest pair
+            self.notebook.select(3)  # Index 3 is the visualization tab
+            self.update_visualization()
+        else:
+            self.show_integer_results(*output)
+        self.show_profile()
         
-        # Display results
+        # Update statistics
+        self.update_statistics(algo_type, data_size)
+    
+    def insert_results(self, out):
+        # Very large results (e.g. huge products) are inserted a chunk per
+        # event loop tick so the window keeps repainting
+        if self.result_job is not None:
+            self.root.after_cancel(self.result_job)
         self.result_text.delete("1.0", tk.END)
-        self.result_text.insert(tk.END, "╔" + "═"*58 + "╗\n")
-        self.result_text.insert(tk.END, "║  CLOSEST PAIR OF POINTS - RESULTS" + " "*23 + "║\n")
-        self.result_text.insert(tk.END, "╚" + "═"*58 + "╝\n\n")
-        
-        self.result_text.insert(tk.END, f"File: {os.path.basename(self.current_file)}\n")
-        self.result_text.insert(tk.END, f"Algorithm: Divide & Conquer\n")
-        self.result_text.insert(tk.END, f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        self.result_text.insert(tk.END, "─"*60 + "\n\n")
-        
-        self.result_text.insert(tk.END, f"Total Points Analyzed: {len(points_sorted)}\n")
-        self.result_text.insert(tk.END, f"Comparisons Made: {self.comparisons}\n")
-        self.result_text.insert(tk.END, f"Execution Time: {self.execution_time:.4f} ms\n\n")
-        self.result_text.insert(tk.END, "─"*60 + "\n\n")
-        
-        self.result_text.insert(tk.END, "🎯 CLOSEST PAIR FOUND:\n\n")
-        self.result_text.insert(tk.END, f"  Point 1: ({pair[0][0]:.6f}, {pair[0][1]:.6f})\n")
-        self.result_text.insert(tk.END, f"  Point 2: ({pair[1][0]:.6f}, {pair[1][1]:.6f})\n\n")
-        self.result_text.insert(tk.END, f"  Distance: {dist:.8f}\n\n")
-        self.result_text.insert(tk.END, "─"*60 + "\n\n")
+        pieces = (text[i:i + RESULT_CHUNK_CHARS]
+                  for text in out for i in range(0, max(len(text), 1), RESULT_CHUNK_CHARS))
+        self.result_job = self.root.after_idle(self.insert_result_chunk, pieces)
+    
+    def insert_result_chunk(self, pieces):
+        inserted = 0
+        for piece in pieces:
+            self.result_text.insert(tk.END, piece)
+            inserted += len(piece)
+            if inserted >= RESULT_CHUNK_CHARS:
+                self.result_job = self.root.after(1, self.insert_result_chunk, pieces)
+                return
+        self.result_job = None
+    
+    def run_closest_pair(self, points):
+        # Runs on the worker thread, so no widget access in here
+        self.set_points(points)
+        
+        dist, pair = self.engine.closest_pair(points)
+        self.comparisons = self.engine.comparisons
+        self.closest_pair = self.canvas_pair(pair)
+        return dist, pair
+    
+    def set_points(self, points):
+        # Points of more than two coordinates are drawn by their two widest
+        # ones; the results still show the full points
+        if point_dims(points) > 2:
+            matrix = PointMatrix.from_points(points)
+            axes = matrix.widest_axes()
+            self.projection = (matrix, axes)
+            self.points = matrix.projection(axes)
+        else:
+            self.points = points
+    
+    def canvas_pair(self, pair):
+        # The closest pair as drawn: its projection when points have more coordinates
+        if pair is None or self.projection is None:
+            return pair
+        i, j = self.engine.last_pair_indices
+        return self.points[i], self.points[j]
+    
+    def show_closest_pair_results(self, dist, pair):
+        # Display results
+        out = []
+        out.append("╔" + "═"*58 + "╗\n")
+        out.append("║  CLOSEST PAIR OF POINTS - RESULTS" + " "*23 + "║\n")
+        out.append("╚" + "═"*58 + "╝\n\n")
+        
+        out.append(f"File: {os.path.basename(self.current_file)}\n")
+        out.append(f"Algorithm: Divide & Conquer\n")
+        out.append(f"Engine: {self.engine.last_engine}\n")
+        out.append(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        out.append("─"*60 + "\n\n")
+        
+        out.append(f"Total Points Analyzed: {len(self.points)}\n")
+        if self.projection is not None:
+            matrix, axes = self.projection
+            out.append(f"Dimensions: {matrix.dims} (canvas shows coordinates "
+                       f"{axes[0] + 1} and {axes[1] + 1})\n")
+            out.append(f"Point Storage: {matrix.nbytes / 1e6:.1f} MB ({matrix.dims} coordinates per point)\n")
+        elif isinstance(self.points, PointStore):
+            out.append(f"Point Storage: {self.points.nbytes / 1e6:.1f} MB (x/y columns + x-order)\n")
+        out.append(f"Comparisons Made: {self.comparisons}\n")
+        out.append(f"Execution Time: {self.execution_time:.4f} ms\n")
+        out.append(self.cached_line() + "\n")
+        out.append("─"*60 + "\n\n")
+        
+        if pair is None:
+            out.append("No closest pair: the file holds fewer than two points.\n")
+            self.insert_results(out)
+            self.show_steps_page(0)
+            self.status_bar.config(text="Completed: Closest Pair | fewer than two points")
+            return
+
+        out.append("🎯 CLOSEST PAIR FOUND:\n\n")
+        i, j = self.engine.last_pair_indices
+        p1, p2 = (", ".join(f"{c:.6f}" for c in p) for p in pair)
+        out.append(f"  Point 1: ({p1})  P{i+1} in the input\n")
+        out.append(f"  Point 2: ({p2})  P{j+1} in the input\n\n")
+        out.append(f"  Distance: {dist:.8f}\n\n")
+        out.append("─"*60 + "\n\n")
+
+        if self.top_pairs:
+            out.append(f"TOP {len(self.top_pairs)} CLOSEST PAIRS:\n\n")
+            for rank, (d, i, j) in enumerate(self.top_pairs, start=1):
+                out.append(f"  #{rank}: P{i+1} - P{j+1}  distance {d:.8f}\n")
+            out.append("\n" + "─"*60 + "\n\n")
+
+        out.append("✓ Algorithm completed successfully!\n")
         
-        self.result_text.insert(tk.END, "✓ Algorithm completed successfully!\n")
+        self.insert_results(out)
         
         # Display steps
-        self.steps_text.delete("1.0", tk.END)
-        self.steps_text.insert(tk.END, "\n".join(self.steps))
+        self.show_steps_page(0)
         
         self.status_bar.config(text=f"Completed: Closest Pair | Distance: {dist:.4f}")
     
-    def closest_pair_recursive(self, points, depth):
-        indent = "  " * depth
-        
-        if len(points) <= 3:
-            self.steps.append(f"\n{indent}Base case: {len(points)} points - using brute force")
-            dist, pair = self.brute_force_closest(points)
-            self.steps.append(f"{indent}  → Minimum distance: {dist:.4f}")
-            return dist, pair
-        
-        mid = len(points) // 2
-        self.steps.append(f"\n{indent}Dividing {len(points)} points at index {mid}")
-        self.steps.append(f"{indent}  Left: {len(points[:mid])} points")
-        self.steps.append(f"{indent}  Right: {len(points[mid:])} points")
-        
-        dleft, pair_left = self.closest_pair_recursive(points[:mid], depth + 1)
-        dright, pair_right = self.closest_pair_recursive(points[mid:], depth + 1)
-        
-        d = min(dleft, dright)
-        best_pair = pair_left if dleft < dright else pair_right
-        
-        self.steps.append(f"{indent}Merging: min({dleft:.4f}, {dright:.4f}) = {d:.4f}")
-        
-        # Check strip
-        mid_x = points[mid][0]
-        strip = [p for p in points if abs(p[0] - mid_x) < d]
-        strip.sort(key=lambda x: x[1])
-        
-        self.steps.append(f"{indent}Checking strip: {len(strip)} points within distance {d:.4f}")
-        
-        for i in range(len(strip)):
-            for j in range(i + 1, min(i + 7, len(strip))):
-                dist = self.distance(strip[i], strip[j])
-                self.comparisons += 1
-                if dist < d:
-                    d = dist
-                    best_pair = (strip[i], strip[j])
-                    self.steps.append(f"{indent}  ✓ New minimum found: {d:.4f}")
-        
-        return d, best_pair
-    
-    def brute_force_closest(self, points):
-        min_dist = float('inf')
-        pair = None
-        for i in range(len(points)):
-            for j in range(i + 1, len(points)):
-                d = self.distance(points[i], points[j])
-                self.comparisons += 1
-                if d < min_dist:
-                    min_dist = d
-                    pair = (points[i], points[j])
-        return min_dist, pair
-    
-    def distance(self, p1, p2):
-        return math.sqrt((p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2)
+    def cached_line(self):
+        if self.cached_time is None:
+            return "Cached: no\n"
+        return f"Cached: yes (original run {self.cached_time:.4f} ms, no steps recorded)\n"
+    
+    def show_profile(self):
+        self.profile_text.delete("1.0", tk.END)
+        profile = self.profile
+        if profile is None:
+            self.profile_label.config(text="Profiling is off")
+            return
+        if not profile.levels:
+            # Grid, parallel and builtin engines have no recursion to profile
+            self.profile_label.config(text=f"No recursion levels recorded ({self.engine.last_engine} engine)")
+            return
+        calls = sum(level.calls for level in profile.levels.values())
+        self.profile_label.config(text=f"{len(profile.levels)} levels, {calls} calls")
+        self.profile_text.insert(tk.END, profile.format_table())
+        if profile.dropped:
+            self.profile_text.insert(tk.END, f"\n\n{profile.dropped} nodes not kept for the trace export\n")
+    
+    def export_profile(self):
+        if self.profile is None or not self.profile.events:
+            messagebox.showinfo("Profile", "Run an algorithm with profiling on first.")
+            return
+        file_path = filedialog.asksaveasfilename(
+            title="Export Chrome Trace",
+            defaultextension=".json",
+            filetypes=[("Trace event files", "*.json"), ("All files", "*.*")]
+        )
+        if file_path:
+            self.profile.save_chrome_trace(file_path)
+            self.status_bar.config(text=f"Trace exported: {os.path.basename(file_path)}")
+    
+    def create_tracer(self):
+        level = self.trace_levels[self.trace_level_var.get()]
+        stream_path = None
+        if self.trace_file_var.get() and level != OFF:
+            stream_path = os.path.splitext(self.current_file)[0] + ".trace.txt"
+        return Tracer(level, max_depth=self.trace_depth_var.get(),
+                      buffer_size=TRACE_BUFFER_SIZE, stream_path=stream_path)
+    
+    def show_steps_page(self, page):
+        tracer = self.engine.tracer
+        pages = max(1, -(-len(tracer) // STEPS_PAGE_SIZE))
+        self.steps_page = min(max(page, 0), pages - 1)
+        
+        self.steps_text.delete("1.0", tk.END)
+        if tracer.dropped:
+            self.steps_text.insert(tk.END, f"... {tracer.dropped} earlier steps not kept in memory\n")
+        self.steps_text.insert(tk.END, "\n".join(tracer.lines(self.steps_page * STEPS_PAGE_SIZE, STEPS_PAGE_SIZE)))
+        
+        label = f"Page {self.steps_page + 1} of {pages} ({tracer.total} steps)"
+        if tracer.level == OFF:
+            label = "Tracing is off"
+        self.steps_page_label.config(text=label)
     
     def update_visualization(self, event=None):
         """Update the visualization canvas with points and connections"""
         self.canvas.delete("all")
         
-        if not self.points:
+        self.sync_points()
+        
+        if len(self.points) == 0:
             # Show message when no points
             self.canvas.create_text(300, 200, 
                                    text="No points to visualize.\nRun Closest Pair algorithm first.",
@@ -366,32 +786,25 @@ class DivideConquerVisualizer:
         if canvas_width <= 1 or canvas_height <= 1:
             canvas_width, canvas_height = 600, 400
         
-        # Find bounds of points
-        xs = [p[0] for p in self.points]
-        ys = [p[1] for p in self.points]
-        
-        min_x, max_x = min(xs), max(xs)
-        min_y, max_y = min(ys), max(ys)
-        
-        # Add some padding
-        range_x = max_x - min_x
-        range_y = max_y - min_y
-        
-        if range_x == 0:
-            range_x = 1
-        if range_y == 0:
-            range_y = 1
-        
-        padding = 0.1
-        min_x -= range_x * padding
-        max_x += range_x * padding
-        min_y -= range_y * padding
-        max_y += range_y * padding
-        range_x = max_x - min_x
-        range_y = max_y - min_y
+        # Normalized coordinates are computed once per point set and reused
+        # for every zoom change
+        if self.point_view is None or self.point_view.points is not self.points:
+            self.point_view = PointView(self.points)
+        view = self.point_view
         
         # Apply zoom scale
         scale = self.viz_scale.get()
+        self.view_state = (canvas_width, canvas_height, scale)
+        
+        # Only points inside the canvas are drawn
+        indices, vis_x, vis_y = view.visible(canvas_width, canvas_height, scale)
+        
+        # Too many points for canvas items: draw a density image instead
+        self.density_image = None
+        if len(indices) > LOD_POINT_LIMIT:
+            ppm = density_ppm(vis_x, vis_y, canvas_width, canvas_height)
+            self.density_image = tk.PhotoImage(data=ppm, format="PPM")
+            self.canvas.create_image(0, 0, image=self.density_image, anchor="nw")
         
         # Draw grid
         grid_color = "#333333"
@@ -407,65 +820,33 @@ class DivideConquerVisualizer:
         self.canvas.create_line(canvas_width/2, 0, canvas_width/2, canvas_height, 
                                fill="#666666", width=2)  # Y-axis
         
-        # Scale points to fit canvas
-        def scale_point(x, y):
-            scaled_x = ((x - min_x) / range_x) * canvas_width * scale
-            scaled_y = canvas_height - ((y - min_y) / range_y) * canvas_height * scale
-            # Center the points
-            offset_x = (canvas_width - (canvas_width * scale)) / 2
-            offset_y = (canvas_height - (canvas_height * scale)) / 2
-            return scaled_x + offset_x, scaled_y + offset_y
-        
-        # Draw all points
-        point_radius = 5
-        for i, (x, y) in enumerate(self.points):
-            sx, sy = scale_point(x, y)
-            
-            # Check if this point is part of the closest pair
-            is_closest = False
-            if self.closest_pair:
-                if (abs(x - self.closest_pair[0][0]) < 0.0001 and abs(y - self.closest_pair[0][1]) < 0.0001) or \
-                   (abs(x - self.closest_pair[1][0]) < 0.0001 and abs(y - self.closest_pair[1][1]) < 0.0001):
-                    is_closest = True
-            
-            if is_closest:
-                # Draw closest pair points in red with glow effect
-                self.canvas.create_oval(sx - point_radius*2, sy - point_radius*2,
-                                       sx + point_radius*2, sy + point_radius*2,
-                                       fill="#ff0000", outline="#ff6666", width=3)
-                self.canvas.create_text(sx, sy - 15, text=f"({x:.1f},{y:.1f})",
-                                       fill="#ff6666", font=("Arial", 8, "bold"))
-            else:
-                # Draw regular points in cyan
+        # Draw visible points at full detail in cyan
+        point_radius = POINT_RADIUS
+        if self.density_image is None:
+            ids = self.point_ids
+            for i, sx, sy in zip(indices, vis_x, vis_y):
+                self.draw_point(i if ids is None else ids[i], sx, sy, label=view.count <= 20)
+        
+        # Draw the top-k pairs (beyond the closest one) in magenta
+        index = self.spatial_index
+        for rank, (dist, i, j) in enumerate(self.top_pairs[1:], start=2):
+            sx1, sy1 = view.scale_point(index.xs[i], index.ys[i], canvas_width, canvas_height, scale)
+            sx2, sy2 = view.scale_point(index.xs[j], index.ys[j], canvas_width, canvas_height, scale)
+            self.canvas.create_line(sx1, sy1, sx2, sy2, fill="#ff00ff", width=2, tags="topk")
+            for sx, sy in ((sx1, sy1), (sx2, sy2)):
                 self.canvas.create_oval(sx - point_radius, sy - point_radius,
                                        sx + point_radius, sy + point_radius,
-                                       fill="#00ffff", outline="#009999", width=2)
-                if len(self.points) <= 20:  # Only label if not too many points
-                    self.canvas.create_text(sx, sy - 10, text=f"P{i+1}",
-                                           fill="#009999", font=("Arial", 7))
-        
-        # Draw the line connecting closest pair
-        if self.closest_pair:
-            x1, y1 = self.closest_pair[0]
-            x2, y2 = self.closest_pair[1]
-            sx1, sy1 = scale_point(x1, y1)
-            sx2, sy2 = scale_point(x2, y2)
-            
-            # Draw the connecting line
-            self.canvas.create_line(sx1, sy1, sx2, sy2, 
-                                   fill="#ff9900", width=3, dash=(5, 2))
-            
-            # Add distance label
-            mid_x = (sx1 + sx2) / 2
-            mid_y = (sy1 + sy2) / 2
-            dist = self.distance(self.closest_pair[0], self.closest_pair[1])
-            self.canvas.create_text(mid_x, mid_y - 10, 
-                                   text=f"Distance: {dist:.4f}", 
-                                   fill="#ff9900", font=("Arial", 9, "bold"))
+                                       fill="#ff00ff", outline="#ff66ff", width=2, tags="topk")
+            if len(self.top_pairs) <= 20:
+                self.canvas.create_text((sx1 + sx2) / 2, (sy1 + sy2) / 2 - 8, text=f"#{rank}",
+                                       fill="#ff66ff", font=("Arial", 7, "bold"), tags="topk")
+        
+        self.draw_closest_pair()
+        self.create_replay_items()
         
         # Draw legend
         legend_x, legend_y = 10, 10
-        self.canvas.create_rectangle(legend_x, legend_y, legend_x + 150, legend_y + 90,
+        self.canvas.create_rectangle(legend_x, legend_y, legend_x + 150, legend_y + 110,
                                     fill="#1a1a1a", outline="#666666", width=1)
         self.canvas.create_text(legend_x + 75, legend_y + 15, text="Legend",
                                fill="#ffffff", font=("Arial", 9, "bold"))
@@ -487,91 +868,345 @@ class DivideConquerVisualizer:
                                fill="#ff9900", width=2)
         self.canvas.create_text(legend_x + 40, legend_y + 75, text="Min Distance",
                                fill="#ffffff", font=("Arial", 8), anchor="w")
+        
+        # Top-k pairs
+        self.canvas.create_line(legend_x + 10, legend_y + 95, legend_x + 25, legend_y + 95,
+                               fill="#ff00ff", width=2)
+        self.canvas.create_text(legend_x + 40, legend_y + 95, text="Top-k Pairs",
+                               fill="#ffffff", font=("Arial", 8), anchor="w")
     
-    def run_integer_multiplication(self, data):
-        x, y = int(data[0]), int(data[1])
+    def draw_point(self, pid, sx, sy, label=False):
+        # Items carry the point id so a single point can be removed later
+        tags = ("point", f"pt{pid}")
+        self.canvas.create_oval(sx - POINT_RADIUS, sy - POINT_RADIUS,
+                               sx + POINT_RADIUS, sy + POINT_RADIUS,
+                               fill="#00ffff", outline="#009999", width=2, tags=tags)
+        if label:  # Only label if not too many points
+            self.canvas.create_text(sx, sy - 10, text=f"P{pid+1}",
+                                   fill="#009999", font=("Arial", 7), tags=tags)
+    
+    def draw_closest_pair(self):
+        # Draw the closest pair in red with glow effect and the line connecting it
+        self.canvas.delete("closest")
+        if not self.closest_pair:
+            return
+        view = self.point_view
+        canvas_width, canvas_height, scale = self.view_state
+        point_radius = POINT_RADIUS
+        x1, y1 = self.closest_pair[0]
+        x2, y2 = self.closest_pair[1]
+        sx1, sy1 = view.scale_point(x1, y1, canvas_width, canvas_height, scale)
+        sx2, sy2 = view.scale_point(x2, y2, canvas_width, canvas_height, scale)
+        
+        for (x, y), sx, sy in ((self.closest_pair[0], sx1, sy1), (self.closest_pair[1], sx2, sy2)):
+            self.canvas.create_oval(sx - point_radius*2, sy - point_radius*2,
+                                   sx + point_radius*2, sy + point_radius*2,
+                                   fill="#ff0000", outline="#ff6666", width=3, tags="closest")
+            self.canvas.create_text(sx, sy - 15, text=f"({x:.1f},{y:.1f})",
+                                   fill="#ff6666", font=("Arial", 8, "bold"), tags="closest")
+        
+        # Draw the connecting line
+        self.canvas.create_line(sx1, sy1, sx2, sy2, 
+                               fill="#ff9900", width=3, dash=(5, 2), tags="closest")
+        
+        # Add distance label
+        mid_x = (sx1 + sx2) / 2
+        mid_y = (sy1 + sy2) / 2
+        dist = self.engine.distance(self.closest_pair[0], self.closest_pair[1])
+        label = f"Distance: {dist:.4f}"
+        if self.projection is not None:
+            # The drawn segment is foreshortened; label it with the real distance
+            matrix = self.projection[0]
+            i, j = self.engine.last_pair_indices
+            label = f"Distance: {math.dist(matrix[i], matrix[j]):.4f} in {matrix.dims}-D"
+        self.canvas.create_text(mid_x, mid_y - 10, 
+                               text=label, 
+                               fill="#ff9900", font=("Arial", 9, "bold"), tags="closest")
+    
+    def set_replay(self, log):
+        """Start a new replay over log (an EventLog), or drop the current one"""
+        self.stop_replay()
+        self.canvas.delete("replay")
+        self.replay_items = None
+        if log is None or len(log) == 0:
+            self.replay = None
+            self.replay_columns = None
+            self.replay_seek.config(to=0)
+            self.replay_label.config(text="No replay recorded")
+            return
+        self.replay = ReplayState(log)
+        sx, sy, _ = PointStore.from_points(self.points).sorted_columns()
+        self.replay_columns = (sx, sy)
+        self.replay_seek.config(to=len(log))
+        self.replay_seek.set(0)
+        self.show_replay_step()
+    
+    def toggle_replay(self):
+        if self.replay is None:
+            return
+        if self.replay_job is not None:
+            self.stop_replay()
+            return
+        if self.replay.finished:
+            self.replay.seek(0)
+        self.replay_button.config(text="⏸ Pause")
+        self.replay_job = self.root.after(REPLAY_FRAME_MS, self.replay_frame)
+    
+    def stop_replay(self):
+        if self.replay_job is not None:
+            self.root.after_cancel(self.replay_job)
+            self.replay_job = None
+        self.replay_button.config(text="▶ Play")
+    
+    def replay_frame(self):
+        # Advance by the chosen speed, but never past the frame budget, then
+        # move the overlay items
+        state = self.replay
+        remaining = REPLAY_SPEEDS[self.replay_speed_var.get()]
+        deadline = time.perf_counter() + REPLAY_BUDGET_MS / 1000
+        while remaining > 0 and not state.finished:
+            remaining -= state.advance(min(remaining, REPLAY_CHUNK_STEPS))
+            if time.perf_counter() > deadline:
+                break
+        self.replay_seek.set(state.pos)
+        self.show_replay_step()
+        if state.finished:
+            self.replay_job = None
+            self.replay_button.config(text="▶ Play")
+            return
+        self.replay_job = self.root.after(REPLAY_FRAME_MS, self.replay_frame)
+    
+    def seek_replay(self, value):
+        # The scale also reports the positions set by replay_frame
+        state = self.replay
+        pos = int(float(value))
+        if state is None or pos == state.pos:
+            return
+        state.seek(pos)
+        self.show_replay_step()
+    
+    def show_replay_step(self):
+        state = self.replay
+        log = state.log
+        text = f"Step {state.pos} / {len(log)}: {state.event}"
+        if state.best is not None:
+            text += f" | best so far {state.best[2]:.6f}"
+        if log.truncated:
+            text += " | log full, recording stopped early"
+        self.replay_label.config(text=text)
+        self.draw_replay()
+    
+    def create_replay_items(self):
+        # Called after every full redraw; frames only move these items
+        self.replay_items = None
+        if self.replay is None:
+            return
+        hidden = tk.HIDDEN
+        self.replay_items = {
+            "node": self.canvas.create_rectangle(0, 0, 0, 0, fill="#3399ff", stipple="gray12",
+                                                 outline="#3399ff", state=hidden, tags="replay"),
+            "strip": self.canvas.create_rectangle(0, 0, 0, 0, fill="#ffff00", stipple="gray25",
+                                                  outline="", state=hidden, tags="replay"),
+            "compare": self.canvas.create_line(0, 0, 0, 0, fill="#ffffff", width=2,
+                                               state=hidden, tags="replay"),
+            "best": self.canvas.create_line(0, 0, 0, 0, fill="#00ff00", width=3,
+                                            state=hidden, tags="replay"),
+            "divides": [],  # One line per open recursion level
+        }
+        self.draw_replay()
+    
+    def draw_replay(self):
+        items = self.replay_items
+        if items is None:
+            return
+        canvas = self.canvas
+        state = self.replay
+        view = self.point_view
+        canvas_width, canvas_height, scale = self.view_state
+        sx, sy = self.replay_columns
         
-        self.steps.append("="*60)
-        self.steps.append("KARATSUBA INTEGER MULTIPLICATION ALGORITHM")
-        self.steps.append("="*60)
-        self.steps.append(f"\nInput Numbers:")
-        self.steps.append(f"  X = {x}")
-        self.steps.append(f"  Y = {y}")
-        self.steps.append(f"\nDigits: X has {len(str(x))} digits, Y has {len(str(y))} digits")
+        def screen_x(x):
+            return view.scale_point(x, view.min_y, canvas_width, canvas_height, scale)[0]
+        
+        def screen_point(k):
+            return view.scale_point(sx[k], sy[k], canvas_width, canvas_height, scale)
+        
+        def place(item, coords):
+            if coords is None:
+                canvas.itemconfigure(item, state=tk.HIDDEN)
+            else:
+                canvas.coords(item, *coords)
+                canvas.itemconfigure(item, state=tk.NORMAL)
+        
+        # The innermost node as a band over its x range
+        node = state.stack[-1] if state.stack else None
+        place(items["node"], node and (screen_x(sx[node[0]]), 0, screen_x(sx[node[1] - 1]), canvas_height))
+        
+        # Dividing lines of the open levels, brighter for the inner ones
+        divides = [x for _, _, x in state.stack if x == x]  # x is NaN for base cases
+        lines = items["divides"]
+        while len(lines) < len(divides):
+            color = REPLAY_DEPTH_COLORS[len(lines) % len(REPLAY_DEPTH_COLORS)]
+            lines.append(canvas.create_line(0, 0, 0, 0, fill=color, width=1, dash=(3, 3), tags="replay"))
+        for k, line in enumerate(lines):
+            place(line, (screen_x(divides[k]), 0, screen_x(divides[k]), canvas_height) if k < len(divides) else None)
+        
+        strip = state.strip
+        place(items["strip"], strip and (screen_x(strip[2] - strip[3]), 0, screen_x(strip[2] + strip[3]), canvas_height))
+        compare = state.compare
+        place(items["compare"], compare and (*screen_point(compare[0]), *screen_point(compare[1])))
+        best = state.best
+        place(items["best"], best and (*screen_point(best[0]), *screen_point(best[1])))
+        for item in (items["compare"], items["best"]):
+            canvas.tag_raise(item)
+    
+    def insert_point_at(self, event):
+        if self.worker is not None or self.view_state is None or len(self.points) == 0:
+            return
+        if self.projection is not None:
+            self.status_bar.config(text="Points with more than two coordinates cannot be edited on the canvas")
+            return
+        dynamic = self.ensure_dynamic()
+        x, y = self.point_view.unscale_point(event.x, event.y, *self.view_state)
+        pid = dynamic.insert(x, y)
+        self.draw_point(pid, event.x, event.y, label=self.point_view.count <= 20)
+        self.points_changed()
+    
+    def delete_point_at(self, event):
+        if self.worker is not None or self.view_state is None or len(self.points) == 0:
+            return
+        if self.projection is not None:
+            self.status_bar.config(text="Points with more than two coordinates cannot be edited on the canvas")
+            return
+        r = POINT_RADIUS
+        for item in reversed(self.canvas.find_overlapping(event.x - r, event.y - r,
+                                                          event.x + r, event.y + r)):
+            tags = self.canvas.gettags(item)
+            if "point" in tags:
+                pid = int(next(t[2:] for t in tags if t.startswith("pt")))
+                break
+        else:
+            self.status_bar.config(text="No point drawn here (zoom in to remove points from the density view)")
+            return
+        self.ensure_dynamic().delete(pid)
+        self.canvas.delete(f"pt{pid}")
+        self.points_changed()
+    
+    def ensure_dynamic(self):
+        # Built on the first edit; ids are the indices of the current point set
+        if self.dynamic is None:
+            self.status_bar.config(text="Indexing points for editing...")
+            self.root.update_idletasks()
+            self.dynamic = DynamicClosestPair(self.points)
+        return self.dynamic
+    
+    def sync_points(self):
+        # Canvas edits are folded into self.points only when it is needed
+        # as a whole (full redraws and index builds)
+        if self.points_dirty:
+            self.points, self.point_ids = self.dynamic.snapshot()
+            self.points_dirty = False
+    
+    def points_changed(self):
+        # Only the edited point and the highlighted pairs are redrawn
+        dynamic = self.dynamic
+        self.points_dirty = True
+        self.set_replay(None)  # The log refers to the point set before the edit
+        self.top_pairs = []
+        self.spatial_index = None
+        self.canvas.delete("topk")
+        dist, pair = dynamic.closest()
+        self.closest_pair = (dynamic.point(pair[0]), dynamic.point(pair[1])) if pair else None
+        self.draw_closest_pair()
+        status = f"{len(dynamic)} points"
+        if pair:
+            status += f" | Closest distance: {dist:.4f}"
+        status += f" | {dynamic.comparisons} comparisons, {dynamic.rebuilds} rebuilds"
+        self.status_bar.config(text=status)
+    
+    def run_integer_multiplication(self, data):
+        # Runs on the worker thread, so no widget access in here
+        x, y = parse_integers(data)
         
-        product = self.karatsuba_multiply(x, y, 0)
+        product = self.engine.multiply(x, y)
+        self.comparisons = self.engine.comparisons
         
         # Verify with standard multiplication
         expected = x * y
+        return x, y, product, expected
+    
+    def describe_integers(self, x, y, product, expected):
+        # Huge numbers are shown as leading and trailing digits only; even the
+        # subquadratic conversion is too slow to run on the Tk thread
+        text = {"x": abbreviate(x), "y": abbreviate(y), "product": abbreviate(product)}
+        if expected == product:
+            text["expected"] = text["product"]
+        elif expected is None:
+            text["expected"] = ("not recomputed", 0)
+        else:
+            text["expected"] = abbreviate(expected)
+        return text
+    
+    def show_integer_results(self, x, y, product, expected):
         is_correct = (product == expected)
+        text = self.integer_text
         
         # Display results
-        self.result_text.delete("1.0", tk.END)
-        self.result_text.insert(tk.END, "╔" + "═"*58 + "╗\n")
-        self.result_text.insert(tk.END, "║  KARATSUBA INTEGER MULTIPLICATION - RESULTS" + " "*12 + "║\n")
-        self.result_text.insert(tk.END, "╚" + "═"*58 + "╝\n\n")
-        
-        self.result_text.insert(tk.END, f"File: {os.path.basename(self.current_file)}\n")
-        self.result_text.insert(tk.END, f"Algorithm: Karatsuba (Divide & Conquer)\n")
-        self.result_text.insert(tk.END, f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        self.result_text.insert(tk.END, "─"*60 + "\n\n")
-        
-        self.result_text.insert(tk.END, "INPUT:\n")
-        self.result_text.insert(tk.END, f"  X = {x}\n")
-        self.result_text.insert(tk.END, f"  Y = {y}\n\n")
-        self.result_text.insert(tk.END, f"  X length: {len(str(x))} digits\n")
-        self.result_text.insert(tk.END, f"  Y length: {len(str(y))} digits\n\n")
-        self.result_text.insert(tk.END, "─"*60 + "\n\n")
-        
-        self.result_text.insert(tk.END, "OUTPUT:\n")
-        self.result_text.insert(tk.END, f"  Product = {product}\n\n")
-        self.result_text.insert(tk.END, f"  Result length: {len(str(product))} digits\n\n")
-        self.result_text.insert(tk.END, "─"*60 + "\n\n")
-        
-        self.result_text.insert(tk.END, "VERIFICATION:\n")
-        self.result_text.insert(tk.END, f"  Standard multiplication: {expected}\n")
-        self.result_text.insert(tk.END, f"  Karatsuba result:        {product}\n")
-        self.result_text.insert(tk.END, f"  Match: {'✓ CORRECT' if is_correct else '✗ ERROR'}\n\n")
-        self.result_text.insert(tk.END, "─"*60 + "\n\n")
-        
-        self.result_text.insert(tk.END, f"Recursive Calls: {self.comparisons}\n")
-        self.result_text.insert(tk.END, f"Execution Time: {self.execution_time:.4f} ms\n\n")
-        self.result_text.insert(tk.END, "✓ Algorithm completed successfully!\n")
+        out = []
+        out.append("╔" + "═"*58 + "╗\n")
+        out.append("║  INTEGER MULTIPLICATION - RESULTS" + " "*22 + "║\n")
+        out.append("╚" + "═"*58 + "╝\n\n")
+        
+        out.append(f"File: {os.path.basename(self.current_file)}\n")
+        out.append(f"Algorithm: {MULTIPLY_ALGORITHMS.get(self.engine.last_engine, 'Karatsuba')} (Divide & Conquer)\n")
+        out.append(f"Engine: {self.engine.last_engine}\n")
+        out.append(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        out.append("─"*60 + "\n\n")
+        
+        out.append("INPUT:\n")
+        out.append(f"  X = {text['x'][0]}\n")
+        out.append(f"  Y = {text['y'][0]}\n\n")
+        out.append(f"  X length: {text['x'][1]} digits\n")
+        out.append(f"  Y length: {text['y'][1]} digits\n\n")
+        out.append("─"*60 + "\n\n")
+        
+        out.append("OUTPUT:\n")
+        out.append(f"  Product = {text['product'][0]}\n\n")
+        out.append(f"  Result length: {text['product'][1]} digits\n")
+        if text["product"][1] > 2 * DISPLAY_DIGITS + 3:
+            out.append(f"  (first and last {DISPLAY_DIGITS} digits shown)\n")
+        out.append("\n")
+        out.append("─"*60 + "\n\n")
+        
+        out.append("VERIFICATION:\n")
+        out.append(f"  Standard multiplication: {text['expected'][0]}\n")
+        out.append(f"  Computed result:         {text['product'][0]}\n")
+        out.append(f"  Match: {'✓ CORRECT' if is_correct else '✗ ERROR'}\n\n")
+        out.append("─"*60 + "\n\n")
+        
+        stats = self.engine.multiply_stats
+        calls = f"Recursive Calls: {self.comparisons}"
+        if "memo_hits" in stats:
+            calls += f" | Memo: {stats['memo_hits']} hits, {stats['memo_misses']} misses"
+            if not stats["memo_active"]:
+                calls += " (off, too few hits)"
+        out.append(calls + "\n")
+        if "transform_length" in stats:
+            out.append(f"Transform Length: {stats['transform_length']} "
+                       f"({stats['piece_bits']}-bit pieces, coefficients mod 2^{stats['coefficient_bits']}+1)\n")
+            out.append(f"Butterflies: {stats['butterflies']} | "
+                       f"Pointwise Products: {stats['pointwise_products']}\n")
+        out.append(f"Execution Time: {self.execution_time:.4f} ms\n")
+        out.append(self.cached_line() + "\n")
+        out.append("✓ Algorithm completed successfully!\n")
+        
+        self.insert_results(out)
         
         # Display steps
-        self.steps_text.delete("1.0", tk.END)
-        self.steps_text.insert(tk.END, "\n".join(self.steps))
+        self.show_steps_page(0)
         
         self.status_bar.config(text=f"Completed: Integer Multiplication | Correct: {is_correct}")
     
-    def karatsuba_multiply(self, x, y, depth):
-        indent = "  " * depth
-        self.comparisons += 1
-        
-        if x < 10 or y < 10:
-            result = x * y
-            self.steps.append(f"{indent}Base case: {x} × {y} = {result}")
-            return result
-        
-        n = max(len(str(x)), len(str(y)))
-        half = n // 2
-        
-        high1, low1 = divmod(x, 10 ** half)
-        high2, low2 = divmod(y, 10 ** half)
-        
-        self.steps.append(f"\n{indent}Step {self.comparisons}:")
-        self.steps.append(f"{indent}  X = {x} → high={high1}, low={low1}")
-        self.steps.append(f"{indent}  Y = {y} → high={high2}, low={low2}")
-        
-        z0 = self.karatsuba_multiply(low1, low2, depth + 1)
-        z1 = self.karatsuba_multiply((low1 + high1), (low2 + high2), depth + 1)
-        z2 = self.karatsuba_multiply(high1, high2, depth + 1)
-        
-        result = (z2 * 10 ** (2 * half)) + ((z1 - z2 - z0) * 10 ** half) + z0
-        self.steps.append(f"{indent}  → Result: {result}")
-        
-        return result
-    
     def update_statistics(self, algo_type, data_size):
         stats = f"Algorithm: {algo_type.title()}\n"
         stats += f"Data Size: {data_size}\n"
@@ -579,7 +1214,9 @@ class DivideConquerVisualizer:
         stats += f"Time: {self.execution_time:.4f} ms\n"
         
         if algo_type == "closest":
-            complexity = f"O(n log n)\nn = {data_size//2}"
+            # data_size counts coordinates, dims of them per point
+            dims = self.projection[0].dims if self.projection is not None else 2
+            complexity = f"O(n log n)\nn = {data_size // dims}"
         else:
             complexity = f"O(n^1.585)\nn ≈ {max(len(str(data_size)), 2)}"
         
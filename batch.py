@@ -0,0 +1,151 @@
+"""Command line batch runner for the divide & conquer engine
+
+Examples:
+    python batch.py . --output results.jsonl
+    python batch.py "inputs/closetpair*.txt" --format csv --jobs 8
+    python batch.py . --cache-dir .dc-cache
+    python batch.py integer1.txt --profile-dir profiles
+    python batch.py "integer*.txt" --memo-mb 64
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import run_file
+from profiler import RecursionProfile
+from result_cache import ResultCache
+from subproduct_cache import SubproductCache
+from tracing import LEVEL_NAMES, OFF, Tracer
+
+
+CSV_FIELDS = ["file", "algorithm", "engine", "data_size", "points", "dims", "pair", "indices",
+              "distance", "product", "correct", "operations", "time_ms", "cached", "error"]
+
+# One cache per process, shared by every file that process runs
+_caches = {}
+
+
+def get_cache(cache_dir, cache_mb):
+    if not cache_dir:
+        return None
+    key = (cache_dir, cache_mb)
+    if key not in _caches:
+        _caches[key] = ResultCache(disk_dir=cache_dir, disk_limit_bytes=cache_mb << 20)
+    return _caches[key]
+
+
+def collect_files(targets):
+    files = []
+    for target in targets:
+        if os.path.isdir(target):
+            files.extend(sorted(glob.glob(os.path.join(target, "*.txt"))))
+        else:
+            matches = sorted(glob.glob(target))
+            files.extend(matches if matches else [target])
+    return files
+
+
+def run_one(file_path, algo_type, trace_level=OFF, trace_depth=3, trace_dir=None, workers=1,
+            parallel_depth=1, cache_dir=None, cache_mb=256, profile_dir=None, memo_mb=0):
+    # Traces are streamed straight to disk, nothing is buffered in memory
+    tracer = None
+    if trace_level != OFF and trace_dir:
+        name = os.path.splitext(os.path.basename(file_path))[0] + ".trace.txt"
+        tracer = Tracer(trace_level, max_depth=trace_depth, buffer_size=0,
+                        stream_path=os.path.join(trace_dir, name))
+
+    profile = RecursionProfile() if profile_dir else None
+    memo = SubproductCache(max_bytes=memo_mb << 20) if memo_mb else None
+
+    # Errors are reported per file so one bad input doesn't stop the batch
+    try:
+        result = run_file(file_path, algo_type, tracer=tracer, workers=workers,
+                          parallel_depth=parallel_depth, cache=get_cache(cache_dir, cache_mb),
+                          profile=profile, memo=memo)
+        if profile is not None:
+            name = os.path.splitext(os.path.basename(file_path))[0] + ".profile.json"
+            profile.save_chrome_trace(os.path.join(profile_dir, name))
+        return result
+    except Exception as e:
+        return {"file": file_path, "algorithm": algo_type, "error": str(e)}
+    finally:
+        if tracer is not None:
+            tracer.close()
+
+
+def write_results(results, out, fmt):
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for result in results:
+            row = dict(result)
+            if row.get("pair") is not None:
+                row["pair"] = json.dumps(row["pair"])
+            writer.writerow(row)
+    else:
+        for result in results:
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run divide & conquer algorithms over many input files")
+    parser.add_argument("targets", nargs="+", help="input files, directories or glob patterns")
+    parser.add_argument("-a", "--algorithm", default="auto", choices=["auto", "closest", "integer"])
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("-f", "--format", default="jsonl", choices=["jsonl", "csv"])
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of files run in parallel")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="worker processes used inside each run (large inputs only)")
+    parser.add_argument("--parallel-depth", type=int, default=1, choices=[1, 2],
+                        help="Karatsuba levels split across workers (3 or 9 tasks)")
+    parser.add_argument("--trace-level", default="off", choices=list(LEVEL_NAMES),
+                        help="step trace level written to --trace-dir")
+    parser.add_argument("--trace-depth", type=int, default=3, help="max depth for --trace-level depth")
+    parser.add_argument("--trace-dir", help="directory for per-file .trace.txt step traces")
+    parser.add_argument("--cache-dir", help="reuse results of identical inputs from this directory")
+    parser.add_argument("--cache-mb", type=int, default=256, help="size cap of --cache-dir in MB")
+    parser.add_argument("--profile-dir",
+                        help="directory for per-file Chrome trace-event profiles (.profile.json)")
+    parser.add_argument("--memo-mb", type=int, default=0,
+                        help="memoize Karatsuba sub-products in up to this many MB per file (0: off)")
+    args = parser.parse_args(argv)
+
+    trace_level = LEVEL_NAMES[args.trace_level]
+    if trace_level != OFF:
+        if not args.trace_dir:
+            parser.error("--trace-level needs --trace-dir")
+        os.makedirs(args.trace_dir, exist_ok=True)
+    if args.profile_dir:
+        os.makedirs(args.profile_dir, exist_ok=True)
+    run_args = (args.algorithm, trace_level, args.trace_depth, args.trace_dir, args.workers,
+                args.parallel_depth, args.cache_dir, args.cache_mb, args.profile_dir, args.memo_mb)
+
+    files = collect_files(args.targets)
+    if not files:
+        parser.error("no input files found")
+
+    if args.jobs > 1:
+        executor = ProcessPoolExecutor(max_workers=args.jobs)
+        results = executor.map(run_one, files, *[[arg] * len(files) for arg in run_args])
+    else:
+        executor = None
+        results = (run_one(f, *run_args) for f in files)
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        write_results(results, out, args.format)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if args.output:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
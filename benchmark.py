@@ -0,0 +1,439 @@
+"""Benchmark and scaling suite for the divide & conquer engines
+
+Times every engine over generated inputs with perf_counter (warmup plus
+repeats), records operation counts next to the theoretical n log n and
+n^1.585 curves, and searches for the Karatsuba cutoff and the brute force
+crossover. The closest-nd family times the d-dimensional grid engine over
+a range of dimensions. Results go to JSON or CSV so releases can be
+compared.
+
+Examples:
+    python benchmark.py --quick
+    python benchmark.py --output bench.json
+    python benchmark.py --format csv --output bench.csv
+    python benchmark.py --calibrate-multiply
+    python benchmark.py --only closest-nd --quick
+"""
+import argparse
+import csv
+import json
+import math
+import platform
+import random
+import statistics
+import sys
+import time
+
+import fast_multiply
+import grid_engine
+import nd_engine
+from decimal_io import parse_int
+from engine import DivideConquerEngine
+from point_store import PointMatrix
+from subproduct_cache import SubproductCache
+
+POINT_SIZES = [100, 1000, 10000, 100000]
+DIGIT_SIZES = [100, 1000, 10000, 100000]
+QUICK_POINT_SIZES = [100, 1000, 5000]
+QUICK_DIGIT_SIZES = [100, 1000, 5000]
+ND_SIZES = [1000, 10000, 100000]
+ND_DIMS = [2, 3, 4, 6, 8, 12, 16]
+QUICK_ND_SIZES = [1000, 5000]
+QUICK_ND_DIMS = [2, 3, 8]
+
+# Engines that are only run up to a size, beyond which they take too long
+BRUTE_FORCE_MAX_POINTS = 2000
+DECIMAL_KARATSUBA_MAX_DIGITS = 2000
+
+
+# ----------------------------------------------------------------------
+# Input generators
+# ----------------------------------------------------------------------
+def uniform_points(n, rng):
+    return [(rng.uniform(0, 1000), rng.uniform(0, 1000)) for _ in range(n)]
+
+
+def clustered_points(n, rng, clusters=10):
+    centers = [(rng.uniform(0, 1000), rng.uniform(0, 1000)) for _ in range(clusters)]
+    points = []
+    for _ in range(n):
+        cx, cy = rng.choice(centers)
+        points.append((rng.gauss(cx, 5), rng.gauss(cy, 5)))
+    return points
+
+
+def duplicate_points(n, rng):
+    # Every point appears about twice
+    base = uniform_points(max(1, n // 2), rng)
+    return [rng.choice(base) for _ in range(n)]
+
+
+def same_x_points(n, rng):
+    return [(500.0, rng.uniform(0, 1000)) for _ in range(n)]
+
+
+POINT_GENERATORS = {
+    "uniform": uniform_points,
+    "clustered": clustered_points,
+    "duplicates": duplicate_points,
+    "same-x": same_x_points,
+}
+
+
+def random_integer(digits, rng):
+    return rng.randrange(10 ** (digits - 1), 10 ** digits)
+
+
+def repetitive_integer(digits, rng):
+    # Built from repeated bytes so no decimal conversion is needed
+    nbytes = math.ceil(digits * math.log2(10) / 8)
+    block = bytes.fromhex("112233445566778899")
+    return int.from_bytes((block * (nbytes // len(block) + 1))[:nbytes], "big")
+
+
+def uniform_points_nd(n, dims, rng):
+    return [tuple(rng.uniform(0, 1000) for _ in range(dims)) for _ in range(n)]
+
+
+def clustered_points_nd(n, dims, rng, clusters=10):
+    centers = [uniform_points_nd(1, dims, rng)[0] for _ in range(clusters)]
+    return [tuple(rng.gauss(c, 5) for c in rng.choice(centers)) for _ in range(n)]
+
+
+ND_POINT_GENERATORS = {
+    "uniform": uniform_points_nd,
+    "clustered": clustered_points_nd,
+}
+
+
+def repeated_digits_integer(digits, rng):
+    # Decimal blocks as in integer5.txt, so decimal splits repeat
+    block = "11223344556677889900"
+    shift = rng.randrange(len(block))
+    block = block[shift:] + block[:shift]
+    return parse_int((block * (digits // len(block) + 1))[:digits])
+
+
+INTEGER_GENERATORS = {
+    "random": random_integer,
+    "repetitive": repetitive_integer,
+    "repeated-digits": repeated_digits_integer,
+}
+
+
+# ----------------------------------------------------------------------
+# Timing
+# ----------------------------------------------------------------------
+def time_call(func, warmup, repeats):
+    """Return (list of timings in seconds, result of the last call)"""
+    result = None
+    for _ in range(warmup):
+        result = func()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def closest_engines(n):
+    engines = {}
+
+    def recursive(points):
+        engine = DivideConquerEngine(trace=False)
+        dist, _ = engine.closest_pair_recursive(sorted(points, key=lambda p: p[0]), 0)
+        return dist, engine.comparisons
+
+    def fast(points):
+        engine = DivideConquerEngine(trace=False, grid_threshold=None)
+        dist, _ = engine.closest_pair(points)
+        return dist, engine.comparisons
+
+    def grid(points):
+        dist, _, comparisons = grid_engine.closest_pair_grid(points)
+        return dist, comparisons
+
+    def brute(points):
+        engine = DivideConquerEngine(trace=False)
+        dist, _ = engine.brute_force_closest(points)
+        return dist, engine.comparisons
+
+    engines["recursive"] = recursive
+    engines["fast"] = fast
+    engines["grid"] = grid
+    if n <= BRUTE_FORCE_MAX_POINTS:
+        engines["brute-force"] = brute
+    return engines
+
+
+def closest_nd_engines(n):
+    engines = {}
+
+    def grid(matrix):
+        dist, _, comparisons = nd_engine.closest_pair_nd(matrix)
+        return dist, comparisons
+
+    def brute(matrix):
+        points = list(matrix)
+        dist = min(math.dist(p, q) for i, p in enumerate(points) for q in points[i + 1:])
+        return dist, len(points) * (len(points) - 1) // 2
+
+    engines["nd-grid"] = grid
+    if n <= BRUTE_FORCE_MAX_POINTS:
+        engines["brute-force"] = brute
+    return engines
+
+
+def integer_engines(digits, cutoff=None):
+    engines = {}
+
+    def decimal(x, y):
+        engine = DivideConquerEngine(trace=False)
+        return engine.karatsuba_multiply(x, y, 0), engine.comparisons
+
+    def decimal_memo(x, y):
+        engine = DivideConquerEngine(trace=False)
+        engine.memo = SubproductCache()
+        return engine.karatsuba_multiply(x, y, 0), engine.comparisons
+
+    def binary(x, y):
+        engine = DivideConquerEngine(trace=False)
+        if cutoff is not None:
+            engine.karatsuba_cutoff = cutoff
+        return engine.karatsuba_binary(x, y), engine.comparisons
+
+    def toom3(x, y):
+        return fast_multiply.toom3_multiply(x, y, cutoff or DivideConquerEngine.KARATSUBA_CUTOFF_BITS)
+
+    def ntt(x, y):
+        product, stats = fast_multiply.ntt_multiply(x, y)
+        return product, stats["butterflies"]
+
+    def builtin(x, y):
+        return x * y, 1
+
+    if digits <= DECIMAL_KARATSUBA_MAX_DIGITS:
+        engines["karatsuba-decimal"] = decimal
+        engines["karatsuba-decimal-memo"] = decimal_memo
+    engines["karatsuba-binary"] = binary
+    engines["toom3"] = toom3
+    engines["ntt"] = ntt
+    engines["builtin"] = builtin
+    return engines
+
+
+def record(kind, engine, dataset, size, timings, operations, model):
+    return {
+        "kind": kind,
+        "engine": engine,
+        "dataset": dataset,
+        "size": size,
+        "repeats": len(timings),
+        "min_ms": min(timings) * 1000,
+        "median_ms": statistics.median(timings) * 1000,
+        "operations": operations,
+        "model": model,
+        "ops_per_model": operations / model if model else None,
+    }
+
+
+def bench_closest(sizes, warmup, repeats, seed):
+    rows = []
+    for dataset, generate in POINT_GENERATORS.items():
+        for n in sizes:
+            points = generate(n, random.Random(seed))
+            model = n * math.log2(n)
+            expected = None
+            for name, run in closest_engines(n).items():
+                timings, (dist, operations) = time_call(lambda: run(points), warmup, repeats)
+                if expected is None:
+                    expected = dist
+                elif abs(dist - expected) > 1e-9 * max(1.0, expected):
+                    raise AssertionError(f"{name} disagrees on {dataset} n={n}: {dist} != {expected}")
+                rows.append(record("closest", name, dataset, n, timings, operations, model))
+    return rows
+
+
+def bench_closest_nd(sizes, dims, warmup, repeats, seed):
+    rows = []
+    for dataset, generate in ND_POINT_GENERATORS.items():
+        for d in dims:
+            for n in sizes:
+                matrix = PointMatrix.from_points(generate(n, d, random.Random(seed)))
+                model = n * math.log2(n)
+                expected = None
+                for name, run in closest_nd_engines(n).items():
+                    timings, (dist, operations) = time_call(lambda: run(matrix), warmup, repeats)
+                    if expected is None:
+                        expected = dist
+                    elif abs(dist - expected) > 1e-9 * max(1.0, expected):
+                        raise AssertionError(f"{name} disagrees on {dataset} d={d} n={n}: {dist} != {expected}")
+                    rows.append(record("closest-nd", name, f"{dataset}-d{d}", n, timings, operations, model))
+    return rows
+
+
+def bench_integer(sizes, warmup, repeats, seed):
+    rows = []
+    for dataset, generate in INTEGER_GENERATORS.items():
+        for digits in sizes:
+            rng = random.Random(seed)
+            x, y = generate(digits, rng), generate(digits, rng)
+            model = digits ** math.log2(3)
+            for name, run in integer_engines(digits).items():
+                timings, (product, operations) = time_call(lambda: run(x, y), warmup, repeats)
+                if product != x * y:
+                    raise AssertionError(f"{name} wrong product on {dataset} digits={digits}")
+                rows.append(record("integer", name, dataset, digits, timings, operations, model))
+    return rows
+
+
+def find_karatsuba_cutoff(digits, warmup, repeats, seed):
+    """Time karatsuba_binary over a range of cutoffs and return the fastest
+
+    Cutoffs stop at half the operand size: past that the recursion never
+    splits and every candidate is the same builtin multiply.
+    """
+    rng = random.Random(seed)
+    x, y = random_integer(digits, rng), random_integer(digits, rng)
+    timings = {}
+    cutoff = 1024
+    while cutoff <= x.bit_length() // 2:
+        run = integer_engines(digits, cutoff)["karatsuba-binary"]
+        samples, _ = time_call(lambda: run(x, y), warmup, repeats)
+        timings[cutoff] = min(samples) * 1000
+        cutoff *= 2
+    best = min(timings, key=timings.get) if timings else None
+    # None (JSON null): no crossover, splitting never beat fewer splits
+    if best == max(timings, default=None):
+        best = None
+    return {"digits": digits, "best_cutoff_bits": best, "timings_ms": timings}
+
+
+def find_multiply_thresholds(warmup, repeats, seed, max_bits=1 << 22):
+    """Smallest operand sizes (bits, powers of two) at which Toom-3 beats
+    Karatsuba and the NTT beats both, confirmed at the next size up"""
+    rng = random.Random(seed)
+    engines = integer_engines(DECIMAL_KARATSUBA_MAX_DIGITS + 1)
+    timings = {}
+    bits = 1 << 12
+    while bits <= max_bits:
+        x, y = rng.getrandbits(bits) | 1 << (bits - 1), rng.getrandbits(bits) | 1 << (bits - 1)
+        timings[bits] = {}
+        for name in ("karatsuba-binary", "toom3", "ntt"):
+            samples, _ = time_call(lambda: engines[name](x, y), warmup, repeats)
+            timings[bits][name] = min(samples) * 1000
+        bits *= 2
+
+    def crossover(wins):
+        sizes = sorted(timings)
+        for i, size in enumerate(sizes):
+            if all(wins(timings[s]) for s in sizes[i:i + 2]):
+                return size
+        return None
+
+    toom3_bits = crossover(lambda t: t["toom3"] < t["karatsuba-binary"])
+    ntt_bits = crossover(lambda t: t["ntt"] < min(t["toom3"], t["karatsuba-binary"]))
+    thresholds = dict(fast_multiply.DEFAULT_THRESHOLDS)
+    # None (JSON null): never selected, it did not win at any measured size
+    thresholds["toom3_bits"] = toom3_bits
+    thresholds["ntt_bits"] = ntt_bits
+    return {"thresholds": thresholds, "timings_ms": timings}
+
+
+def find_brute_force_crossover(warmup, repeats, seed):
+    """Smallest point count at which the fast recursion beats brute force"""
+    engines = closest_engines(0)
+    timings = {}
+    crossover = None
+    n = 2
+    while n <= 256:
+        points = uniform_points(n, random.Random(seed))
+        brute, _ = time_call(lambda: engines["brute-force"](points), warmup, repeats)
+        fast, _ = time_call(lambda: engines["fast"](points), warmup, repeats)
+        timings[n] = {"brute-force_ms": min(brute) * 1000, "fast_ms": min(fast) * 1000}
+        if crossover is None and min(fast) < min(brute):
+            crossover = n
+        n *= 2
+    return {"crossover_points": crossover, "timings_ms": timings}
+
+
+def tuning_rows(tuning):
+    """CSV rows of the tuned values: one per scalar figure, timings left out"""
+    rows = []
+    for name, result in tuning.items():
+        for key, value in result.items():
+            if not isinstance(value, dict):
+                rows.append({"kind": "tuning", "engine": name, "dataset": key, "value": value})
+    return rows
+
+
+def write_csv(rows, out, tuning=None):
+    extra = tuning_rows(tuning or {})
+    fieldnames = list(rows[0]) if rows else ["kind", "engine", "dataset"]
+    if extra:
+        fieldnames.append("value")
+    writer = csv.DictWriter(out, fieldnames=fieldnames)
+    writer.writeheader()
+    writer.writerows(rows)
+    writer.writerows(extra)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the divide & conquer engines")
+    parser.add_argument("--quick", action="store_true", help="small sizes only")
+    parser.add_argument("--only", choices=["closest", "closest-nd", "integer"],
+                        help="run one algorithm family")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=12345)
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("-f", "--format", default="json", choices=["json", "csv"])
+    parser.add_argument("--calibrate-multiply", action="store_true",
+                        help="measure the Toom-3/NTT thresholds on this host and save them")
+    args = parser.parse_args(argv)
+
+    if args.calibrate_multiply:
+        result = find_multiply_thresholds(args.warmup, args.repeats, args.seed)
+        fast_multiply.save_thresholds(result["thresholds"])
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write(f"\nSaved to {fast_multiply.THRESHOLDS_FILE}\n")
+        return 0
+
+    point_sizes = QUICK_POINT_SIZES if args.quick else POINT_SIZES
+    digit_sizes = QUICK_DIGIT_SIZES if args.quick else DIGIT_SIZES
+    nd_sizes, nd_dims = (QUICK_ND_SIZES, QUICK_ND_DIMS) if args.quick else (ND_SIZES, ND_DIMS)
+
+    rows = []
+    tuning = {}
+    if args.only in (None, "closest"):
+        rows += bench_closest(point_sizes, args.warmup, args.repeats, args.seed)
+        tuning["brute_force_crossover"] = find_brute_force_crossover(args.warmup, args.repeats, args.seed)
+    if args.only in (None, "closest-nd"):
+        rows += bench_closest_nd(nd_sizes, nd_dims, args.warmup, args.repeats, args.seed)
+    if args.only in (None, "integer"):
+        rows += bench_integer(digit_sizes, args.warmup, args.repeats, args.seed)
+        tuning["karatsuba_cutoff"] = find_karatsuba_cutoff(digit_sizes[-1], args.warmup, args.repeats, args.seed)
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        if args.format == "csv":
+            write_csv(rows, out, tuning)
+        else:
+            report = {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "numpy": grid_engine.HAVE_NUMPY,
+                "results": rows,
+                "tuning": tuning,
+            }
+            json.dump(report, out, indent=2)
+            out.write("\n")
+    finally:
+        if args.output:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""Decimal parsing and formatting of huge integers
+
+int(text) and str(n) are quadratic in the number of digits, and Python
+refuses both above sys.get_int_max_str_digits() (4300 by default). The
+routines here split the work in halves instead, so no single builtin
+conversion ever sees more than BASE_DIGITS digits:
+
+- parse_int cuts the digit string in two and combines the halves as
+  high * 10^k + low, with 10^k = 5^k << k; the cost is that of the big
+  multiplications.
+- to_decimal cuts the binary value in two and combines the halves as
+  decimal.Decimal values, whose multiply is subquadratic; str() of the
+  result is linear.
+
+Operands may also be written in hexadecimal, octal or binary ("0x...",
+"0o...", "0b..."), which Python converts in linear time without a limit.
+"""
+import decimal
+
+BASE_DIGITS = 2000  # Digit strings up to this long go straight to int()
+BASE_BITS = 6000  # Values up to this many bits go straight to Decimal()
+DISPLAY_DIGITS = 40  # Leading and trailing digits kept by abbreviate
+
+LOG10_2 = 0.30102999566398120
+
+PREFIX_BASES = {"0x": 16, "0o": 8, "0b": 2}
+
+
+def is_int_token(token):
+    """True for a (signed) decimal, 0x, 0o or 0b integer literal"""
+    body = token.lstrip("+-")
+    base = PREFIX_BASES.get(body[:2].lower())
+    if base is None:
+        return body.isascii() and body.isdigit()
+    try:
+        int(body[2:], base)
+    except ValueError:
+        return False
+    return True
+
+
+def literal_digits(token):
+    """Digits of an integer literal, not counting its sign or base prefix"""
+    body = token.strip().lstrip("+-")
+    if body[:2].lower() in PREFIX_BASES:
+        return len(body) - 2
+    return len(body)
+
+
+def parse_int(token):
+    """Integer value of a decimal, 0x, 0o or 0b literal, with optional sign"""
+    text = token.strip()
+    negative = text.startswith("-")
+    body = text[1:] if text[:1] in "+-" else text
+    base = PREFIX_BASES.get(body[:2].lower())
+    if base is not None:
+        value = int(body[2:], base)
+    elif body.isascii() and body.isdigit():
+        value = _parse_decimal(body)
+    else:
+        raise ValueError(f"invalid integer literal: {token[:50]!r}")
+    return -value if negative else value
+
+
+def _parse_decimal(digits):
+    powers = {}  # k -> 5^k; the halving only produces a few distinct k
+
+    def parse(lo, hi):
+        if hi - lo <= BASE_DIGITS:
+            return int(digits[lo:hi])
+        mid = (lo + hi) >> 1
+        k = hi - mid
+        power = powers.get(k)
+        if power is None:
+            power = powers[k] = 5 ** k
+        return ((parse(lo, mid) * power) << k) + parse(mid, hi)
+
+    return parse(0, len(digits))
+
+
+def to_decimal(n):
+    """Decimal string of n, like str(n) but subquadratic and without a size limit"""
+    if n < 0:
+        return "-" + to_decimal(-n)
+    if n.bit_length() <= BASE_BITS:
+        return str(n)
+    with decimal.localcontext() as ctx:
+        # Exact arithmetic: any rounding would raise Inexact
+        ctx.prec = decimal.MAX_PREC
+        ctx.Emax = decimal.MAX_EMAX
+        ctx.Emin = decimal.MIN_EMIN
+        ctx.traps[decimal.Inexact] = True
+        two = decimal.Decimal(2)
+        powers = {}  # w -> 2^w as a Decimal
+
+        def convert(value, bits):
+            if bits <= BASE_BITS:
+                return decimal.Decimal(value)
+            low_bits = bits >> 1
+            power = powers.get(low_bits)
+            if power is None:
+                power = powers[low_bits] = two ** low_bits
+            low = convert(value & ((1 << low_bits) - 1), low_bits)
+            return convert(value >> low_bits, bits - low_bits) * power + low
+
+        return str(convert(n, n.bit_length()))
+
+
+def decimal_digits(n):
+    """Number of decimal digits of abs(n), without converting it to a string"""
+    n = abs(n)
+    if n.bit_length() <= BASE_BITS:
+        return len(str(n))
+    # The estimate from the bit length is exact or one too high
+    digits = int(n.bit_length() * LOG10_2) + 1
+    k = digits - 1
+    if (n >> k) < 5 ** k:  # n < 10^k
+        digits -= 1
+    return digits
+
+
+def abbreviate(n, keep=DISPLAY_DIGITS):
+    """(text, digit count) of n; longer numbers show only keep leading and trailing digits"""
+    digits = decimal_digits(n)
+    if digits <= 2 * keep + 3:
+        return to_decimal(n), digits
+    sign = "-" if n < 0 else ""
+    n = abs(n)
+    k = digits - keep
+    # n // 10^k without a full-size division: the quotient is only keep digits
+    head = (n >> k) // 5 ** k
+    tail = str(n % 10 ** keep).zfill(keep)
+    return f"{sign}{head}...{tail}", digits
+
+
+class Abbreviated:
+    """n as abbreviate() text, converted only when formatted
+
+    For trace arguments: the tracer formats lazily, and a raw int of more
+    than 4300 digits would fail str() when the trace is read.
+    """
+    __slots__ = ("n",)
+
+    def __init__(self, n):
+        self.n = n
+
+    def __format__(self, spec):
+        return format(abbreviate(self.n)[0], spec)
+
+    def __str__(self):
+        return abbreviate(self.n)[0]
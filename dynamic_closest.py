@@ -0,0 +1,186 @@
+"""Closest pair of a point set that changes one point at a time
+
+Points live in a uniform grid whose cell size is at least the current
+minimum distance, so a point's nearest neighbour, if it is part of the
+closest pair, is in the 3x3 block of cells around it. Every point keeps its
+nearest neighbour inside that block, and a heap of those (distance, point,
+neighbour) entries yields the closest pair; stale entries are skipped
+lazily.
+
+Inserting scans one 3x3 block. Deleting a point rescans the blocks of the
+few points (at most six in the plane) whose neighbour it was. The grid is
+rebuilt with a new cell size when the minimum distance falls well below
+the cell size, or grows past it after deletions; both take O(n) and happen
+rarely, so updates are amortized O(1) for the inputs we see.
+"""
+import heapq
+import math
+
+import grid_engine
+
+# Rebuild with smaller cells once the minimum distance is this much smaller
+SHRINK_FACTOR = 4
+
+
+class DynamicClosestPair:
+    def __init__(self, points=()):
+        self.points = {}  # id -> (x, y)
+        self.next_id = 0
+        self.cell = None
+        self.grid = {}  # (cx, cy) -> set of ids
+        self.nn = {}  # id -> (d2, neighbour id) within the id's 3x3 block
+        self.nn_of = {}  # id -> ids whose neighbour it is
+        self.heap = []
+        self.comparisons = 0
+        self.rebuilds = 0
+        for x, y in points:
+            self.points[self.next_id] = (float(x), float(y))
+            self.next_id += 1
+        if len(self.points) >= 2:
+            self._rebuild()
+
+    def __len__(self):
+        return len(self.points)
+
+    def insert(self, x, y):
+        """Add a point and return its id"""
+        pid = self.next_id
+        self.next_id += 1
+        self.points[pid] = (float(x), float(y))
+        if self.cell is None:
+            if len(self.points) >= 2:
+                self._rebuild()
+            return pid
+
+        self._add_to_grid(pid)
+        best = None
+        for other, d2 in self._block(pid):
+            if best is None or (d2, other) < best:
+                best = (d2, other)
+            # The new point may be closer to its neighbours than their own
+            current = self.nn.get(other)
+            if current is None or (d2, pid) < current:
+                self._set_nn(other, (d2, pid))
+        if best is not None:
+            self._set_nn(pid, best)
+        d2 = self._min_d2()
+        if 0.0 < d2 and d2 * SHRINK_FACTOR ** 2 < self.cell * self.cell:
+            self._rebuild()
+        return pid
+
+    def delete(self, pid):
+        """Remove the point with this id"""
+        x, y = self.points.pop(pid)
+        if self.cell is None:
+            return
+        key = self._key(x, y)
+        bucket = self.grid[key]
+        bucket.discard(pid)
+        if not bucket:
+            del self.grid[key]
+        self._set_nn(pid, None)
+        for other in self.nn_of.pop(pid, ()):
+            self.nn.pop(other, None)
+            self._set_nn(other, self._nearest_in_block(other))
+        if len(self.points) < 2:
+            self.cell = None
+            self.grid = {}
+            self.nn = {}
+            self.nn_of = {}
+            self.heap = []
+
+    def closest(self):
+        """Return (distance, (id, id)) of the closest pair, (inf, None) below two points"""
+        if len(self.points) < 2:
+            return float('inf'), None
+        d2 = self._min_d2()
+        # A pair farther apart than the cell size may not be the closest one,
+        # some other pair could span more than one cell
+        if math.sqrt(d2) > self.cell:
+            self._rebuild()
+            d2 = self._min_d2()
+        _, a, b = self.heap[0]
+        return math.sqrt(d2), (min(a, b), max(a, b))
+
+    def point(self, pid):
+        return self.points[pid]
+
+    def snapshot(self):
+        """Return (list of (x, y), list of ids) for the live points"""
+        return list(self.points.values()), list(self.points)
+
+    # ------------------------------------------------------------------
+    # Grid and neighbour bookkeeping
+    # ------------------------------------------------------------------
+    def _key(self, x, y):
+        return math.floor(x / self.cell), math.floor(y / self.cell)
+
+    def _add_to_grid(self, pid):
+        self.grid.setdefault(self._key(*self.points[pid]), set()).add(pid)
+
+    def _block(self, pid):
+        # (id, d2) of every other point in the 3x3 block around pid
+        x, y = self.points[pid]
+        cx, cy = self._key(x, y)
+        points = self.points
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for other in self.grid.get((gx, gy), ()):
+                    if other == pid:
+                        continue
+                    ox, oy = points[other]
+                    dx = x - ox
+                    dy = y - oy
+                    self.comparisons += 1
+                    yield other, dx * dx + dy * dy
+
+    def _nearest_in_block(self, pid):
+        best = None
+        for other, d2 in self._block(pid):
+            if best is None or (d2, other) < best:
+                best = (d2, other)
+        return best
+
+    def _set_nn(self, pid, entry):
+        old = self.nn.pop(pid, None)
+        if old is not None:
+            self.nn_of[old[1]].discard(pid)
+        if entry is None:
+            return
+        self.nn[pid] = entry
+        self.nn_of.setdefault(entry[1], set()).add(pid)
+        heapq.heappush(self.heap, (entry[0], pid, entry[1]))
+        # Drop stale entries once they outnumber the live ones
+        if len(self.heap) > 4 * len(self.points) + 16:
+            self.heap = [(d2, p, q) for p, (d2, q) in self.nn.items()]
+            heapq.heapify(self.heap)
+
+    def _min_d2(self):
+        heap = self.heap
+        while heap:
+            d2, a, b = heap[0]
+            if self.nn.get(a) == (d2, b):
+                return d2
+            heapq.heappop(heap)
+        return float('inf')
+
+    def _rebuild(self):
+        # Cell size = the true minimum distance, from a static grid run
+        coords = list(self.points.values())
+        dist, _, comparisons = grid_engine.closest_pair_grid(coords)
+        self.comparisons += comparisons
+        self.rebuilds += 1
+        if dist > 0.0:
+            self.cell = dist
+        elif self.cell is None:
+            # Only duplicates so far: any positive size works until they go
+            spread = max(max(abs(x), abs(y)) for x, y in coords)
+            self.cell = spread or 1.0
+        self.grid = {}
+        self.nn = {}
+        self.nn_of = {}
+        self.heap = []
+        for pid in self.points:
+            self._add_to_grid(pid)
+        for pid in self.points:
+            self._set_nn(pid, self._nearest_in_block(pid))
@@ -0,0 +1,780 @@
+import math
+import os
+import time
+
+import fast_multiply
+import grid_engine
+import nd_engine
+from decimal_io import Abbreviated, abbreviate, decimal_digits, is_int_token, parse_int, to_decimal
+from point_io import BINARY_MAGIC, load_points, text_header
+from point_store import PointMatrix, PointStore, point_dims
+from tracing import FULL, OFF, SUMMARY, Tracer
+
+# Bump whenever a change could alter results, so cached results are dropped
+ENGINE_VERSION = "4"
+
+
+class RunCancelled(Exception):
+    """Raised inside the engine when a run is cancelled through its monitor"""
+
+
+class RunMonitor:
+    """Progress counters and a cancel flag shared with a running engine
+
+    The engine only assigns plain attributes, so another thread can poll
+    them (and set cancelled) without locking.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self.depth_reached = 0
+        self.points_done = 0
+        self.subproducts_done = 0
+
+    def cancel(self):
+        self.cancelled = True
+
+    def enter(self, depth):
+        # Called once per recursion node: track depth and honour cancellation
+        if self.cancelled:
+            raise RunCancelled()
+        if depth > self.depth_reached:
+            self.depth_reached = depth
+
+
+class DivideConquerEngine:
+    """Headless implementation of the divide & conquer algorithms"""
+
+    # Point sets at least this large go to the grid/vectorized engine
+    GRID_THRESHOLD = 20000
+    # Up to this many points the fast recursion copies the sorted columns
+    # into lists; larger sets are read in place
+    LIST_COLUMNS_MAX = 1 << 16
+    # Operands at or below this many bits use the builtin multiply. CPython
+    # switches to its own C Karatsuba around 2100 bits; measured on 10^5-10^6
+    # digit operands, recursing in Python below ~16k bits only adds overhead.
+    KARATSUBA_CUTOFF_BITS = 16384
+
+    def __init__(self, trace=True, grid_threshold=GRID_THRESHOLD,
+                 karatsuba_cutoff=KARATSUBA_CUTOFF_BITS, tracer=None, workers=1,
+                 parallel_depth=1, multiply_thresholds=None):
+        # trace=True/False is shorthand for a full or disabled tracer
+        if tracer is None:
+            tracer = Tracer(FULL if trace else OFF)
+        self.tracer = tracer
+        self.grid_threshold = grid_threshold
+        self.karatsuba_cutoff = karatsuba_cutoff
+        # More than one worker enables the multi-process engines
+        self.workers = workers
+        # Karatsuba levels fanned out to the pool (3 ** depth tasks)
+        self.parallel_depth = parallel_depth
+        # Operand sizes where Toom-3 and the NTT take over from Karatsuba
+        if multiply_thresholds is None:
+            multiply_thresholds = fast_multiply.load_thresholds()
+        self.multiply_thresholds = multiply_thresholds
+        self.comparisons = 0
+        self.last_engine = None
+        # Input indices of the last closest pair, in the order of the pair
+        self.last_pair_indices = None
+        # Algorithm specific figures of the last multiplication
+        self.multiply_stats = {}
+        # Optional RunMonitor for progress reporting and cancellation
+        self.monitor = None
+        # Optional profiler.RecursionProfile for per-level timings
+        self.profile = None
+        # Optional replay.EventLog; recording runs closest pair recursively
+        self.events = None
+        # Optional subproduct_cache.SubproductCache shared by the Karatsuba recursions
+        self.memo = None
+
+    @property
+    def trace(self):
+        """True when recursion steps are traced, which forces the slower traced paths"""
+        return self.tracer.level > SUMMARY
+
+    @property
+    def steps(self):
+        return self.tracer.lines()
+
+    def reset(self):
+        self.tracer.clear()
+        self.comparisons = 0
+        self.multiply_stats = {}
+
+    # ------------------------------------------------------------------
+    # Closest pair of points
+    # ------------------------------------------------------------------
+    def closest_pair(self, points):
+        """Return (distance, pair of (x, y) points)
+
+        points is a point_store.PointStore or any sequence of (x, y); the
+        input indices of the pair are left in last_pair_indices. Points with
+        more coordinates (a PointMatrix, or d-tuples) go to nd_engine and
+        the pair is returned as d-tuples.
+        """
+        if self.profile is not None:
+            self.profile.unit = "points"
+        if point_dims(points) > 2:
+            return self.closest_pair_nd(PointMatrix.from_points(points))
+        store = PointStore.from_points(points)
+        self.last_pair_indices = None
+        # Only the recursion has events to record
+        recursive = self.events is not None
+        if self.workers > 1 and not self.trace and not recursive:
+            import parallel  # imports this module
+            if len(store) >= parallel.PARALLEL_MIN_POINTS:
+                return self.closest_pair_parallel(store)
+
+        if self.grid_threshold is not None and len(store) >= self.grid_threshold and not recursive:
+            return self.closest_pair_grid(store)
+
+        # Sorted once per store; the recursion only passes index ranges around
+        xs, ys, order = store.sorted_columns()
+
+        tr = self.tracer
+        tr.summary("="*60)
+        tr.summary("CLOSEST PAIR OF POINTS ALGORITHM")
+        tr.summary("="*60)
+        tr.summary("\nInput: {} points", len(store))
+        if self.trace:
+            # The traced recursion slices point lists; the third field is the x-sorted position
+            points_sorted = list(zip(xs, ys, range(len(store))))
+            tr.summary("Points (sorted by x-coordinate):")
+            for i, p in enumerate(points_sorted[:10]):  # Show first 10
+                tr.summary("  {}. ({:.2f}, {:.2f})", i + 1, p[0], p[1])
+            if len(points_sorted) > 10:
+                tr.summary("  ... and {} more points", len(points_sorted) - 10)
+            self.last_engine = "recursive"
+            dist, pair = self.closest_pair_recursive(points_sorted, 0)
+            indices = (order[pair[0][2]], order[pair[1][2]]) if pair else None
+        else:
+            self.last_engine = "fast"
+            dist, pair = self.closest_pair_fast(xs, ys)
+            indices = (order[pair[0]], order[pair[1]]) if pair else None
+        return self.report_pair(store, dist, indices)
+
+    def closest_pair_grid(self, store):
+        self.last_engine = "numpy-sweep" if grid_engine.HAVE_NUMPY else "grid-hash"
+        tr = self.tracer
+        tr.summary("="*60)
+        tr.summary("CLOSEST PAIR OF POINTS ALGORITHM")
+        tr.summary("="*60)
+        tr.summary("\nInput: {} points", len(store))
+        tr.summary("Large input: using {} engine (threshold {}), step tracing not available",
+                   self.last_engine, self.grid_threshold)
+        dist, indices, comparisons = grid_engine.closest_pair_indices(store, monitor=self.monitor)
+        self.comparisons += comparisons
+        return self.report_pair(store, dist, indices)
+
+    def closest_pair_parallel(self, store):
+        import parallel
+        self.last_engine = f"parallel-{self.workers}"
+        tr = self.tracer
+        tr.summary("="*60)
+        tr.summary("CLOSEST PAIR OF POINTS ALGORITHM")
+        tr.summary("="*60)
+        tr.summary("\nInput: {} points, {} worker processes", len(store), self.workers)
+        dist, indices, comparisons = parallel.closest_pair_parallel(store, self.workers, self.monitor)
+        self.comparisons += comparisons
+        return self.report_pair(store, dist, indices)
+
+    def closest_pair_nd(self, matrix):
+        self.last_pair_indices = None
+        self.last_engine = "nd-grid" if nd_engine.HAVE_NUMPY else "nd-grid-hash"
+        tr = self.tracer
+        tr.summary("="*60)
+        tr.summary("CLOSEST PAIR OF POINTS ALGORITHM")
+        tr.summary("="*60)
+        tr.summary("\nInput: {} points in {} dimensions", len(matrix), matrix.dims)
+        tr.summary("Using {} engine, step tracing not available", self.last_engine)
+        dist, indices, comparisons = nd_engine.closest_pair_nd(matrix, monitor=self.monitor)
+        self.comparisons += comparisons
+        return self.report_pair(matrix, dist, indices)
+
+    def report_pair(self, store, dist, indices):
+        # Every engine finds input indices; the pair is read back from the store
+        pair = None
+        if indices is not None:
+            self.last_pair_indices = indices
+            pair = (store[indices[0]], store[indices[1]])
+        self.tracer.summary("\nClosest pair: {} - {}, distance {:.8f}", *(pair or (None, None)), dist)
+        return dist, pair
+
+    def closest_pair_recursive(self, points, depth):
+        tr = self.tracer
+        traced = tr.enabled(depth)
+        mon = self.monitor
+        if mon is not None:
+            mon.enter(depth)
+        prof = self.profile
+        if prof is not None:
+            start = time.perf_counter()
+
+        # Fewer than two points leave no log, as in closest_pair_fast
+        events = self.events if len(points) > 1 else None
+        if len(points) <= 3:
+            if traced:
+                tr.step(depth, "\n{indent}Base case: {} points - using brute force", len(points))
+            if events is not None:
+                events.base(depth, points[0][2], points[-1][2] + 1)
+            dist, pair = self.brute_force_closest(points, depth)
+            if events is not None:
+                events.done(depth, points[0][2], points[-1][2] + 1, dist)
+            if mon is not None:
+                mon.points_done += len(points)
+            if traced:
+                tr.step(depth, "{indent}  → Minimum distance: {:.4f}", dist)
+            if prof is not None:
+                end = time.perf_counter()
+                prof.node("closest base", depth, len(points), start, end, base=end - start)
+            return dist, pair
+
+        mid = len(points) // 2
+        if traced:
+            tr.step(depth, "\n{indent}Dividing {} points at index {}", len(points), mid)
+            tr.step(depth, "{indent}  Left: {} points", mid)
+            tr.step(depth, "{indent}  Right: {} points", len(points) - mid)
+
+        if events is not None:
+            events.node(depth, points[0][2], points[-1][2] + 1, points[mid][0])
+        left, right = points[:mid], points[mid:]
+        if prof is not None:
+            divided = time.perf_counter()
+        dleft, pair_left = self.closest_pair_recursive(left, depth + 1)
+        dright, pair_right = self.closest_pair_recursive(right, depth + 1)
+        if prof is not None:
+            merging = time.perf_counter()
+
+        d = min(dleft, dright)
+        best_pair = pair_left if dleft < dright else pair_right
+
+        if traced:
+            tr.step(depth, "{indent}Merging: min({:.4f}, {:.4f}) = {:.4f}", dleft, dright, d)
+
+        # Check strip
+        mid_x = points[mid][0]
+        strip = [p for p in points if abs(p[0] - mid_x) < d]
+        strip.sort(key=lambda x: x[1])
+
+        if traced:
+            tr.step(depth, "{indent}Checking strip: {} points within distance {:.4f}", len(strip), d)
+        if events is not None:
+            events.strip_check(depth, points[0][2], [p[2] for p in strip], d)
+
+        ordinal = 0
+        for i in range(len(strip)):
+            for j in range(i + 1, min(i + 7, len(strip))):
+                dist = self.distance(strip[i], strip[j])
+                self.comparisons += 1
+                if dist < d:
+                    d = dist
+                    best_pair = (strip[i], strip[j])
+                    if events is not None:
+                        events.new_best(depth, strip[i][2], strip[j][2], ordinal, d)
+                    if traced:
+                        tr.step(depth, "{indent}  ✓ New minimum found: {:.4f}", d)
+                ordinal += 1
+        if events is not None:
+            events.done(depth, points[0][2], points[-1][2] + 1, d)
+
+        if prof is not None:
+            end = time.perf_counter()
+            prof.node("closest", depth, len(points), start, end, divide=divided - start,
+                      merge=end - merging, strip=len(strip))
+        return d, best_pair
+
+    def brute_force_closest(self, points, depth=0):
+        # Event operands are the third point field, as in closest_pair_recursive
+        events = self.events
+        min_dist = float('inf')
+        pair = None
+        ordinal = 0
+        for i in range(len(points)):
+            for j in range(i + 1, len(points)):
+                d = self.distance(points[i], points[j])
+                self.comparisons += 1
+                if d < min_dist:
+                    min_dist = d
+                    pair = (points[i], points[j])
+                    if events is not None:
+                        events.new_best(depth, points[i][2], points[j][2], ordinal, d)
+                ordinal += 1
+        return min_dist, pair
+
+    def distance(self, p1, p2):
+        return math.sqrt((p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2)
+
+    def closest_pair_fast(self, xs, ys):
+        """O(n log n) closest pair over x-sorted coordinate columns, no step tracing
+
+        Visits the same pairs as closest_pair_recursive, so the pair and
+        comparison count match; see closest_pair_range. Returns (distance,
+        (i, j)) with i, j positions in the sorted columns.
+        """
+        n = len(xs)
+        if n < 2:
+            return float('inf'), None
+        if n <= self.LIST_COLUMNS_MAX:
+            # Lists index about a third faster than memoryviews, and at this
+            # size their boxed floats cost little memory
+            xs, ys = xs.tolist(), ys.tolist()
+
+        d2, pair, comparisons = closest_pair_range(xs, ys, 0, n, self.monitor, profile=self.profile,
+                                                   events=self.events)
+        self.comparisons += comparisons
+        return math.sqrt(d2), pair
+
+    # ------------------------------------------------------------------
+    # Karatsuba integer multiplication
+    # ------------------------------------------------------------------
+    def multiply(self, x, y):
+        if self.profile is not None:
+            self.profile.unit = "bits"
+        memo = self.memo
+        if memo is not None:
+            hits, misses = memo.hits, memo.misses
+        tr = self.tracer
+        tr.summary("="*60)
+        tr.summary("KARATSUBA INTEGER MULTIPLICATION ALGORITHM")
+        tr.summary("="*60)
+        if self.trace:
+            tr.summary("\nInput Numbers:")
+            x_text, x_digits = abbreviate(x)
+            y_text, y_digits = abbreviate(y)
+            tr.summary("  X = {}", x_text)
+            tr.summary("  Y = {}", y_text)
+            tr.summary("\nDigits: X has {} digits, Y has {} digits", x_digits, y_digits)
+            self.last_engine = "karatsuba-decimal"
+            product = self.karatsuba_multiply(x, y, 0)
+        else:
+            tr.summary("\nInput sizes: X has {} bits, Y has {} bits", x.bit_length(), y.bit_length())
+            product = self.multiply_adaptive(x, y)
+
+        if self.last_engine == "ntt":
+            tr.summary("\nDone: length {} transform, product has {} bits",
+                       self.multiply_stats["transform_length"], product.bit_length())
+        else:
+            tr.summary("\nDone: {} recursive calls, product has {} bits",
+                       self.comparisons, product.bit_length())
+        self.multiply_stats["recursive_calls"] = self.comparisons
+        # Only the serial recursions consult the memo; parallel workers,
+        # Toom-3 and the NTT never touch it
+        if memo is not None and self.last_engine in ("karatsuba-decimal", "karatsuba-binary"):
+            # Counts of this multiplication only; the memo may outlive it
+            self.multiply_stats["memo_hits"] = memo.hits - hits
+            self.multiply_stats["memo_misses"] = memo.misses - misses
+            self.multiply_stats["memo_active"] = memo.active
+            tr.summary("Memoized sub-products: {} hits, {} misses, {} entries ({} bytes)",
+                       memo.hits - hits, memo.misses - misses, len(memo), memo.nbytes)
+        return product
+
+    def multiply_adaptive(self, x, y):
+        """Pick Karatsuba, Toom-3 or the NTT by the smaller operand's size"""
+        bits = min(abs(x).bit_length(), abs(y).bit_length())
+        thresholds = self.multiply_thresholds
+        if self.workers > 1:
+            import parallel  # imports this module
+            if bits >= parallel.PARALLEL_MIN_BITS:
+                self.last_engine = f"karatsuba-parallel-{self.workers}"
+                product, calls = parallel.karatsuba_parallel(
+                    x, y, self.workers, self.parallel_depth, self.karatsuba_cutoff, self.monitor)
+                self.comparisons += calls
+                return product
+        if bits >= thresholds["ntt_bits"]:
+            self.last_engine = "ntt"
+            product, stats = fast_multiply.ntt_multiply(x, y, self.monitor, self.profile)
+            self.multiply_stats.update(stats)
+            return product
+        if bits >= thresholds["toom3_bits"]:
+            self.last_engine = "toom3"
+            product, calls = fast_multiply.toom3_multiply(x, y, self.karatsuba_cutoff, self.monitor,
+                                                          self.profile)
+            self.comparisons += calls
+            return product
+        self.last_engine = "karatsuba-binary"
+        return self.karatsuba_binary(x, y)
+
+    def karatsuba_multiply(self, x, y, depth):
+        tr = self.tracer
+        traced = tr.enabled(depth)
+        self.comparisons += 1
+        mon = self.monitor
+        if mon is not None:
+            mon.enter(depth)
+            mon.subproducts_done += 1
+        prof = self.profile
+        if prof is not None:
+            start = time.perf_counter()
+
+        if x < 10 or y < 10:
+            result = x * y
+            if traced:
+                tr.step(depth, "{indent}Base case: {} × {} = {}",
+                        Abbreviated(x), Abbreviated(y), Abbreviated(result))
+            if prof is not None:
+                end = time.perf_counter()
+                prof.node("karatsuba base", depth, max(x.bit_length(), y.bit_length()), start, end,
+                          base=end - start)
+            return result
+
+        n = max(decimal_digits(x), decimal_digits(y))
+        half = n // 2
+
+        # Small splits are cheaper to recompute than to look up
+        memo = self.memo
+        if memo is not None and (not memo.active or max(x, y).bit_length() < memo.min_bits):
+            memo = None
+        if memo is not None:
+            key = memo.key(x, y, half)
+            result = memo.get(key)
+            if result is not None:
+                if traced:
+                    tr.step(depth, "{indent}Memoized: {} × {} = {}",
+                            Abbreviated(x), Abbreviated(y), Abbreviated(result))
+                if prof is not None:
+                    prof.node("karatsuba memo", depth, max(x.bit_length(), y.bit_length()), start,
+                              time.perf_counter())
+                return result
+
+        high1, low1 = divmod(x, 10 ** half)
+        high2, low2 = divmod(y, 10 ** half)
+        if prof is not None:
+            divided = time.perf_counter()
+
+        if traced:
+            tr.step(depth, "\n{indent}Step {}:", self.comparisons)
+            # Operands are formatted lazily and abbreviated, never with str()
+            tr.step(depth, "{indent}  X = {} → high={}, low={}",
+                    Abbreviated(x), Abbreviated(high1), Abbreviated(low1))
+            tr.step(depth, "{indent}  Y = {} → high={}, low={}",
+                    Abbreviated(y), Abbreviated(high2), Abbreviated(low2))
+
+        z0 = self.karatsuba_multiply(low1, low2, depth + 1)
+        z1 = self.karatsuba_multiply((low1 + high1), (low2 + high2), depth + 1)
+        z2 = self.karatsuba_multiply(high1, high2, depth + 1)
+        if prof is not None:
+            merging = time.perf_counter()
+
+        result = (z2 * 10 ** (2 * half)) + ((z1 - z2 - z0) * 10 ** half) + z0
+        if memo is not None:
+            memo.put(key, result)
+        if traced:
+            tr.step(depth, "{indent}  → Result: {}", Abbreviated(result))
+
+        if prof is not None:
+            end = time.perf_counter()
+            prof.node("karatsuba", depth, max(x.bit_length(), y.bit_length()), start, end,
+                      divide=divided - start, merge=end - merging)
+        return result
+
+    def karatsuba_binary(self, x, y):
+        """Karatsuba split on bit_length with shifts and masks, no tracing
+
+        Never converts to decimal and hands anything at or below
+        karatsuba_cutoff bits to the builtin multiply.
+        """
+        if (x < 0) != (y < 0):
+            return -self.karatsuba_binary(abs(x), abs(y))
+        x, y = abs(x), abs(y)
+        cutoff = self.karatsuba_cutoff
+        calls = 0
+        mon = self.monitor
+        prof = self.profile
+        memo = self.memo
+        clock = time.perf_counter
+
+        def mul(x, y, depth):
+            nonlocal calls
+            calls += 1
+            if mon is not None:
+                mon.enter(depth)
+                mon.subproducts_done += 1
+            xbits = x.bit_length()
+            ybits = y.bit_length()
+            if xbits <= cutoff or ybits <= cutoff:
+                if prof is None:
+                    return x * y
+                start = clock()
+                product = x * y
+                end = clock()
+                prof.node("karatsuba base", depth, max(xbits, ybits), start, end, base=end - start)
+                return product
+
+            if prof is not None:
+                start = clock()
+            half = max(xbits, ybits) >> 1
+            if memo is not None and memo.active:
+                key = memo.key(x, y, half)
+                result = memo.get(key)
+                if result is not None:
+                    if prof is not None:
+                        prof.node("karatsuba memo", depth, max(xbits, ybits), start, clock())
+                    return result
+            mask = (1 << half) - 1
+            high1, low1 = x >> half, x & mask
+            high2, low2 = y >> half, y & mask
+            sum1, sum2 = low1 + high1, low2 + high2
+            if prof is not None:
+                divided = clock()
+
+            z0 = mul(low1, low2, depth + 1)
+            z2 = mul(high1, high2, depth + 1)
+            z1 = mul(sum1, sum2, depth + 1)
+            if prof is not None:
+                merging = clock()
+
+            result = (z2 << (2 * half)) + ((z1 - z2 - z0) << half) + z0
+            if memo is not None and memo.active:
+                memo.put(key, result)
+            if prof is not None:
+                end = clock()
+                prof.node("karatsuba", depth, max(xbits, ybits), start, end,
+                          divide=divided - start, merge=end - merging)
+            return result
+
+        result = mul(x, y, 0)
+        self.comparisons += calls
+        return result
+
+
+# ----------------------------------------------------------------------
+# Index-range closest pair, shared with the parallel engine
+# ----------------------------------------------------------------------
+def closest_pair_range(xs, ys, lo, hi, monitor=None, depth=0, profile=None, events=None):
+    """Closest pair among indices lo..hi-1 of x-sorted coordinate arrays
+
+    Works on index ranges of the shared xs/ys sequences (lists, memoryviews
+    or arrays) and keeps each range sorted by y as the recursion unwinds, so
+    the strip never has to be re-sorted. Distances are compared squared and
+    the square root is only taken for the strip bound. Splits exactly like
+    closest_pair_recursive, so the pair and comparison count match it.
+
+    An optional replay.EventLog records the recursion with global indices.
+
+    Returns (squared distance, (i, j), comparisons) with global indices.
+    """
+    # order[p] is a global index; each order[a-lo:b-lo] gets sorted by (y, x-rank)
+    order = list(range(lo, hi))
+    y_key = ys.__getitem__
+    comparisons = 0
+    clock = time.perf_counter
+
+    def solve(lo_, hi_, depth):
+        nonlocal comparisons
+        size = hi_ - lo_
+        if monitor is not None:
+            monitor.enter(depth)
+        if profile is not None:
+            start = clock()
+
+        if size <= 3:
+            if events is not None:
+                events.base(depth, lo_, hi_)
+            best_d2 = float('inf')
+            best = None
+            first = comparisons
+            for i in range(lo_, hi_):
+                for j in range(i + 1, hi_):
+                    dx = xs[i] - xs[j]
+                    dy = ys[i] - ys[j]
+                    d2 = dx * dx + dy * dy
+                    comparisons += 1
+                    if d2 < best_d2:
+                        best_d2 = d2
+                        best = (i, j)
+                        if events is not None:
+                            events.new_best(depth, i, j, comparisons - first - 1, math.sqrt(d2))
+            if events is not None:
+                events.done(depth, lo_, hi_, math.sqrt(best_d2))
+            order[lo_ - lo:hi_ - lo] = sorted(order[lo_ - lo:hi_ - lo], key=y_key)
+            if monitor is not None:
+                monitor.points_done += size
+            if profile is not None:
+                end = clock()
+                profile.node("closest base", depth, size, start, end, base=end - start)
+            return best_d2, best
+
+        mid = lo_ + size // 2
+        if events is not None:
+            events.node(depth, lo_, hi_, xs[mid])
+        if profile is not None:
+            divided = clock()
+        dleft2, pair_left = solve(lo_, mid, depth + 1)
+        dright2, pair_right = solve(mid, hi_, depth + 1)
+        if profile is not None:
+            merging = clock()
+
+        d2 = min(dleft2, dright2)
+        best = pair_left if dleft2 < dright2 else pair_right
+
+        # Both halves are y-sorted runs, so this sort is a single linear merge
+        order[lo_ - lo:hi_ - lo] = sorted(order[lo_ - lo:hi_ - lo], key=y_key)
+
+        mid_x = xs[mid]
+        d = math.sqrt(d2)
+        strip = [i for i in order[lo_ - lo:hi_ - lo] if abs(xs[i] - mid_x) < d]
+
+        if events is not None:
+            events.strip_check(depth, lo_, strip, d)
+        d2, best, checked = strip_check(xs, ys, strip, d2, best, events, depth)
+        comparisons += checked
+        if events is not None:
+            events.done(depth, lo_, hi_, math.sqrt(d2))
+        if profile is not None:
+            end = clock()
+            profile.node("closest", depth, size, start, end, divide=divided - start,
+                         merge=end - merging, strip=len(strip))
+        return d2, best
+
+    d2, best = solve(lo, hi, depth)
+    return d2, best, comparisons
+
+
+def strip_check(xs, ys, strip, d2, best, events=None, depth=0):
+    """Compare each y-sorted strip index with the next six
+
+    Returns the updated (squared distance, pair, comparisons made).
+    """
+    comparisons = 0
+    m = len(strip)
+    for a in range(m):
+        i = strip[a]
+        xi = xs[i]
+        yi = ys[i]
+        for b in range(a + 1, min(a + 7, m)):
+            j = strip[b]
+            dx = xi - xs[j]
+            dy = yi - ys[j]
+            dist2 = dx * dx + dy * dy
+            comparisons += 1
+            if dist2 < d2:
+                d2 = dist2
+                best = (i, j)
+                if events is not None:
+                    events.new_best(depth, i, j, comparisons - 1, math.sqrt(d2))
+    return d2, best, comparisons
+
+
+# ----------------------------------------------------------------------
+# Input helpers shared by the visualizer and the batch runner
+# ----------------------------------------------------------------------
+def detect_algorithm(file_path):
+    """Guess the algorithm from the file name, then the contents; None if it cannot be told"""
+    name = os.path.basename(file_path).lower()
+    if "closest" in name or "closet" in name or name.endswith(".pts"):
+        return "closest"
+    if "integer" in name:
+        return "integer"
+    return sniff_algorithm(file_path)
+
+
+def sniff_algorithm(file_path, max_bytes=4096):
+    # Integer files hold exactly two whole numbers (often thousands of digits
+    # long); point files hold many "x y" coordinate pairs, or points of d
+    # coordinates after a "# dims D" header
+    with open(file_path, "rb") as f:
+        head = f.read(max_bytes)
+        complete = not f.read(1)
+    if head.startswith(BINARY_MAGIC):
+        return "closest"
+    try:
+        dims, offset = text_header(head)
+    except ValueError:
+        return None
+    tokens = head[offset:].split()
+    if not tokens:
+        return None
+    if not offset and all(is_int_token(t.decode("latin-1")) for t in tokens):
+        if len(tokens) == 2 or (not complete and len(tokens) < 2):
+            return "integer"
+    if not complete:
+        # The last token may be cut off at the read boundary
+        tokens = tokens[:-1]
+    elif len(tokens) % dims:
+        return None
+    try:
+        for t in tokens:
+            float(t)
+    except ValueError:
+        return None
+    return "closest"
+
+
+def read_tokens(file_path):
+    with open(file_path, 'r') as f:
+        return f.read().strip().split()
+
+
+def parse_points(data):
+    return [(float(data[i]), float(data[i + 1])) for i in range(0, len(data), 2)]
+
+
+def parse_integers(data):
+    # Decimal operands are parsed in O(M(n) log n), not int()'s O(n^2)
+    return parse_int(data[0]), parse_int(data[1])
+
+
+def run_file(file_path, algo_type="auto", trace=False, tracer=None, workers=1, parallel_depth=1,
+             cache=None, profile=None, memo=None):
+    """Run one input file and return a plain dict describing the result
+
+    With a result_cache.ResultCache a previously computed result for the same
+    file contents is returned as is, marked "cached". Traced and profiled
+    runs always recompute, since steps and timings are not cached. A
+    subproduct_cache.SubproductCache memoizes Karatsuba sub-products.
+    """
+    if algo_type == "auto":
+        algo_type = detect_algorithm(file_path)
+        if algo_type is None:
+            raise ValueError(f"Cannot auto-detect algorithm for {file_path}")
+
+    traced = trace or (tracer is not None and tracer.level != OFF)
+    key = None
+    if cache is not None and not traced and profile is None:
+        key = cache.key(file_path, algo_type)
+        stats = cache.get(key)
+        if stats is not None:
+            return {"file": file_path, "algorithm": algo_type, **stats, "cached": True}
+
+    engine = DivideConquerEngine(trace=trace, tracer=tracer, workers=workers,
+                                 parallel_depth=parallel_depth)
+    engine.profile = profile
+    engine.memo = memo
+    result = {"file": file_path, "algorithm": algo_type}
+
+    if algo_type == "closest":
+        points = load_points(file_path)
+        result["data_size"] = point_dims(points) * len(points)
+        start_time = time.perf_counter()
+        dist, pair = engine.closest_pair(points)
+        elapsed = time.perf_counter() - start_time
+        result["points"] = len(points)
+        result["dims"] = point_dims(points)
+        result["pair"] = [list(pair[0]), list(pair[1])] if pair else None
+        result["indices"] = list(engine.last_pair_indices) if pair else None
+        result["distance"] = dist
+        result["engine"] = engine.last_engine
+    elif algo_type == "integer":
+        data = read_tokens(file_path)
+        result["data_size"] = len(data)
+        x, y = parse_integers(data)
+        start_time = time.perf_counter()
+        product = engine.multiply(x, y)
+        elapsed = time.perf_counter() - start_time
+        result["product"] = to_decimal(product)
+        result["correct"] = product == x * y
+        result["engine"] = engine.last_engine
+        result["multiply_stats"] = engine.multiply_stats
+    else:
+        raise ValueError(f"Unknown algorithm: {algo_type}")
+
+    result["operations"] = engine.comparisons
+    result["time_ms"] = elapsed * 1000
+    if key is not None:
+        cache.put(key, {k: v for k, v in result.items() if k not in ("file", "algorithm")})
+        result["cached"] = False
+    if profile is not None:
+        result["profile"] = profile.rows()
+    if trace:
+        result["steps"] = engine.steps
+    return result
@@ -0,0 +1,258 @@
+"""Toom-Cook-3 and number-theoretic-transform integer multiplication
+
+toom3_multiply splits both operands into three parts and needs five
+sub-products of a third of the size, O(n^1.465), against Karatsuba's three
+of half the size, O(n^1.585).
+
+ntt_multiply is Schönhage-Strassen style: the operands are cut into N
+pieces and convolved with a length-N transform over the integers modulo
+2^K + 1, where 2 is a root of unity, so every twiddle factor is a shift
+and the result is exact. Transform work is O(n log n); the N pointwise
+products are small and go to the builtin multiply.
+
+Both work on bit splits and never convert to decimal. Thresholds for
+picking between them and Karatsuba are measured by
+"python benchmark.py --calibrate-multiply", which writes THRESHOLDS_FILE.
+"""
+import json
+import os
+import time
+
+THRESHOLDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               "multiply_thresholds.json")
+
+# Defaults measured on a CPython 3.11 x86-64 host; overridden by THRESHOLDS_FILE
+DEFAULT_THRESHOLDS = {
+    "toom3_bits": 1 << 15,
+    "ntt_bits": 1 << 20,
+}
+
+
+def load_thresholds(path=THRESHOLDS_FILE):
+    """Operand size (smaller operand, in bits) at which each algorithm takes over"""
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            thresholds.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+    # A null threshold means the algorithm never won: never select it
+    return {name: float("inf") if bits is None else bits for name, bits in thresholds.items()}
+
+
+def save_thresholds(thresholds, path=THRESHOLDS_FILE):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(thresholds, f, indent=2)
+        f.write("\n")
+
+
+# ----------------------------------------------------------------------
+# Toom-Cook-3
+# ----------------------------------------------------------------------
+def toom3_multiply(x, y, cutoff, monitor=None, profile=None):
+    """Return (product, recursive calls); parts at or below cutoff bits use x * y"""
+    calls = 0
+    clock = time.perf_counter
+
+    def mul(x, y, depth):
+        nonlocal calls
+        # Evaluation at -1 and -2 produces negative operands
+        if x < 0 or y < 0:
+            product = mul(abs(x), abs(y), depth)
+            return -product if (x < 0) != (y < 0) else product
+        calls += 1
+        if monitor is not None:
+            monitor.enter(depth)
+            monitor.subproducts_done += 1
+        bits = max(x.bit_length(), y.bit_length())
+        if x.bit_length() <= cutoff or y.bit_length() <= cutoff:
+            if profile is None:
+                return x * y
+            start = clock()
+            product = x * y
+            end = clock()
+            profile.node("toom3 base", depth, bits, start, end, base=end - start)
+            return product
+
+        if profile is not None:
+            start = clock()
+        k = (bits + 2) // 3
+        mask = (1 << k) - 1
+        x0, x1, x2 = x & mask, (x >> k) & mask, x >> (2 * k)
+        y0, y1, y2 = y & mask, (y >> k) & mask, y >> (2 * k)
+
+        # Evaluate at 0, 1, -1, -2 and infinity
+        x02 = x0 + x2
+        y02 = y0 + y2
+        if profile is not None:
+            divided = clock()
+        r0 = mul(x0, y0, depth + 1)
+        r1 = mul(x02 + x1, y02 + y1, depth + 1)
+        rm1 = mul(x02 - x1, y02 - y1, depth + 1)
+        rm2 = mul(x0 - (x1 << 1) + (x2 << 2), y0 - (y1 << 1) + (y2 << 2), depth + 1)
+        rinf = mul(x2, y2, depth + 1)
+        if profile is not None:
+            merging = clock()
+
+        # Bodrato's interpolation sequence; every division is exact
+        c3 = (rm2 - r1) // 3
+        c1 = (r1 - rm1) >> 1
+        c2 = rm1 - r0
+        c3 = ((c2 - c3) >> 1) + (rinf << 1)
+        c2 = c2 + c1 - rinf
+        c1 = c1 - c3
+
+        product = r0 + (c1 << k) + (c2 << (2 * k)) + (c3 << (3 * k)) + (rinf << (4 * k))
+        if profile is not None:
+            end = clock()
+            profile.node("toom3", depth, bits, start, end, divide=divided - start,
+                         merge=end - merging)
+        return product
+
+    if (x < 0) != (y < 0):
+        product = -mul(abs(x), abs(y), 0)
+    else:
+        product = mul(abs(x), abs(y), 0)
+    return product, calls
+
+
+# ----------------------------------------------------------------------
+# Number-theoretic transform over Z / (2^K + 1)
+# ----------------------------------------------------------------------
+def ntt_parameters(total_bits):
+    """(log2 N, piece bits M, coefficient bits K) for a product of total_bits"""
+    # N ~ sqrt(total) keeps the pieces and the transform length balanced
+    log_n = max(4, (total_bits.bit_length() + 1) // 2)
+    n = 1 << log_n
+    # pieces(x) + pieces(y) - 1 <= N, with byte-aligned pieces
+    piece = -(-total_bits // (n - 1))
+    piece = (piece + 7) & ~7
+    # Coefficients are below N * 2^(2M); K must be a multiple of N / 2 so
+    # that 2^(2K / N) is an N-th root of unity
+    coeff = 2 * piece + log_n + 1
+    half = n >> 1
+    coeff = -(-coeff // half) * half
+    return log_n, piece, coeff
+
+
+def _pieces(value, piece_bytes, count):
+    data = value.to_bytes(-(-value.bit_length() // 8) or 1, "little")
+    pieces = [int.from_bytes(data[i:i + piece_bytes], "little")
+              for i in range(0, len(data), piece_bytes)]
+    return pieces + [0] * (count - len(pieces))
+
+
+def _make_reduce(coeff):
+    mask = (1 << coeff) - 1
+    modulus = mask + 2
+
+    def reduce(v):
+        # 2^K = -1, so fold the high part back in with a minus sign
+        while v < 0 or v >= modulus:
+            v = (v & mask) - (v >> coeff)
+        return v
+
+    return reduce
+
+
+def _forward(a, log_n, coeff, reduce):
+    # Gentleman-Sande, natural order in, bit-reversed order out
+    n = 1 << log_n
+    unit = 2 * coeff // n  # omega = 2^unit
+    m = n
+    while m > 1:
+        half = m >> 1
+        step = unit * (n // m)
+        for start in range(0, n, m):
+            for j in range(start, start + half):
+                u = a[j]
+                v = a[j + half]
+                a[j] = reduce(u + v)
+                a[j + half] = reduce((u - v) << ((j - start) * step))
+        m = half
+
+
+def _inverse(a, log_n, coeff, reduce):
+    # Cooley-Tukey with omega^-1, bit-reversed order in, natural order out
+    n = 1 << log_n
+    unit = 2 * coeff // n
+    period = 2 * coeff  # 2^(2K) = 1
+    m = 2
+    while m <= n:
+        half = m >> 1
+        step = unit * (n // m)
+        for start in range(0, n, m):
+            for j in range(start, start + half):
+                u = a[j]
+                v = reduce(a[j + half] << ((period - (j - start) * step) % period))
+                a[j] = reduce(u + v)
+                a[j + half] = reduce(u - v)
+        m <<= 1
+    # Divide by N: 2^-log_n = 2^(2K - log_n)
+    scale = period - log_n
+    for i in range(n):
+        a[i] = reduce(a[i] << scale)
+
+
+def _recombine(coeffs, piece, lo, hi):
+    # Sum of coeffs[i] << (i * piece), split in halves to keep shifts short
+    if hi - lo == 1:
+        return coeffs[lo]
+    mid = (lo + hi) >> 1
+    return (_recombine(coeffs, piece, lo, mid)
+            + (_recombine(coeffs, piece, mid, hi) << ((mid - lo) * piece)))
+
+
+def ntt_multiply(x, y, monitor=None, profile=None):
+    """Return (product, stats) where stats describes the transform
+
+    A profile sees a single node: splitting and forward transforms as the
+    divide phase, pointwise products as the base case, and the inverse
+    transform with carry recombination as the merge.
+    """
+    if (x < 0) != (y < 0):
+        product, stats = ntt_multiply(abs(x), abs(y), monitor, profile)
+        return -product, stats
+    x, y = abs(x), abs(y)
+    log_n, piece, coeff = ntt_parameters(x.bit_length() + y.bit_length())
+    n = 1 << log_n
+    reduce = _make_reduce(coeff)
+    stats = {
+        "transform_length": n,
+        "piece_bits": piece,
+        "coefficient_bits": coeff,
+        # Squaring needs one forward transform instead of two
+        "butterflies": (2 if x == y else 3) * (n >> 1) * log_n,
+        "pointwise_products": n,
+    }
+    if x == 0 or y == 0:
+        return 0, stats
+
+    start = time.perf_counter()
+    a = _pieces(x, piece // 8, n)
+    if monitor is not None:
+        monitor.enter(0)
+    _forward(a, log_n, coeff, reduce)
+    if x == y:
+        b = a
+    else:
+        b = _pieces(y, piece // 8, n)
+        if monitor is not None:
+            monitor.enter(0)
+        _forward(b, log_n, coeff, reduce)
+
+    if monitor is not None:
+        monitor.enter(1)
+    divided = time.perf_counter()
+    c = [reduce(p * q) for p, q in zip(a, b)]
+    merging = time.perf_counter()
+    if monitor is not None:
+        monitor.subproducts_done += n
+        monitor.enter(2)
+    _inverse(c, log_n, coeff, reduce)
+    product = _recombine(c, piece, 0, n)
+    if profile is not None:
+        end = time.perf_counter()
+        profile.node("ntt", 0, max(x.bit_length(), y.bit_length()), start, end,
+                     divide=divided - start, base=merging - divided, merge=end - merging)
+    return product, stats
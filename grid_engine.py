@@ -0,0 +1,167 @@
+"""Closest pair engine for large point sets
+
+With NumPy installed the points are held as x/y float64 columns and the
+search is a vectorized sweep: points are ordered by their projection on a
+random direction and every point is compared with its k-th successor for
+k = 1, 2, ... until no successor is closer than the current best in
+projection. Without NumPy a randomized incremental grid (expected linear
+time) is used instead.
+"""
+import math
+import random
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional
+    np = None
+
+from point_store import PointStore
+
+HAVE_NUMPY = np is not None
+
+# Above this many sweep offsets the input is treated as adversarial for the
+# sweep and the randomized grid is used instead
+MAX_SWEEP_OFFSETS = 64
+
+
+def closest_pair_grid(points, seed=0, monitor=None):
+    """Return (distance, pair, comparisons) for (x, y) points
+
+    points is a point_store.PointStore or any sequence of (x, y).
+
+    An optional engine.RunMonitor gets points_done updates and can cancel.
+    """
+    store = PointStore.from_points(points)
+    dist, indices, comparisons = closest_pair_indices(store, seed, monitor)
+    if indices is None:
+        return dist, None, comparisons
+    return dist, (store[indices[0]], store[indices[1]]), comparisons
+
+
+def closest_pair_indices(points, seed=0, monitor=None):
+    """Like closest_pair_grid, but the pair is (i, j) indices into points"""
+    store = PointStore.from_points(points)
+    if len(store) < 2:
+        return float('inf'), None, 0
+    if HAVE_NUMPY:
+        # Columns are used as they are, e.g. views into a memory-mapped file
+        xs = np.asarray(store.xs, dtype=np.float64)
+        ys = np.asarray(store.ys, dtype=np.float64)
+        result = closest_pair_arrays(xs, ys, seed, monitor)
+        if result is not None:
+            d2, i, j, comparisons = result
+            return math.sqrt(d2), (i, j), comparisons
+        # Degenerate layout for the sweep, fall through to the grid
+        return _closest_pair_hashing(xs.tolist(), ys.tolist(), seed, monitor)
+    return _closest_pair_hashing(store.xs, store.ys, seed, monitor)
+
+
+def closest_pair_arrays(xs, ys, seed=0, monitor=None):
+    """Vectorized sweep over NumPy x/y columns
+
+    Returns (squared distance, i, j, comparisons) with i, j indices into the
+    input arrays, or None if the sweep gave up on a degenerate layout.
+    """
+    n = len(xs)
+    angle = random.Random(seed).uniform(0.0, math.pi)
+    proj = xs * math.cos(angle) + ys * math.sin(angle)
+    order = np.argsort(proj, kind="stable")
+    if n < 1 << 31:
+        order = order.astype(np.int32)
+    px = xs[order]
+    py = ys[order]
+    pp = proj[order]
+    del proj
+
+    # Projection is 1-Lipschitz; the slack covers rounding in proj
+    slack = 1e-12 * (float(np.abs(pp).max()) + 1.0)
+
+    best_d2 = math.inf
+    best_i = best_j = -1
+    comparisons = 0
+    for k in range(1, n):
+        if k > MAX_SWEEP_OFFSETS:
+            return None
+        if monitor is not None:
+            monitor.enter(0)
+        gap = pp[k:] - pp[:-k]
+        bound = math.sqrt(best_d2) + slack if best_d2 < math.inf else math.inf
+        candidates = np.nonzero(gap <= bound)[0]
+        if candidates.size == 0:
+            break
+        dx = px[candidates + k] - px[candidates]
+        dy = py[candidates + k] - py[candidates]
+        d2 = dx * dx + dy * dy
+        comparisons += int(candidates.size)
+        pos = int(np.argmin(d2))
+        if d2[pos] < best_d2:
+            best_d2 = float(d2[pos])
+            best_i = int(order[candidates[pos]])
+            best_j = int(order[candidates[pos] + k])
+        if best_d2 == 0.0:
+            break
+
+    return best_d2, best_i, best_j, comparisons
+
+
+def _closest_pair_hashing(xs, ys, seed, monitor=None):
+    # Randomized incremental algorithm: insert points in random order into a
+    # grid with cell size equal to the current best distance, so only the 3x3
+    # block around a new point can hold a closer one. The grid is rebuilt
+    # whenever the distance shrinks, which happens O(log n) times in expectation.
+    n = len(xs)
+    order = list(range(n))
+    random.Random(seed).shuffle(order)
+
+    a, b = order[0], order[1]
+    best = (a, b)
+    dx = xs[a] - xs[b]
+    dy = ys[a] - ys[b]
+    best_d2 = dx * dx + dy * dy
+    comparisons = 1
+
+    def build(count, cell):
+        grid = {}
+        for idx in order[:count]:
+            x = xs[idx]
+            y = ys[idx]
+            key = (math.floor(x / cell), math.floor(y / cell))
+            grid.setdefault(key, []).append(idx)
+        return grid
+
+    cell = math.sqrt(best_d2)
+    grid = build(2, cell) if cell > 0 else None
+
+    for k in range(2, n):
+        if best_d2 == 0.0:
+            break
+        if monitor is not None and not k & 4095:
+            monitor.enter(0)
+            monitor.points_done = k
+        idx = order[k]
+        x = xs[idx]
+        y = ys[idx]
+        cx = math.floor(x / cell)
+        cy = math.floor(y / cell)
+        improved = False
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                bucket = grid.get((gx, gy))
+                if not bucket:
+                    continue
+                for other in bucket:
+                    ddx = x - xs[other]
+                    ddy = y - ys[other]
+                    d2 = ddx * ddx + ddy * ddy
+                    comparisons += 1
+                    if d2 < best_d2:
+                        best_d2 = d2
+                        best = (other, idx)
+                        improved = True
+        if improved and best_d2 > 0.0:
+            cell = math.sqrt(best_d2)
+            grid = build(k + 1, cell)
+        elif not improved:
+            grid.setdefault((cx, cy), []).append(idx)
+
+    return math.sqrt(best_d2), best, comparisons
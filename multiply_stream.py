@@ -0,0 +1,116 @@
+"""Streaming multiplier for files with many operand pairs
+
+Each input line holds one pair "x y" (whitespace or comma separated, in
+decimal or with a 0x, 0o or 0b prefix). Lines are read lazily and
+multiplied in chunks by a process pool; only a bounded window of chunks is
+in flight, so neither inputs nor products are ever all held in memory.
+Products are written in decimal, one per line in input order, as soon as
+every earlier chunk is done. Blank lines are skipped; a bad line yields
+"ERROR <message>" in its place so output lines stay aligned with pairs.
+
+Examples:
+    python multiply_stream.py pairs.txt -o products.txt
+    python multiply_stream.py pairs.txt -o products.txt --jobs 4 --chunk 5000
+"""
+import argparse
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from decimal_io import literal_digits, parse_int, to_decimal
+from engine import DivideConquerEngine
+
+CHUNK_LINES = 2000  # Pairs sent to a worker at once
+WINDOW_PER_JOB = 2  # Chunks in flight per worker process
+
+
+def iter_pairs(path):
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def multiply_lines(lines):
+    """Return (output lines, operand digits, errors) for one chunk"""
+    engine = DivideConquerEngine(trace=False)
+    out = []
+    digits = 0
+    errors = 0
+    for line in lines:
+        try:
+            tokens = line.replace(",", " ").split()
+            if len(tokens) != 2:
+                raise ValueError(f"expected 2 operands, got {len(tokens)}")
+            x, y = parse_int(tokens[0]), parse_int(tokens[1])
+            out.append(to_decimal(engine.multiply(x, y)))
+            digits += literal_digits(tokens[0]) + literal_digits(tokens[1])
+        except ValueError as e:
+            out.append(f"ERROR {e}")
+            errors += 1
+    return out, digits, errors
+
+
+def multiply_stream(in_path, out, jobs=1, chunk_lines=CHUNK_LINES):
+    """Multiply every pair in in_path, writing products to out; returns stats"""
+    pairs = iter_pairs(in_path)
+    chunks = iter(lambda: list(islice(pairs, chunk_lines)), [])
+    stats = {"pairs": 0, "digits": 0, "errors": 0}
+    start_time = time.perf_counter()
+
+    def write(result, count):
+        lines, digits, errors = result
+        out.write("\n".join(lines))
+        out.write("\n")
+        stats["pairs"] += count
+        stats["digits"] += digits
+        stats["errors"] += errors
+
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            # Futures are drained oldest first, which keeps the input order
+            pending = deque()
+            for chunk in chunks:
+                pending.append((pool.submit(multiply_lines, chunk), len(chunk)))
+                if len(pending) >= jobs * WINDOW_PER_JOB:
+                    future, count = pending.popleft()
+                    write(future.result(), count)
+            while pending:
+                future, count = pending.popleft()
+                write(future.result(), count)
+    else:
+        for chunk in chunks:
+            write(multiply_lines(chunk), len(chunk))
+
+    elapsed = time.perf_counter() - start_time
+    stats["seconds"] = elapsed
+    stats["pairs_per_second"] = stats["pairs"] / elapsed if elapsed else 0.0
+    stats["digits_per_second"] = stats["digits"] / elapsed if elapsed else 0.0
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multiply every operand pair of a file, one pair per line")
+    parser.add_argument("input", help="file with one 'x y' pair per line")
+    parser.add_argument("-o", "--output", help="products file (default: stdout)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="worker processes")
+    parser.add_argument("--chunk", type=int, default=CHUNK_LINES, help="pairs per worker task")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        stats = multiply_stream(args.input, out, args.jobs, args.chunk)
+    finally:
+        if args.output:
+            out.close()
+    sys.stderr.write(f"{stats['pairs']} pairs ({stats['errors']} errors) in {stats['seconds']:.3f} s: "
+                     f"{stats['pairs_per_second']:.0f} pairs/s, "
+                     f"{stats['digits_per_second']:.0f} digits/s\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
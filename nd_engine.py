@@ -0,0 +1,341 @@
+"""Closest pair engine for points of any dimension
+
+The 2-D engines lean on the plane: the strip check's "7 neighbours" bound
+and the sweep's single projection both stop pruning as the dimension
+grows. Here the points are hashed into a grid instead (Rabin's method):
+
+1. The closest pair of a random sample of about 2 sqrt(n) points is a real
+   pair, so its distance d0 bounds the answer from above.
+2. Points are bucketed into cells of side d0 along the widest few
+   coordinates. Any pair closer than d0 differs by less than d0 in every
+   coordinate, so it lies in one cell or in two neighbouring ones.
+3. Only those pairs are compared, with the full d-dimensional distance.
+
+With the sample bound only O(n) pairs in expectation are closer than d0,
+so for small d the work stays near-linear after the O(n log n) sort. Each
+hashed coordinate multiplies the neighbour cells by three, so at most
+GRID_MAX_DIMS coordinates are hashed, and only those wide enough to split
+into more than three cells; in high dimension with few points nothing
+prunes and the search degrades towards brute force, as any exact method
+does.
+
+With NumPy the cell pairs are expanded and compared in vectorized blocks,
+and large ones (all of them, once nothing prunes) in matrix product tiles.
+Without it a randomized incremental grid (as in grid_engine) is used,
+hashing up to HASH_MAX_DIMS coordinates.
+"""
+import itertools
+import math
+import random
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional
+    np = None
+
+from point_store import PointMatrix
+
+HAVE_NUMPY = np is not None
+
+SAMPLE_FACTOR = 2  # Sample size is SAMPLE_FACTOR * sqrt(n)
+GRID_MAX_DIMS = 6  # Coordinates hashed by the vectorized grid (364 neighbour offsets)
+HASH_MAX_DIMS = 3  # Coordinates hashed by the pure Python grid
+BLOCK_PAIRS = 1 << 16  # Pairs compared per vectorized block
+TILE_MIN_PAIRS = 4096  # Cell pairs this large are compared by matrix product
+TILE_ROWS = 512  # Matrix product tile shape
+TILE_COLUMNS = 2048
+OFFSET_COST = 4  # Cost of visiting a neighbour offset, per cell, in pair comparisons
+SHRINK_RATIO = 0.5  # Regrid when same-cell pairs beat the cell size by this much
+KEY_LIMIT = 1 << 62  # Cell keys must fit in int64
+
+
+def closest_pair_nd(points, seed=0, monitor=None):
+    """Return (distance, (i, j), comparisons) for points with any number of coordinates
+
+    points is a point_store.PointMatrix, an (n, d) array or a sequence of
+    d-tuples; i < j are indices into it. An optional engine.RunMonitor gets
+    points_done updates and can cancel.
+    """
+    matrix = PointMatrix.from_points(points)
+    if len(matrix) < 2:
+        return float('inf'), None, 0
+    if HAVE_NUMPY:
+        d2, i, j, comparisons = closest_pair_rows(matrix.rows(), seed, monitor)
+        return math.sqrt(d2), (i, j), comparisons
+    return _closest_pair_hashing(list(matrix), seed, monitor)
+
+
+def grid_axes(spans, cell, max_dims, n):
+    """Coordinates to hash, widest first
+
+    A coordinate is added while it pays: it multiplies the neighbour
+    offsets by three and, for points spread evenly, divides the points in
+    a 3^m cell neighbourhood by span / (3 cell).
+    """
+    axes = []
+    cells = 1
+    neighbours = float(n)  # Expected points in the neighbourhood of a cell
+    for k in sorted(range(len(spans)), key=lambda k: -spans[k]):
+        if len(axes) == max_dims or not cell > 0 or spans[k] <= 3 * cell:
+            break
+        radix = int(spans[k] / cell) + 3
+        if cells * radix >= KEY_LIMIT:
+            break
+        fraction = 3 * cell / spans[k]
+        if 3 ** len(axes) * OFFSET_COST + neighbours <= 3 ** (len(axes) + 1) * OFFSET_COST + neighbours * fraction:
+            break
+        axes.append(k)
+        cells *= radix
+        neighbours *= fraction
+    return axes
+
+
+def closest_pair_rows(rows, seed=0, monitor=None):
+    """Vectorized grid search over an (n, d) float64 array
+
+    Returns (squared distance, i, j, comparisons) with i < j row indices.
+    """
+    n = len(rows)
+    rng = np.random.default_rng(seed)
+
+    # Upper bound from a sample, by brute force over its pairs
+    size = min(n, max(2, int(SAMPLE_FACTOR * math.sqrt(n))))
+    sample = np.sort(rng.choice(n, size, replace=False)) if size < n else np.arange(n)
+    best = [math.inf, -1, -1]
+    whole = np.array([0])
+    comparisons = _scan_cells(rows[sample], whole, np.array([size]), whole, np.array([size]),
+                              True, best, monitor)
+    best[1:] = sample[best[1]], sample[best[2]]
+    if size == n or best[0] == 0.0:
+        return (*_ordered(best), comparisons)
+
+    low = rows.min(axis=0)
+    spans = (rows.max(axis=0) - low).tolist()
+    while True:
+        # Slightly wider cells, so rounding in the division can't separate a
+        # pair closer than the bound by two cells
+        cell = math.sqrt(best[0]) * (1 + 1e-9)
+        grid = _build_grid(rows, low, spans, cell)
+        cells, order, starts, counts = grid[:4]
+        # Pairs within one cell: each point with the later points of its cell
+        found = [math.inf, -1, -1]
+        comparisons += _scan_cells(cells, starts, counts, starts, counts, True, found, monitor)
+        if found[0] < best[0]:
+            best[:] = found[0], order[found[1]], order[found[2]]
+        # Same-cell pairs are cheap to find; when they beat the bound by far,
+        # a grid of smaller cells has much fewer neighbour pairs
+        if best[0] == 0.0 or math.sqrt(best[0]) > SHRINK_RATIO * cell:
+            break
+
+    # Pairs in neighbouring cells; of each offset and its negation only one
+    # is visited, so every cell pair is compared once
+    cell_keys, strides = grid[4:]
+    for offset in itertools.product((-1, 0, 1), repeat=len(strides)):
+        if offset <= (0,) * len(strides):
+            continue
+        if best[0] == 0.0:
+            break
+        delta = sum(o * s for o, s in zip(offset, strides))
+        pos = np.searchsorted(cell_keys, cell_keys + delta)
+        pos[pos == len(cell_keys)] = 0
+        hit = np.nonzero(cell_keys[pos] == cell_keys + delta)[0]
+        if hit.size == 0:
+            continue
+        other = pos[hit]
+        found = [best[0], -1, -1]
+        comparisons += _scan_cells(cells, starts[hit], counts[hit], starts[other], counts[other],
+                                   False, found, monitor)
+        if found[1] >= 0:
+            best[:] = found[0], order[found[1]], order[found[2]]
+
+    return (*_ordered(best), comparisons)
+
+
+def _build_grid(rows, low, spans, cell):
+    """(rows in cell order, order, cell starts, cell counts, cell keys, key strides)"""
+    axes = grid_axes(spans, cell, GRID_MAX_DIMS, len(rows))
+    # Cell key: mixed radix over the hashed coordinates, each shifted by one
+    # so neighbour keys never wrap around
+    keys = np.zeros(len(rows), dtype=np.int64)
+    strides = []
+    stride = 1
+    for k in axes:
+        strides.append(stride)
+        keys += (np.floor((rows[:, k] - low[k]) / cell).astype(np.int64) + 1) * stride
+        stride *= int(spans[k] / cell) + 3
+    order = np.argsort(keys, kind="stable")
+    cell_keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+    # Points of a cell are contiguous, which keeps the gathers local
+    return rows[order], order, starts, counts, cell_keys, strides
+
+
+def _ordered(best):
+    d2, i, j = best
+    return d2, int(min(i, j)), int(max(i, j))
+
+
+def _expand(starts, counts):
+    # Concatenation of the ranges [start, start + count)
+    total = int(counts.sum())
+    shift = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return shift + np.arange(total)
+
+
+def _scan_cells(rows, a_start, a_count, b_start, b_count, same, best, monitor):
+    """Compare every point of cell a with every point of cell b, for each cell pair
+
+    Cells are ranges [start, start + count) of rows; with same, a and b are
+    the same cell and each pair is compared once. Updates best =
+    [squared distance, i, j] (row positions) in place and returns the
+    number of pairs compared.
+    """
+    comparisons = 0
+    pairs = a_count * b_count
+    big = np.nonzero(pairs >= TILE_MIN_PAIRS)[0]
+    for s, c, t, m in zip(a_start[big].tolist(), a_count[big].tolist(),
+                          b_start[big].tolist(), b_count[big].tolist()):
+        comparisons += _scan_tile(rows, s, c, t, m, same, best, monitor)
+        if best[0] == 0.0:
+            return comparisons
+
+    # Small cell pairs: one row per point of a, gathered into blocks
+    small = pairs < TILE_MIN_PAIRS
+    counts = a_count[small]
+    a = _expand(a_start[small], counts)
+    if same:
+        ends = np.repeat(a_start[small] + counts, counts)
+        return comparisons + _scan_rows(rows, a, a + 1, ends - a - 1, best, monitor)
+    return comparisons + _scan_rows(rows, a, np.repeat(b_start[small], counts),
+                                    np.repeat(b_count[small], counts), best, monitor)
+
+
+def _scan_tile(rows, s, c, t, m, same, best, monitor):
+    # rows[s:s + c] against rows[t:t + m] by matrix product, in tiles:
+    # |a - b|^2 = |a|^2 + |b|^2 - 2 a.b. That loses precision, so only the
+    # pairs within the rounding bound of the minimum are rechecked exactly.
+    comparisons = 0
+    eps = np.finfo(np.float64).eps
+    for r0 in range(s, s + c, TILE_ROWS):
+        r1 = min(r0 + TILE_ROWS, s + c)
+        for c0 in range(r0 + 1 if same else t, t + m, TILE_COLUMNS):
+            c1 = min(c0 + TILE_COLUMNS, t + m)
+            # Centring on a point of the tile keeps the magnitudes, and so
+            # the rounding bound, at the scale of the tile
+            center = rows[c0]
+            A = rows[r0:r1] - center
+            B = rows[c0:c1] - center
+            sa = np.einsum("ij,ij->i", A, A)
+            sb = np.einsum("ij,ij->i", B, B)
+            G = A @ B.T
+            G *= -2.0
+            G += sa[:, None]
+            G += sb[None, :]
+            pairs = G.size
+            if same and c0 < r1:
+                # Row r0 + i pairs with column c0 + j only if c0 + j > r0 + i
+                below = np.tri(r1 - r0, c1 - c0, r0 - c0, dtype=bool)
+                G[below] = np.inf
+                pairs -= int(np.count_nonzero(below))
+            comparisons += pairs
+            bound = 2 * (2 * A.shape[1] + 4) * eps * (float(sa.max()) + float(sb.max()))
+            low = float(G.min())
+            if low - bound < best[0]:
+                i, j = np.nonzero(G <= min(low, best[0]) + bound)
+                diff = rows[r0 + i] - rows[c0 + j]
+                d2 = np.einsum("ij,ij->i", diff, diff)
+                pos = int(np.argmin(d2))
+                if d2[pos] < best[0]:
+                    best[:] = float(d2[pos]), r0 + int(i[pos]), c0 + int(j[pos])
+                    if best[0] == 0.0:
+                        return comparisons
+        if monitor is not None:
+            monitor.enter(0)
+            monitor.points_done = max(monitor.points_done, r1)
+    return comparisons
+
+
+def _scan_rows(rows, a, b_start, b_count, best, monitor):
+    # rows[a[r]] against rows[b_start[r]:b_start[r] + b_count[r]] for every
+    # r, gathered into blocks of about BLOCK_PAIRS pairs
+    keep = b_count > 0
+    a, b_start, b_count = a[keep], b_start[keep], b_count[keep]
+    total = np.cumsum(b_count)
+    comparisons = 0
+    lo = 0
+    while lo < len(a):
+        hi = int(np.searchsorted(total, (total[lo - 1] if lo else 0) + BLOCK_PAIRS, side="right"))
+        hi = max(hi, lo + 1)
+        counts = b_count[lo:hi]
+        left = np.repeat(a[lo:hi], counts)
+        right = _expand(b_start[lo:hi], counts)
+        diff = rows.take(left, axis=0)
+        diff -= rows.take(right, axis=0)
+        d2 = np.einsum("ij,ij->i", diff, diff)
+        comparisons += int(d2.size)
+        pos = int(np.argmin(d2))
+        if d2[pos] < best[0]:
+            best[:] = float(d2[pos]), int(left[pos]), int(right[pos])
+            if best[0] == 0.0:
+                break
+        if monitor is not None:
+            monitor.enter(0)
+            monitor.points_done = max(monitor.points_done, int(a[hi - 1]))
+        lo = hi
+    return comparisons
+
+
+def _closest_pair_hashing(points, seed, monitor=None):
+    # Randomized incremental grid as in grid_engine, over the hashed
+    # coordinates only: a new point is compared with the 3^m cells around
+    # it and the grid is rebuilt whenever the distance shrinks
+    n = len(points)
+    dims = len(points[0])
+    order = list(range(n))
+    random.Random(seed).shuffle(order)
+
+    a, b = order[0], order[1]
+    best = (a, b)
+    best_dist = math.dist(points[a], points[b])
+    comparisons = 1
+
+    spans = [max(p[k] for p in points) - min(p[k] for p in points) for k in range(dims)]
+
+    def build(count, cell):
+        axes = grid_axes(spans, cell, HASH_MAX_DIMS, n)
+        grid = {}
+        for idx in order[:count]:
+            p = points[idx]
+            grid.setdefault(tuple(math.floor(p[k] / cell) for k in axes), []).append(idx)
+        return axes, grid
+
+    cell = best_dist
+    axes, grid = build(2, cell) if cell > 0 else ((), None)
+
+    for k in range(2, n):
+        if best_dist == 0.0:
+            break
+        if monitor is not None and not k & 4095:
+            monitor.enter(0)
+            monitor.points_done = k
+        idx = order[k]
+        p = points[idx]
+        key = tuple(math.floor(p[axis] / cell) for axis in axes)
+        improved = False
+        for offset in itertools.product((-1, 0, 1), repeat=len(axes)):
+            bucket = grid.get(tuple(c + o for c, o in zip(key, offset)))
+            if not bucket:
+                continue
+            for other in bucket:
+                dist = math.dist(p, points[other])
+                comparisons += 1
+                if dist < best_dist:
+                    best_dist = dist
+                    best = (other, idx)
+                    improved = True
+        if improved and best_dist > 0.0:
+            cell = best_dist
+            axes, grid = build(k + 1, cell)
+        elif not improved:
+            grid.setdefault(key, []).append(idx)
+
+    return best_dist, (min(best), max(best)), comparisons
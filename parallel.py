@@ -0,0 +1,242 @@
+"""Multi-core closest pair over a process pool
+
+The x-sorted coordinates are written once into a shared memory block. The
+serial recursion tree is cut at a fixed depth and each subtree below the cut
+(a slab of consecutive x-sorted points) is solved in a worker process by
+engine.closest_pair_range, reading the shared arrays directly instead of
+unpickling point lists. The parent then redoes the merges above the cut with
+the usual d-band strip check. Slabs are exactly the serial subtrees and the
+strips are ordered the same way, so the pair and comparison count match the
+serial algorithm.
+"""
+import math
+import os
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from multiprocessing import shared_memory
+
+from engine import closest_pair_range, strip_check
+from point_store import PointStore
+
+# Below this many points the pool costs more than it saves
+PARALLEL_MIN_POINTS = 50000
+# More slabs than workers evens out the load between processes
+SLABS_PER_WORKER = 4
+# How often a wait on a pool task checks for cancellation
+CANCEL_POLL_SECONDS = 0.1
+
+# Worker-side view of the shared coordinates, set up by _attach
+_shared = {}
+
+
+def _attach(name, n):
+    # Workers share the parent's resource tracker, which unlinks the block
+    # if the parent dies; the parent unlinks it normally
+    shm = shared_memory.SharedMemory(name=name)
+    coords = shm.buf.cast("d")
+    _shared["shm"] = shm
+    _shared["xs"] = coords[:n]
+    _shared["ys"] = coords[n:2 * n]
+
+
+def _solve_slab(lo, hi):
+    return closest_pair_range(_shared["xs"], _shared["ys"], lo, hi)
+
+
+def wait_result(future, monitor, depth):
+    """future.result(), checking the monitor for cancellation while it waits"""
+    if monitor is None:
+        return future.result()
+    while True:
+        monitor.enter(depth)
+        try:
+            return future.result(timeout=CANCEL_POLL_SECONDS)
+        except TimeoutError:
+            pass
+
+
+def slab_ranges(n, levels):
+    """Index ranges of the serial recursion tree at depth `levels`
+
+    Subtrees that hit the brute force base case earlier are returned whole.
+    """
+    ranges = []
+
+    def walk(lo, hi, depth):
+        if depth == levels or hi - lo <= 3:
+            ranges.append((lo, hi))
+            return
+        mid = lo + (hi - lo) // 2
+        walk(lo, mid, depth + 1)
+        walk(mid, hi, depth + 1)
+
+    walk(0, n, 0)
+    return ranges
+
+
+def closest_pair_parallel(points, workers=None, monitor=None):
+    """Return (distance, (i, j), comparisons) using `workers` processes
+
+    points is a point_store.PointStore or any sequence of (x, y); i and j
+    are input indices.
+    """
+    store = PointStore.from_points(points)
+    n = len(store)
+    if n < 2:
+        return float('inf'), None, 0
+    workers = workers or os.cpu_count() or 1
+    levels = max(0, math.ceil(math.log2(workers * SLABS_PER_WORKER)))
+
+    # Same stable x-order as the serial engine
+    col_x, col_y, order = store.sorted_columns()
+
+    shm = shared_memory.SharedMemory(create=True, size=16 * n)
+    coords = shm.buf.cast("d")
+    xs = coords[:n]
+    ys = coords[n:2 * n]
+    try:
+        xs[:] = col_x
+        ys[:] = col_y
+
+        ranges = slab_ranges(n, levels)
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                   initargs=(shm.name, n))
+        try:
+            futures = [pool.submit(_solve_slab, lo, hi) for lo, hi in ranges]
+            slabs = {}
+            for (lo, hi), future in zip(ranges, futures):
+                slabs[(lo, hi)] = wait_result(future, monitor, levels)
+                if monitor is not None:
+                    monitor.points_done += hi - lo
+        except BaseException:
+            # Leaving a with block would wait for every queued slab; a
+            # cancel has to return now
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+
+        comparisons = sum(result[2] for result in slabs.values())
+
+        def merge(lo, hi, depth):
+            nonlocal comparisons
+            if (lo, hi) in slabs:
+                d2, best, _ = slabs[(lo, hi)]
+                return d2, best
+            if monitor is not None:
+                monitor.enter(depth)
+            mid = lo + (hi - lo) // 2
+            dleft2, pair_left = merge(lo, mid, depth + 1)
+            dright2, pair_right = merge(mid, hi, depth + 1)
+
+            d2 = min(dleft2, dright2)
+            best = pair_left if dleft2 < dright2 else pair_right
+
+            # xs is sorted, so the band is found by bisection; the margin
+            # absorbs rounding and the exact test is the serial one
+            mid_x = xs[mid]
+            d = math.sqrt(d2)
+            margin = d * 1e-9 + abs(mid_x) * 1e-15
+            first = bisect_left(xs, mid_x - d - margin, lo, hi)
+            last = bisect_right(xs, mid_x + d + margin, lo, hi)
+            strip = [i for i in range(first, last) if abs(xs[i] - mid_x) < d]
+            # Same order as the serial y-merge: by y, ties in x-sorted order
+            strip.sort(key=lambda i: (ys[i], i))
+
+            d2, best, checked = strip_check(xs, ys, strip, d2, best)
+            comparisons += checked
+            return d2, best
+
+        d2, (i, j) = merge(0, n, 0)
+        return math.sqrt(d2), (order[i], order[j]), comparisons
+    finally:
+        xs.release()
+        ys.release()
+        coords.release()
+        shm.close()
+        shm.unlink()
+
+
+# ----------------------------------------------------------------------
+# Karatsuba
+# ----------------------------------------------------------------------
+# Operands smaller than this stay on the serial path
+PARALLEL_MIN_BITS = 1 << 20
+
+
+def _to_bytes(value):
+    return value.to_bytes((value.bit_length() + 7) // 8, "little")
+
+
+def _multiply_bytes(x_bytes, y_bytes, cutoff):
+    from engine import DivideConquerEngine
+    engine = DivideConquerEngine(trace=False, karatsuba_cutoff=cutoff)
+    product = engine.karatsuba_binary(int.from_bytes(x_bytes, "little"),
+                                      int.from_bytes(y_bytes, "little"))
+    return _to_bytes(product), engine.comparisons
+
+
+def karatsuba_parallel(x, y, workers=None, depth=1, cutoff=None, monitor=None):
+    """Karatsuba with the top `depth` levels fanned out to a process pool
+
+    depth=1 sends the three sub-products of the first split to workers,
+    depth=2 the nine of the second. Operands travel as raw little-endian
+    bytes. Returns (product, recursive calls).
+    """
+    from engine import DivideConquerEngine
+    if cutoff is None:
+        cutoff = DivideConquerEngine.KARATSUBA_CUTOFF_BITS
+    if (x < 0) != (y < 0):
+        product, calls = karatsuba_parallel(abs(x), abs(y), workers, depth, cutoff, monitor)
+        return -product, calls
+    x, y = abs(x), abs(y)
+    workers = workers or os.cpu_count() or 1
+
+    # Split the top levels in the parent; leaves become pool tasks
+    leaves = []
+    calls = 0
+
+    def split(x, y, level):
+        nonlocal calls
+        if level == depth or min(x.bit_length(), y.bit_length()) <= cutoff:
+            leaves.append((x, y))
+            return len(leaves) - 1
+        calls += 1
+        half = max(x.bit_length(), y.bit_length()) >> 1
+        mask = (1 << half) - 1
+        high1, low1 = x >> half, x & mask
+        high2, low2 = y >> half, y & mask
+        return (half,
+                split(low1, low2, level + 1),
+                split(low1 + high1, low2 + high2, level + 1),
+                split(high1, high2, level + 1))
+
+    tree = split(x, y, 0)
+
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(leaves)))
+    try:
+        futures = [pool.submit(_multiply_bytes, _to_bytes(a), _to_bytes(b), cutoff)
+                   for a, b in leaves]
+        del leaves
+        products = []
+        for future in futures:
+            product_bytes, leaf_calls = wait_result(future, monitor, depth)
+            products.append(int.from_bytes(product_bytes, "little"))
+            calls += leaf_calls
+            if monitor is not None:
+                monitor.subproducts_done += 1
+    except BaseException:
+        # Don't wait for the remaining leaf products on a cancel
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+
+    def combine(node):
+        if isinstance(node, int):
+            return products[node]
+        half, low, mid, high = node
+        z0 = combine(low)
+        z2 = combine(high)
+        z1 = combine(mid) - z2 - z0
+        return (z2 << (2 * half)) + (z1 << half) + z0
+
+    return combine(tree), calls
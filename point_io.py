@@ -0,0 +1,216 @@
+"""Point file loading: streaming text parser and compact binary format
+
+Text files hold whitespace separated "x y" coordinates and are parsed a
+chunk at a time, so the whole file is never held as one string or one list
+of tokens. A text file holds 2-D points unless its first line is a
+"# dims D" header, which makes every D coordinates one point. Binary .pts
+files are a 16 byte header (magic + point count) followed by little-endian
+float64 x, y pairs, and are memory-mapped on load.
+
+Loaded 2-D points are a point_store.PointStore: x/y float64 columns that
+are views into the parsed (or memory-mapped) coordinates when NumPy is
+installed, and two array('d') columns otherwise. Points of higher
+dimension are a point_store.PointMatrix over the same flat coordinates;
+the binary format holds 2-D points only.
+
+Convert a text file:
+    python point_io.py closetpair1.txt closetpair1.pts
+"""
+import mmap
+import os
+import struct
+import sys
+import warnings
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional
+    np = None
+
+from point_store import PointMatrix, PointStore
+
+BINARY_MAGIC = b"DCPTS1\0\0"
+HEADER = struct.Struct("<8sQ")
+CHUNK_BYTES = 1 << 20
+PREVIEW_BYTES = 4096
+DIMS_HEADER = b"# dims"
+WHITESPACE = b" \t\n\r\x0b\x0c"  # What bytes.split() splits on
+
+
+def is_binary_points(path):
+    with open(path, "rb") as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def text_header(head):
+    """(coordinates per point, header length in bytes) of a text file
+
+    head is the start of the file. Points are 2-D unless the first line is
+    a "# dims D" header; line breaks never matter, so "x1 y1 x2 y2" lines
+    are still two 2-D points.
+    """
+    if not head.startswith(DIMS_HEADER[:1]):
+        return 2, 0
+    end = head.find(b"\n")
+    line = head if end < 0 else head[:end]
+    fields = line.split()
+    dims = int(fields[2]) if len(fields) == 3 and fields[2].isdigit() else 0
+    if fields[:2] != DIMS_HEADER.split() or dims < 2:
+        raise ValueError(f"bad header {line[:50].decode('latin-1')!r}, expected '# dims D'")
+    return dims, len(line) + 1
+
+
+def file_header(path):
+    with open(path, "rb") as f:
+        return text_header(f.read(PREVIEW_BYTES))
+
+
+def load_points(path):
+    if is_binary_points(path):
+        return load_points_binary(path)
+    return load_points_text(path)
+
+
+def iter_text_chunks(path, chunk_bytes=CHUNK_BYTES, offset=0):
+    """Yield flat array('d') coordinate chunks (x0, y0, x1, y1, ...) from offset on"""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        tail = b""
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            block = tail + block
+            # Keep a token that may continue into the next block
+            cut = max(block.rfind(b" "), block.rfind(b"\n"), block.rfind(b"\t"))
+            if cut < 0:
+                tail = block
+                continue
+            tail = block[cut + 1:]
+            yield _parse_block(block[:cut + 1])
+        if tail.strip():
+            yield _parse_block(tail)
+
+
+def _parse_block(block):
+    if np is not None:
+        # Parsed straight from the bytes, with no object per token
+        if block.isspace():
+            return np.empty(0)  # fromstring reads blank text as [-1.0]
+        with warnings.catch_warnings():
+            # Older NumPy only warns about text it cannot parse
+            warnings.simplefilter("error", DeprecationWarning)
+            try:
+                return np.fromstring(block, sep=" ")
+            except DeprecationWarning as e:
+                raise ValueError(str(e)) from None
+    return array("d", map(float, block.split()))
+
+
+def load_points_text(path, chunk_bytes=CHUNK_BYTES):
+    # Coordinates can be split across chunks, so group them only at the end
+    dims, offset = file_header(path)
+    if np is not None:
+        chunks = list(iter_text_chunks(path, chunk_bytes, offset))
+        flat = np.concatenate(chunks) if chunks else np.empty(0)
+        del chunks
+    else:
+        flat = array("d")
+        for chunk in iter_text_chunks(path, chunk_bytes, offset):
+            flat.extend(chunk)
+    if dims > 2:
+        if len(flat) % dims:
+            raise ValueError(f"{path}: {len(flat)} coordinates is not a multiple of {dims}")
+        return PointMatrix.from_flat(flat, dims)
+    if len(flat) % 2:
+        raise ValueError(f"{path}: odd number of coordinates")
+    return PointStore.from_flat(flat)
+
+
+def load_points_binary(path):
+    with open(path, "rb") as f:
+        magic, count = HEADER.unpack(f.read(HEADER.size))
+        if magic != BINARY_MAGIC:
+            raise ValueError(f"{path}: not a binary point file")
+        if count == 0:
+            return PointStore.from_flat(np.empty(0) if np is not None else array("d"))
+        if np is not None:
+            return PointStore.from_flat(
+                np.memmap(path, dtype="<f8", mode="r", offset=HEADER.size, shape=(2 * count,)))
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    flat = memoryview(mapped)[HEADER.size:HEADER.size + 16 * count].cast("d")
+    if sys.byteorder != "little":
+        flat = array("d", flat)
+        flat.byteswap()
+    return PointStore.from_flat(flat)
+
+
+def save_points_binary(path, points):
+    """Write points (a PointStore or any sequence of (x, y)) in the binary .pts format"""
+    if getattr(points, "dims", 2) != 2:
+        raise ValueError("binary point files hold 2-D points only")
+    store = PointStore.from_points(points)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(BINARY_MAGIC, len(store)))
+        if np is not None:
+            np.column_stack((store.xs, store.ys)).astype("<f8").tofile(f)
+            return
+        flat = array("d", bytes(16 * len(store)))
+        flat[0::2] = store.xs
+        flat[1::2] = store.ys
+        if sys.byteorder != "little":
+            flat.byteswap()
+        flat.tofile(f)
+
+
+def _count_tokens(block, after_space):
+    """Tokens starting in block; after_space tells if the byte before it was whitespace"""
+    if np is not None:
+        # No per-token objects: mark the bytes that begin a token
+        space = np.isin(np.frombuffer(block, dtype=np.uint8), np.frombuffer(WHITESPACE, dtype=np.uint8))
+        return int(np.count_nonzero(space[:-1] & ~space[1:])) + (after_space and not space[0])
+    return len(block.split()) - (not after_space and not block[:1].isspace())
+
+
+def file_preview(path, max_bytes=PREVIEW_BYTES):
+    """Return (preview text, file size in bytes, point count)
+
+    The point count comes from the header for binary files. Text files are
+    counted like load_points_text parses them: coordinates, whatever the
+    line breaks, divided by the coordinates per point.
+    """
+    size = os.path.getsize(path)
+    if is_binary_points(path):
+        with open(path, "rb") as f:
+            _, count = HEADER.unpack(f.read(HEADER.size))
+            f.seek(HEADER.size)
+            flat = array("d", f.read(min(count, 20) * 16))
+        if sys.byteorder != "little":
+            flat.byteswap()
+        preview = "".join(f"{flat[i]} {flat[i + 1]}\n" for i in range(0, len(flat), 2))
+        return preview, size, count
+
+    tokens = 0
+    after_space = True
+    with open(path, "rb") as f:
+        head = f.read(max_bytes)
+        try:
+            dims, offset = text_header(head)
+        except ValueError:  # load_points reports it
+            dims, offset = 2, 0
+        f.seek(offset)
+        for block in iter(lambda: f.read(CHUNK_BYTES), b""):
+            tokens += _count_tokens(block, after_space)
+            after_space = block[-1:].isspace()
+    preview = head.decode("utf-8", errors="replace")
+    if size > max_bytes:
+        cut = preview.rfind("\n")
+        preview = preview[:cut + 1] if cut > 0 else preview + "..."
+    return preview, size, tokens // dims
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python point_io.py INPUT.txt OUTPUT.pts")
+    save_points_binary(sys.argv[2], load_points(sys.argv[1]))
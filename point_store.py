@@ -0,0 +1,193 @@
+"""Columnar point storage shared by the loader, the engines and the canvas
+
+A PointStore keeps x and y in two float64 columns (NumPy arrays when NumPy
+is installed, array('d') otherwise): 16 bytes a point, against well over
+100 for a tuple of two boxed floats. Point i is always the i-th point of
+the input.
+
+The divide & conquer engines need the points in x order. sorted_columns
+builds that once per store: an int32 permutation plus x-sorted copies of
+the columns. The recursion works on index ranges of those, so no level
+copies points, and a result (i, j) in sorted positions maps back to input
+indices through the permutation.
+
+A store still reads like a sequence of (x, y) tuples, so code that only
+iterates or indexes points needs no changes.
+
+Points with three or more coordinates go in a PointMatrix instead: one
+row-major float64 buffer, read like a sequence of d-tuples, with a 2-D
+projection for the canvas.
+"""
+from array import array
+from itertools import chain
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional
+    np = None
+
+
+def point_dims(points):
+    """Coordinates per point of a store, matrix, (n, d) array or sequence of tuples"""
+    dims = getattr(points, "dims", None)
+    if dims is not None:
+        return dims
+    if np is not None and isinstance(points, np.ndarray):
+        return points.shape[1] if points.ndim == 2 else 2
+    return len(points[0]) if len(points) else 2
+
+
+class PointStore:
+    dims = 2
+
+    def __init__(self, xs, ys):
+        if len(xs) != len(ys):
+            raise ValueError("x and y columns differ in length")
+        self.xs = xs
+        self.ys = ys
+        self._sorted = None  # (sorted xs, sorted ys, order) once built
+
+    @classmethod
+    def from_flat(cls, flat):
+        """Store over interleaved x0, y0, x1, y1, ... coordinates
+
+        NumPy input gives strided views with no copy, which keeps a
+        memory-mapped file on disk; array('d') input is split into columns.
+        """
+        if len(flat) % 2:
+            raise ValueError("odd number of coordinates")
+        if np is not None and isinstance(flat, np.ndarray):
+            pairs = flat.reshape(-1, 2)
+            return cls(pairs[:, 0], pairs[:, 1])
+        return cls(array("d", flat[0::2]), array("d", flat[1::2]))
+
+    @classmethod
+    def from_points(cls, points):
+        """Store over any sequence of (x, y); a store is returned as is"""
+        if isinstance(points, cls):
+            return points
+        if np is not None:
+            if isinstance(points, np.ndarray):
+                pairs = points.reshape(-1, 2)
+                return cls(pairs[:, 0], pairs[:, 1])
+            n = len(points)
+            return cls(np.fromiter((p[0] for p in points), dtype=np.float64, count=n),
+                       np.fromiter((p[1] for p in points), dtype=np.float64, count=n))
+        return cls(array("d", (p[0] for p in points)), array("d", (p[1] for p in points)))
+
+    def __len__(self):
+        return len(self.xs)
+
+    def __getitem__(self, i):
+        return float(self.xs[i]), float(self.ys[i])
+
+    def __iter__(self):
+        return zip(map(float, self.xs), map(float, self.ys))
+
+    @property
+    def nbytes(self):
+        """Bytes held by the columns and, once built, the sorted copies"""
+        total = 16 * len(self)
+        if self._sorted is not None:
+            total += 20 * len(self)
+        return total
+
+    def sorted_columns(self):
+        """(xs, ys, order) in stable x order, as memoryviews
+
+        order[k] is the input index of the k-th point by x; the same order
+        as sorted(points, key=lambda p: p[0]). Built on the first call.
+        """
+        if self._sorted is None:
+            n = len(self)
+            if np is not None and isinstance(self.xs, np.ndarray):
+                order = np.argsort(self.xs, kind="stable").astype(np.int32)
+                sx = np.ascontiguousarray(self.xs[order], dtype=np.float64)
+                sy = np.ascontiguousarray(self.ys[order], dtype=np.float64)
+            else:
+                xs, ys = self.xs, self.ys
+                order = array("i", sorted(range(n), key=xs.__getitem__))
+                sx = array("d", (xs[i] for i in order))
+                sy = array("d", (ys[i] for i in order))
+            self._sorted = (memoryview(sx), memoryview(sy), memoryview(order))
+        return self._sorted
+
+
+class PointMatrix:
+    """Points with `dims` coordinates each, row-major in one float64 buffer"""
+
+    def __init__(self, flat, dims):
+        if dims < 1 or len(flat) % dims:
+            raise ValueError(f"{len(flat)} coordinates is not a multiple of {dims}")
+        self.flat = flat
+        self.dims = dims
+
+    @classmethod
+    def from_flat(cls, flat, dims):
+        """Matrix over x0, y0, z0, ..., x1, y1, z1, ... coordinates; NumPy input is not copied"""
+        if np is not None and isinstance(flat, np.ndarray):
+            return cls(flat, dims)
+        return cls(array("d", flat), dims)
+
+    @classmethod
+    def from_points(cls, points):
+        """Matrix over an (n, d) array or a sequence of d-tuples; a matrix is returned as is"""
+        if isinstance(points, cls):
+            return points
+        dims = point_dims(points)
+        if np is not None:
+            if isinstance(points, np.ndarray):
+                return cls(np.ascontiguousarray(points, dtype=np.float64).reshape(-1), dims)
+            if any(len(p) != dims for p in points):
+                raise ValueError(f"points must all have {dims} coordinates")
+            flat = np.fromiter(chain.from_iterable(points), dtype=np.float64, count=dims * len(points))
+            return cls(flat, dims)
+        if any(len(p) != dims for p in points):
+            raise ValueError(f"points must all have {dims} coordinates")
+        return cls(array("d", chain.from_iterable(points)), dims)
+
+    def __len__(self):
+        return len(self.flat) // self.dims
+
+    def __getitem__(self, i):
+        d = self.dims
+        return tuple(map(float, self.flat[i * d:(i + 1) * d]))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    @property
+    def nbytes(self):
+        return 8 * len(self.flat)
+
+    def rows(self):
+        """(n, d) float64 NumPy view of the points; NumPy only"""
+        return np.asarray(self.flat, dtype=np.float64).reshape(-1, self.dims)
+
+    def column(self, k):
+        """Coordinate k of every point (a strided view with NumPy)"""
+        column = self.flat[k::self.dims]
+        return column if np is not None and isinstance(column, np.ndarray) else array("d", column)
+
+    def spans(self):
+        """max - min of every coordinate"""
+        if len(self) == 0:
+            return [0.0] * self.dims
+        if np is not None and isinstance(self.flat, np.ndarray):
+            rows = self.rows()
+            return (rows.max(axis=0) - rows.min(axis=0)).tolist()
+        return [max(c) - min(c) for c in map(self.column, range(self.dims))]
+
+    def widest_axes(self, count=2):
+        """The count coordinates of widest span, in coordinate order"""
+        spans = self.spans()
+        return sorted(sorted(range(self.dims), key=lambda k: -spans[k])[:count])
+
+    def projection(self, axes=None):
+        """PointStore of two coordinates, by default the two of widest span
+
+        Point i of the projection is point i of the matrix.
+        """
+        if axes is None:
+            axes = self.widest_axes()
+        return PointStore(self.column(axes[0]), self.column(axes[1]))
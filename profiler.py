@@ -0,0 +1,122 @@
+"""Per-recursion-level profiling for the divide & conquer engines
+
+A RecursionProfile is attached to an engine like a RunMonitor. Every
+recursion node reports its depth, operand size (points for closest pair,
+bits for multiplication), the time spent dividing, in the base case and
+merging, and for closest pair the strip size. Nodes are aggregated per
+depth for the summary table and kept (up to max_events) as Chrome
+trace-event "complete" events, which chrome://tracing and Perfetto load
+directly.
+
+Node times include the step tracing done at that node, so profile with
+tracing off to measure the algorithm alone.
+"""
+import json
+import time
+
+MAX_EVENTS = 200000  # Trace events kept; the per-level table always sees every node
+
+LEVEL_COLUMNS = ["depth", "calls", "divide_ms", "base_ms", "merge_ms", "total_ms",
+                 "size_min", "size_avg", "size_max", "strip_avg", "strip_max"]
+
+
+class LevelStats:
+    __slots__ = ("calls", "divide", "base", "merge", "total", "size_sum", "size_min", "size_max",
+                 "strips", "strip_sum", "strip_max")
+
+    def __init__(self):
+        self.calls = 0
+        self.divide = 0.0
+        self.base = 0.0
+        self.merge = 0.0
+        self.total = 0.0
+        self.size_sum = 0
+        self.size_min = None
+        self.size_max = 0
+        self.strips = 0
+        self.strip_sum = 0
+        self.strip_max = 0
+
+
+class RecursionProfile:
+    def __init__(self, max_events=MAX_EVENTS):
+        self.levels = {}
+        self.events = []  # (name, depth, start, end, size, strip)
+        self.max_events = max_events
+        self.dropped = 0
+        self.unit = "points"
+        self.origin = time.perf_counter()
+
+    def node(self, name, depth, size, start, end, divide=0.0, base=0.0, merge=0.0, strip=None):
+        """Record one recursion node; times are perf_counter seconds"""
+        level = self.levels.get(depth)
+        if level is None:
+            level = self.levels[depth] = LevelStats()
+        level.calls += 1
+        level.divide += divide
+        level.base += base
+        level.merge += merge
+        level.total += end - start
+        level.size_sum += size
+        if level.size_min is None or size < level.size_min:
+            level.size_min = size
+        if size > level.size_max:
+            level.size_max = size
+        if strip is not None:
+            level.strips += 1
+            level.strip_sum += strip
+            if strip > level.strip_max:
+                level.strip_max = strip
+        if len(self.events) < self.max_events:
+            self.events.append((name, depth, start, end, size, strip))
+        else:
+            self.dropped += 1
+
+    def rows(self):
+        """Per-depth summary as dicts keyed by LEVEL_COLUMNS"""
+        rows = []
+        for depth in sorted(self.levels):
+            level = self.levels[depth]
+            rows.append({
+                "depth": depth,
+                "calls": level.calls,
+                "divide_ms": level.divide * 1000,
+                "base_ms": level.base * 1000,
+                "merge_ms": level.merge * 1000,
+                "total_ms": level.total * 1000,
+                "size_min": level.size_min,
+                "size_avg": level.size_sum / level.calls,
+                "size_max": level.size_max,
+                "strip_avg": level.strip_sum / level.strips if level.strips else None,
+                "strip_max": level.strip_max if level.strips else None,
+            })
+        return rows
+
+    def format_table(self):
+        header = (f"{'depth':>5} {'calls':>9} {'divide ms':>10} {'base ms':>10} {'merge ms':>10} "
+                  f"{'avg ' + self.unit:>12} {'avg strip':>10}")
+        lines = [header, "-" * len(header)]
+        for row in self.rows():
+            strip = f"{row['strip_avg']:.1f}" if row["strip_avg"] is not None else "-"
+            lines.append(f"{row['depth']:>5} {row['calls']:>9} {row['divide_ms']:>10.3f} "
+                         f"{row['base_ms']:>10.3f} {row['merge_ms']:>10.3f} "
+                         f"{row['size_avg']:>12.1f} {strip:>10}")
+        return "\n".join(lines)
+
+    def chrome_trace(self):
+        """Trace-event JSON object: one complete ("X") event per recorded node"""
+        events = []
+        for name, depth, start, end, size, strip in self.events:
+            args = {"depth": depth, self.unit: size}
+            if strip is not None:
+                args["strip"] = strip
+            events.append({
+                "name": name, "cat": "recursion", "ph": "X", "pid": 1, "tid": 1,
+                "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6, "args": args,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"dropped_events": self.dropped}}
+
+    def save_chrome_trace(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
@@ -0,0 +1,125 @@
+"""Level-of-detail helpers for drawing large point clouds on a Tk canvas
+
+PointView normalizes a point set into [0, 1] once; each redraw only applies
+the zoom/canvas transform to the cached coordinates. When more points are
+visible than can be drawn as canvas items, density_ppm rasterizes them into
+a PPM image that Tk can load in a single call.
+"""
+import math
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional
+    np = None
+
+from point_store import PointStore
+
+PADDING = 0.1  # Fraction of the data range added around the points
+
+
+class PointView:
+    def __init__(self, points):
+        self.points = points
+        self.count = len(points)
+        store = PointStore.from_points(points)
+
+        if np is not None:
+            xs = np.asarray(store.xs, dtype=np.float64)
+            ys = np.asarray(store.ys, dtype=np.float64)
+            min_x, max_x = float(xs.min()), float(xs.max())
+            min_y, max_y = float(ys.min()), float(ys.max())
+        else:
+            xs, ys = store.xs, store.ys
+            min_x, max_x = min(xs), max(xs)
+            min_y, max_y = min(ys), max(ys)
+
+        range_x = (max_x - min_x) or 1
+        range_y = (max_y - min_y) or 1
+        self.min_x = min_x - range_x * PADDING
+        self.min_y = min_y - range_y * PADDING
+        self.range_x = range_x * (1 + 2 * PADDING)
+        self.range_y = range_y * (1 + 2 * PADDING)
+
+        # Normalized coordinates only feed pixel positions: float32 is plenty
+        if np is not None:
+            self.nx = ((xs - self.min_x) / self.range_x).astype(np.float32)
+            self.ny = ((ys - self.min_y) / self.range_y).astype(np.float32)
+        else:
+            self.nx = array("f", ((x - self.min_x) / self.range_x for x in xs))
+            self.ny = array("f", ((y - self.min_y) / self.range_y for y in ys))
+
+    def transform(self, width, height, scale):
+        """Return (ax, bx, ay, by) so that sx = ax * nx + bx and sy = ay * ny + by"""
+        ax = width * scale
+        bx = (width - width * scale) / 2
+        ay = -height * scale
+        by = height + (height - height * scale) / 2
+        return ax, bx, ay, by
+
+    def scale_point(self, x, y, width, height, scale):
+        ax, bx, ay, by = self.transform(width, height, scale)
+        return (ax * (x - self.min_x) / self.range_x + bx,
+                ay * (y - self.min_y) / self.range_y + by)
+
+    def unscale_point(self, sx, sy, width, height, scale):
+        """Data coordinates of a canvas position, the inverse of scale_point"""
+        ax, bx, ay, by = self.transform(width, height, scale)
+        return ((sx - bx) / ax * self.range_x + self.min_x,
+                (sy - by) / ay * self.range_y + self.min_y)
+
+    def visible(self, width, height, scale):
+        """Screen coordinates of the points inside the canvas
+
+        Returns (indices, sx, sy); indices refer to the original point order.
+        """
+        ax, bx, ay, by = self.transform(width, height, scale)
+        if np is not None:
+            sx = ax * self.nx + bx
+            sy = ay * self.ny + by
+            mask = (sx >= 0) & (sx < width) & (sy >= 0) & (sy < height)
+            indices = np.nonzero(mask)[0]
+            return indices, sx[indices], sy[indices]
+
+        indices, sxs, sys_ = [], [], []
+        for i, (nx, ny) in enumerate(zip(self.nx, self.ny)):
+            sx = ax * nx + bx
+            sy = ay * ny + by
+            if 0 <= sx < width and 0 <= sy < height:
+                indices.append(i)
+                sxs.append(sx)
+                sys_.append(sy)
+        return indices, sxs, sys_
+
+
+def density_ppm(sx, sy, width, height):
+    """Rasterize screen coordinates into a binary PPM (cyan, log-scaled density)"""
+    width, height = int(width), int(height)
+    header = b"P6 %d %d 255\n" % (width, height)
+
+    if np is not None:
+        px = np.clip(np.asarray(sx, dtype=np.int64), 0, width - 1)
+        py = np.clip(np.asarray(sy, dtype=np.int64), 0, height - 1)
+        counts = np.bincount(py * width + px, minlength=width * height)
+        peak = counts.max() if counts.size else 0
+        level = np.zeros(width * height, dtype=np.uint8)
+        if peak:
+            hit = counts > 0
+            level[hit] = (80 + 175 * np.log1p(counts[hit]) / math.log1p(peak)).astype(np.uint8)
+        rgb = np.zeros((width * height, 3), dtype=np.uint8)
+        rgb[:, 1] = level
+        rgb[:, 2] = level
+        return header + rgb.tobytes()
+
+    counts = {}
+    for x, y in zip(sx, sy):
+        key = min(int(y), height - 1) * width + min(int(x), width - 1)
+        counts[key] = counts.get(key, 0) + 1
+    pixels = bytearray(width * height * 3)
+    if counts:
+        norm = math.log1p(max(counts.values()))
+        for key, count in counts.items():
+            level = int(80 + 175 * math.log1p(count) / norm)
+            pixels[3 * key + 1] = level
+            pixels[3 * key + 2] = level
+    return header + bytes(pixels)
@@ -0,0 +1,265 @@
+"""Compact event log of a closest pair recursion, for step-by-step replay
+
+The recursion records what it does as int32 words instead of text:
+entering a node (with the x of its dividing line), brute force base cases,
+strip checks, new minimums and leaving a node. Comparisons are not stored
+one by one: a base case compares all pairs of its range and a strip
+compares each member with the next six in y order, so the log keeps only
+the strip members and the replay derives every comparison from them. A
+new minimum records the ordinal of the comparison that found it.
+
+Records in `words` ("code" packs the kind in the low three bits and the
+depth above them); x and distances go to the parallel `values` array:
+
+    NODE   code lo hi             value: x of the dividing line
+    BASE   code lo hi
+    STRIP  code lo m p_1..p_m     value: half width d
+    BEST   code i j ordinal       value: new minimum distance
+    DONE   code lo hi             value: closest distance in the node
+
+Point operands are positions in the x-sorted order the recursion works
+in, so a replay draws them from PointStore.sorted_columns().
+
+A replay step is one node, base case, strip or comparison. While
+recording, the log keeps the recursion stack and the best pair, and about
+every CHECKPOINT_EVERY steps snapshots them, with the text of the step
+that ends there, at a node boundary. ReplayState.seek starts from the
+nearest checkpoint and skips over runs of comparisons arithmetically, so
+seeking never reruns the algorithm.
+"""
+import math
+from array import array
+from bisect import bisect_right
+
+MAX_WORDS = 1 << 26  # 256 MB of words; recording stops there
+CHECKPOINT_EVERY = 4096
+
+NODE = 0
+BASE = 1
+STRIP = 2
+BEST = 3
+DONE = 4
+
+
+def sequence_length(m):
+    """Comparisons among m members, each with the next six"""
+    if m <= 7:
+        return m * (m - 1) // 2
+    return 6 * m - 21
+
+
+def sequence_pair(m, t):
+    """Member offsets (a, b) of the t-th comparison among m members"""
+    full = 6 * (m - 6) if m > 7 else 0
+    if t < full:
+        a = t // 6
+        return a, a + 1 + t % 6
+    a = m - 6 if m > 7 else 0
+    t -= full
+    while t >= m - 1 - a:
+        t -= m - 1 - a
+        a += 1
+    return a, a + 1 + t
+
+
+def boundary_event(code, lo, hi, value):
+    """Event text of a NODE or DONE record"""
+    depth = code >> 3
+    if code & 7 == NODE:
+        return f"Depth {depth}: divide points {lo}..{hi - 1} at x = {value:.4f}"
+    return f"Depth {depth}: merged points {lo}..{hi - 1}, closest {value:.6f}"
+
+
+class EventLog:
+    def __init__(self, max_words=MAX_WORDS):
+        self.words = array("i")
+        self.values = array("d")
+        self.max_words = max_words
+        self.truncated = False
+        self.steps = 0
+        # Recorder state, snapshotted into checkpoints
+        self.stack = []  # (lo, hi, x) of the open nodes
+        self.best = None  # (i, j, distance) of the smallest distance so far
+        # (code, lo, hi, value) of the last NODE or DONE record; a node
+        # boundary always follows one of them
+        self.last = None
+        # (step, word index, value index, stack, best, event)
+        self.checkpoints = [(0, 0, 0, (), None, "Start")]
+        self.checkpoint_steps = [0]
+
+    def __len__(self):
+        """Replay steps recorded"""
+        return self.steps
+
+    @property
+    def nbytes(self):
+        return self.words.itemsize * len(self.words) + self.values.itemsize * len(self.values)
+
+    def _room(self, words):
+        if self.truncated:
+            return False
+        if len(self.words) + words > self.max_words:
+            self.truncated = True
+            return False
+        return True
+
+    def _boundary(self):
+        if self.steps - self.checkpoint_steps[-1] >= CHECKPOINT_EVERY:
+            event = boundary_event(*self.last) if self.last is not None else "Start"
+            self.checkpoints.append((self.steps, len(self.words), len(self.values),
+                                     tuple(self.stack), self.best, event))
+            self.checkpoint_steps.append(self.steps)
+
+    def node(self, depth, lo, hi, x):
+        if self._room(3):
+            self._boundary()
+            self.words.extend((depth << 3 | NODE, lo, hi))
+            self.values.append(x)
+            self.stack.append((lo, hi, x))
+            self.last = (depth << 3 | NODE, lo, hi, x)
+            self.steps += 1
+
+    def base(self, depth, lo, hi):
+        if self._room(3):
+            self._boundary()
+            self.words.extend((depth << 3 | BASE, lo, hi))
+            self.stack.append((lo, hi, math.nan))
+            self.steps += 1 + sequence_length(hi - lo)
+
+    def strip_check(self, depth, lo, members, d):
+        if self._room(3 + len(members)):
+            self.words.extend((depth << 3 | STRIP, lo, len(members)))
+            self.words.extend(members)
+            self.values.append(d)
+            self.steps += 1 + sequence_length(len(members))
+
+    def new_best(self, depth, i, j, ordinal, dist):
+        if self._room(4):
+            self.words.extend((depth << 3 | BEST, i, j, ordinal))
+            self.values.append(dist)
+            if self.best is None or dist < self.best[2]:
+                self.best = (i, j, dist)
+
+    def done(self, depth, lo, hi, dist):
+        if self._room(3):
+            self.words.extend((depth << 3 | DONE, lo, hi))
+            self.values.append(dist)
+            self.stack.pop()
+            self.last = (depth << 3 | DONE, lo, hi, dist)
+            self.steps += 1
+            self._boundary()
+
+
+class ReplayState:
+    """Recursion state after the first `pos` steps of a log
+
+    stack holds (lo, hi, x) of the open nodes (x is NaN for base cases),
+    strip is (lo, size, x, d) while a strip is being checked, compare is
+    the last compared pair and best is (i, j, distance) of the smallest
+    distance found so far. event describes the last step.
+    """
+
+    def __init__(self, log):
+        self.log = log
+        self.seek(0)
+
+    def seek(self, pos):
+        log = self.log
+        pos = max(0, min(pos, len(log)))
+        c = bisect_right(log.checkpoint_steps, pos) - 1
+        self.pos, self.word_pos, self.value_pos, stack, self.best, self.event = log.checkpoints[c]
+        self.stack = list(stack)
+        self.strip = None
+        self.compare = None
+        # Comparison run in progress: (depth, members offset or None, lo, m, length, done)
+        self.run = None
+        self.advance(pos - self.pos)
+
+    @property
+    def finished(self):
+        return self.pos >= len(self.log)
+
+    def advance(self, count):
+        """Apply up to count steps; returns how many were applied"""
+        words, values = self.log.words, self.log.values
+        start = self.pos
+        end = min(self.pos + count, len(self.log))
+        while self.pos < end:
+            if self.run is not None:
+                self._advance_run(end - self.pos)
+                continue
+            w = self.word_pos
+            code = words[w]
+            kind = code & 7
+            depth = code >> 3
+            a = words[w + 1]
+            b = words[w + 2]
+            if kind == NODE:
+                x = values[self.value_pos]
+                self.value_pos += 1
+                self.stack.append((a, b, x))
+                self.strip = None
+                self.compare = None
+                self.word_pos = w + 3
+                self.event = boundary_event(code, a, b, x)
+            elif kind == BASE:
+                self.stack.append((a, b, math.nan))
+                self.strip = None
+                self.word_pos = w + 3
+                self.run = [depth, None, a, b - a, sequence_length(b - a), 0]
+                self.event = f"Depth {depth}: brute force on points {a}..{b - 1}"
+            elif kind == STRIP:
+                d = values[self.value_pos]
+                self.value_pos += 1
+                self.strip = (a, b, self.stack[-1][2], d)
+                self.compare = None
+                self.word_pos = w + 3 + b
+                self.run = [depth, w + 3, a, b, sequence_length(b), 0]
+                self.event = f"Depth {depth}: strip of {b} points within d = {d:.4f}"
+            else:  # DONE
+                dist = values[self.value_pos]
+                self.value_pos += 1
+                self.stack.pop()
+                self.strip = None
+                self.compare = None
+                self.word_pos = w + 3
+                self.event = boundary_event(code, a, b, dist)
+            if self.run is not None and self.run[4] == 0:
+                self.run = None
+            self.pos += 1
+        return self.pos - start
+
+    def _advance_run(self, count):
+        # Skip up to count comparisons of the current run, applying the new
+        # minimums found on the way; only one found by the last comparison
+        # goes into its event
+        words, values = self.log.words, self.log.values
+        run = self.run
+        depth, offset, lo, m, length, done = run
+        last = min(done + count, length) - 1
+        found = None
+        while self.word_pos < len(words):
+            code = words[self.word_pos]
+            if code & 7 != BEST or words[self.word_pos + 3] > last:
+                break
+            i = words[self.word_pos + 1]
+            j = words[self.word_pos + 2]
+            dist = values[self.value_pos]
+            self.word_pos += 4
+            self.value_pos += 1
+            if self.best is None or dist < self.best[2]:
+                self.best = (i, j, dist)
+            if words[self.word_pos - 1] == last:
+                found = dist
+        a, b = sequence_pair(m, last)
+        if offset is None:
+            self.compare = (lo + a, lo + b)
+        else:
+            self.compare = (words[offset + a], words[offset + b])
+        self.pos += last + 1 - done
+        run[5] = last + 1
+        if run[5] == length:
+            self.run = None
+        self.event = f"Depth {depth}: compare {self.compare[0]} and {self.compare[1]}"
+        if found is not None:
+            self.event += f", new minimum {found:.6f}"
@@ -0,0 +1,110 @@
+"""Content-addressed cache of algorithm results
+
+Entries are keyed by a SHA-256 of the input file contents, the algorithm
+and the engine version, so renamed or copied inputs still hit and results
+from an older engine are never served. Results are plain JSON-able dicts.
+An in-memory LRU sits in front of an optional on-disk store whose total
+size is capped by evicting the least recently used files.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+
+from engine import ENGINE_VERSION
+
+HASH_CHUNK = 1 << 20
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_entries=256, disk_dir=None, disk_limit_bytes=256 << 20):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_limit_bytes = disk_limit_bytes
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def key(self, path, algorithm):
+        return hashlib.sha256(
+            f"{file_digest(path)}:{algorithm}:{ENGINE_VERSION}".encode()).hexdigest()
+
+    def get(self, key):
+        entry = self.memory.get(key)
+        if entry is None and self.disk_dir:
+            entry = self._load(key)
+            if entry is not None:
+                self._remember(key, entry)
+        elif entry is not None:
+            self.memory.move_to_end(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(entry)
+
+    def put(self, key, result):
+        entry = dict(result)
+        self._remember(key, entry)
+        if self.disk_dir:
+            self._store(key, entry)
+
+    def _remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # Disk store: one JSON file per key, file mtime doubles as LRU stamp
+    # ------------------------------------------------------------------
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key + ".json")
+
+    def _load(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def _store(self, key, entry):
+        # Write then rename so concurrent batch workers never read a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp, self._path(key))
+        self._enforce_disk_limit()
+
+    def _enforce_disk_limit(self):
+        files = []
+        total = 0
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        files.sort()
+        for _, size, path in files:
+            if total <= self.disk_limit_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
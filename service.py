@@ -0,0 +1,471 @@
+"""Local compute service for both algorithms
+
+A small asyncio HTTP/1.1 server (TCP on localhost or a Unix socket) that
+runs the same engine calls as the visualizer, so other tools can use the
+algorithms without the Tk app:
+
+    POST /closest    body: {"points": [[x, y], ...]} or "x y x y ..." text;
+                     points of d > 2 coordinates as [x, y, z, ...] or as
+                     text after a "# dims D" first line
+    POST /multiply   body: {"x": "123", "y": "0x1f"} or "x y" text
+    GET  /stats      queue depth, in-flight work, latency percentiles
+
+Bodies are parsed by the worker processes, so the event loop only moves
+bytes. Each endpoint has a bounded queue; when it is full the request is
+answered 503 with Retry-After instead of piling up. At most
+jobs * WINDOW_PER_JOB tasks are in the process pool at once.
+
+Small multiplications are coalesced: whenever a pool slot frees up, every
+small request already waiting (up to BATCH_MAX_ITEMS) goes to the worker
+as one task. An idle service therefore answers a lone request at once,
+and a busy one amortizes the per-task cost over the whole batch.
+
+Examples:
+    python service.py --port 8765 --jobs 4
+    python service.py --unix /tmp/dc.sock
+    python service.py --load 5000 --concurrency 64 --digits 50
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from decimal_io import parse_int, to_decimal
+from engine import DivideConquerEngine
+from point_io import text_header
+from point_store import PointMatrix, PointStore
+
+DEFAULT_PORT = 8765
+QUEUE_SIZE = 256  # Requests waiting per endpoint before new ones are refused
+WINDOW_PER_JOB = 2  # Tasks in flight per worker process
+BATCH_MAX_ITEMS = 256  # Multiplications sent to a worker as one task
+SMALL_MULTIPLY_BYTES = 4096  # Larger multiply bodies always run alone
+MAX_BODY_BYTES = 64 << 20
+MAX_HEADERS = 100
+LATENCY_SAMPLES = 10000  # Most recent latencies kept per endpoint
+PERCENTILES = (50, 90, 99)
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 431: "Request Header Fields Too Large",
+               500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# ----------------------------------------------------------------------
+# Worker process side
+# ----------------------------------------------------------------------
+def coordinate(value):
+    # NaN and infinities have no closest pair; both JSON and float() accept them
+    c = float(value)
+    if not math.isfinite(c):
+        raise ValueError(f"non-finite coordinate {c}")
+    return c
+
+
+def parse_points_body(body, content_type):
+    # Points may have any number of coordinates, the same for all of them
+    if content_type.startswith("application/json"):
+        points = json.loads(body)["points"]
+        dims = len(points[0]) if points else 2
+        if dims < 2 or any(len(p) != dims for p in points):
+            raise ValueError("points must be [x, y, ...] lists of one length")
+        if dims > 2:
+            return PointMatrix.from_points([tuple(map(coordinate, p)) for p in points])
+        return PointStore.from_points([(coordinate(x), coordinate(y)) for x, y in points])
+    dims, offset = text_header(body)
+    coords = body[offset:].split()
+    if len(coords) % dims:
+        raise ValueError(f"{len(coords)} coordinates is not a multiple of {dims}")
+    if dims > 2:
+        return PointMatrix.from_flat([coordinate(c) for c in coords], dims)
+    return PointStore.from_flat([coordinate(c) for c in coords])
+
+
+def parse_operands_body(body, content_type):
+    if content_type.startswith("application/json"):
+        request = json.loads(body)
+        # Huge operands should be sent as strings, JSON numbers are
+        # subject to Python's int digit limit
+        tokens = [str(request["x"]), str(request["y"])]
+    else:
+        tokens = body.decode("latin-1").replace(",", " ").split()
+        if len(tokens) != 2:
+            raise ValueError(f"expected 2 operands, got {len(tokens)}")
+    return parse_int(tokens[0]), parse_int(tokens[1])
+
+
+def closest_job(body, content_type):
+    """(status, result) of one closest pair request"""
+    try:
+        points = parse_points_body(body, content_type)
+    except (ValueError, KeyError, TypeError) as e:
+        return 400, {"error": f"bad points: {e}"}
+    if len(points) < 2:
+        return 400, {"error": "need at least 2 points"}
+    engine = DivideConquerEngine(trace=False)
+    start_time = time.perf_counter()
+    dist, pair = engine.closest_pair(points)
+    elapsed = time.perf_counter() - start_time
+    if pair is None:
+        return 400, {"error": "no closest pair in these points"}
+    return 200, {"points": len(points), "dims": points.dims,
+                 "pair": [list(pair[0]), list(pair[1])],
+                 "indices": list(engine.last_pair_indices), "distance": dist,
+                 "engine": engine.last_engine, "operations": engine.comparisons,
+                 "time_ms": elapsed * 1000}
+
+
+def multiply_batch(requests):
+    """(status, result) of each (body, content type) multiply request"""
+    engine = DivideConquerEngine(trace=False)
+    results = []
+    for body, content_type in requests:
+        try:
+            x, y = parse_operands_body(body, content_type)
+        except (ValueError, KeyError, TypeError) as e:
+            results.append((400, {"error": f"bad operands: {e}"}))
+            continue
+        engine.reset()
+        start_time = time.perf_counter()
+        product = engine.multiply(x, y)
+        elapsed = time.perf_counter() - start_time
+        results.append((200, {"product": to_decimal(product), "engine": engine.last_engine,
+                              "operations": engine.comparisons, "time_ms": elapsed * 1000,
+                              "batch": len(requests)}))
+    return results
+
+
+# ----------------------------------------------------------------------
+# Event loop side
+# ----------------------------------------------------------------------
+def percentile(ordered, q):
+    # Nearest rank
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, -(-q * len(ordered) // 100) - 1))]
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)  # Seconds, queueing included
+        self.completed = 0
+        self.errors = 0
+        self.rejected = 0
+        self.in_flight = 0  # Requests handed to the pool, not answered yet
+        self.tasks = 0  # Pool tasks; fewer than completed when batched
+
+    def summary(self, queued):
+        ordered = sorted(self.latencies)
+        latency = {f"p{q}": percentile(ordered, q) * 1000 for q in PERCENTILES} if ordered else {}
+        if ordered:
+            latency["max"] = ordered[-1] * 1000
+            latency["mean"] = sum(ordered) / len(ordered) * 1000
+        return {"queued": queued, "in_flight": self.in_flight, "completed": self.completed,
+                "errors": self.errors, "rejected": self.rejected, "tasks": self.tasks,
+                "mean_batch": self.completed / self.tasks if self.tasks else 0.0,
+                "latency_ms": latency, "latency_samples": len(ordered)}
+
+
+class ComputeService:
+    def __init__(self, jobs=1, queue_size=QUEUE_SIZE):
+        self.jobs = jobs
+        self.queue_size = queue_size
+        self.pool = None
+        self.slots = None  # Semaphore over the pool tasks in flight
+        self.queues = {}
+        self.stats = {"closest": EndpointStats(), "multiply": EndpointStats()}
+        self.carry = None  # Large multiply taken off the queue while batching
+        self.started = time.time()
+        self.dispatchers = []
+        self.connections = {}  # Handler task -> writer of each open connection
+
+    async def start(self):
+        self.pool = ProcessPoolExecutor(max_workers=self.jobs)
+        self.slots = asyncio.Semaphore(self.jobs * WINDOW_PER_JOB)
+        self.queues = {name: asyncio.Queue(self.queue_size) for name in self.stats}
+        self.dispatchers = [asyncio.create_task(self.dispatch_closest()),
+                            asyncio.create_task(self.dispatch_multiply())]
+
+    async def close(self):
+        for task in self.dispatchers:
+            task.cancel()
+        await asyncio.gather(*self.dispatchers, return_exceptions=True)
+        # Closed connections read as end of stream, so their handlers return
+        for writer in self.connections.values():
+            writer.close()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        self.pool.shutdown(cancel_futures=True)
+
+    # Queue items are (body, content type, future, arrival time)
+    async def dispatch_closest(self):
+        queue = self.queues["closest"]
+        while True:
+            item = await queue.get()
+            await self.slots.acquire()
+            self.run_task("closest", [item], closest_job, item[0], item[1])
+
+    async def dispatch_multiply(self):
+        queue = self.queues["multiply"]
+        while True:
+            first = self.carry if self.carry is not None else await queue.get()
+            self.carry = None
+            # Wait for a pool slot first: whatever queues up meanwhile joins the batch
+            await self.slots.acquire()
+            batch = [first]
+            if len(first[0]) <= SMALL_MULTIPLY_BYTES:
+                while len(batch) < BATCH_MAX_ITEMS and not queue.empty():
+                    item = queue.get_nowait()
+                    if len(item[0]) > SMALL_MULTIPLY_BYTES:
+                        self.carry = item
+                        break
+                    batch.append(item)
+            self.run_task("multiply", batch, multiply_batch, [(body, ctype) for body, ctype, _, _ in batch])
+
+    def run_task(self, name, items, func, *args):
+        stats = self.stats[name]
+        stats.tasks += 1
+        stats.in_flight += len(items)
+        task = asyncio.get_running_loop().run_in_executor(self.pool, func, *args)
+        task.add_done_callback(partial(self.finish_task, name, items))
+
+    def finish_task(self, name, items, task):
+        self.slots.release()
+        stats = self.stats[name]
+        stats.in_flight -= len(items)
+        if task.cancelled() or task.exception() is not None:
+            error = "cancelled" if task.cancelled() else task.exception()
+            results = [(500, {"error": f"worker failed: {error}"})] * len(items)
+        else:
+            results = task.result()
+            if name == "closest":
+                results = [results]
+        now = time.perf_counter()
+        for (_, _, future, arrived), (status, result) in zip(items, results):
+            stats.latencies.append(now - arrived)
+            stats.completed += 1
+            if status != 200:
+                stats.errors += 1
+            if not future.done():  # The client may have gone away
+                future.set_result((status, result))
+
+    async def submit(self, name, body, content_type):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queues[name].put_nowait((body, content_type, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.stats[name].rejected += 1
+            return 503, {"error": f"{name} queue is full, retry later"}
+        return await future
+
+    def summary(self):
+        queued = {name: queue.qsize() for name, queue in self.queues.items()}
+        if self.carry is not None:
+            queued["multiply"] += 1
+        return {"uptime_s": time.time() - self.started, "jobs": self.jobs,
+                "pool_slots": self.jobs * WINDOW_PER_JOB, "queue_size": self.queue_size,
+                **{name: stats.summary(queued[name]) for name, stats in self.stats.items()}}
+
+    async def route(self, method, path, headers, body):
+        path = path.split("?", 1)[0]
+        if path == "/stats":
+            if method != "GET":
+                return 405, {"error": "use GET"}
+            return 200, self.summary()
+        if path in ("/closest", "/multiply"):
+            if method != "POST":
+                return 405, {"error": "use POST"}
+            return await self.submit(path[1:], body, headers.get("content-type", "text/plain"))
+        return 404, {"error": f"no endpoint {path}"}
+
+    async def handle_connection(self, reader, writer):
+        # HTTP/1.1 with keep-alive, one request at a time per connection
+        task = asyncio.current_task()
+        self.connections[task] = writer
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers, body = request
+                    status, result = await self.route(method, path, headers, body)
+                except HttpError as e:
+                    # The rest of the stream can't be trusted after a bad request
+                    status, result, headers = e.status, {"error": str(e)}, {"connection": "close"}
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(encode_response(status, result, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            del self.connections[task]
+            writer.close()
+
+
+async def read_request(reader):
+    """(method, path, headers, body) of the next request, None at end of stream"""
+    line = await read_line(reader, 400, "request line too long")
+    if not line:
+        return None
+    try:
+        method, path, _ = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "malformed request line")
+    headers = {}
+    while True:
+        line = await read_line(reader, 431, "header line too long")
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise HttpError(431, f"more than {MAX_HEADERS} headers")
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HttpError(400, "malformed Content-Length")
+    if length < 0:
+        raise HttpError(400, "negative Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, f"body larger than {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+
+async def read_line(reader, status, message):
+    try:
+        return await reader.readline()
+    except ValueError:  # Longer than the stream's limit
+        raise HttpError(status, message)
+
+
+def encode_response(status, result, keep_alive=True):
+    body = json.dumps(result).encode()
+    head = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    if status == 503:
+        head.append("Retry-After: 1")
+    return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body
+
+
+async def start_server(service, host="127.0.0.1", port=DEFAULT_PORT, unix_path=None):
+    await service.start()
+    if unix_path:
+        return await asyncio.start_unix_server(service.handle_connection, path=unix_path)
+    return await asyncio.start_server(service.handle_connection, host, port)
+
+
+async def serve(host, port, unix_path, jobs, queue_size):
+    service = ComputeService(jobs, queue_size)
+    server = await start_server(service, host, port, unix_path)
+    where = unix_path or "http://{}:{}".format(*server.sockets[0].getsockname()[:2])
+    sys.stderr.write(f"Serving on {where} with {jobs} worker processes\n")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+# ----------------------------------------------------------------------
+# Load test client
+# ----------------------------------------------------------------------
+async def http_request(reader, writer, method, path, body=b"", content_type="application/json"):
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                  f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers["content-length"]))
+    return status, json.loads(body)
+
+
+async def load_test(requests, concurrency, digits, jobs, queue_size, seed=12345):
+    """Serve on an ephemeral local port and multiply `requests` random pairs through it"""
+    service = ComputeService(jobs, queue_size)
+    server = await start_server(service, port=0)
+    port = server.sockets[0].getsockname()[1]
+    rng = random.Random(seed)
+    bodies = [json.dumps({"x": str(rng.randrange(10 ** (digits - 1), 10 ** digits)),
+                          "y": str(rng.randrange(10 ** (digits - 1), 10 ** digits))}).encode()
+              for _ in range(min(requests, 1000))]
+    counts = {}
+    remaining = requests
+
+    async def client():
+        nonlocal remaining
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            while remaining > 0:
+                remaining -= 1
+                status, _ = await http_request(reader, writer, "POST", "/multiply",
+                                               bodies[remaining % len(bodies)])
+                counts[status] = counts.get(status, 0) + 1
+                if status == 503:
+                    await asyncio.sleep(0.01)
+        finally:
+            writer.close()
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start_time
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    _, stats = await http_request(reader, writer, "GET", "/stats")
+    writer.close()
+    server.close()
+    await service.close()
+    await server.wait_closed()
+    stats["load_test"] = {"requests": requests, "concurrency": concurrency, "digits": digits,
+                          "seconds": elapsed, "completed_per_second": counts.get(200, 0) / elapsed,
+                          "status_counts": counts}
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve closest pair and multiplication over local HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="address to bind (default: localhost only)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", help="serve on this Unix socket path instead of TCP")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="worker processes")
+    parser.add_argument("--queue", type=int, default=QUEUE_SIZE, help="waiting requests per endpoint")
+    parser.add_argument("--load", type=int, metavar="N",
+                        help="instead of serving, run a local load test of N multiply requests")
+    parser.add_argument("--concurrency", type=int, default=32, help="load test connections")
+    parser.add_argument("--digits", type=int, default=50, help="load test operand digits")
+    args = parser.parse_args(argv)
+
+    if args.load:
+        stats = asyncio.run(load_test(args.load, args.concurrency, args.digits, args.jobs, args.queue))
+        json.dump(stats, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return 0
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.jobs, args.queue))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
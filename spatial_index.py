@@ -0,0 +1,229 @@
+"""KD-tree over a 2-D point set for repeated proximity queries
+
+The tree is built once per point set (O(n log n)) and then answers
+nearest-neighbour, k-nearest, radius, all-nearest-neighbour and k closest
+pair queries without rerunning the closest pair recursion. Nodes live in
+flat arrays and every query walks them with an explicit stack.
+
+Indices in every result refer to the order of the points passed in.
+
+Query a file from the command line:
+    python spatial_index.py closetpair1.txt --k 5 --radius 0.5
+"""
+import heapq
+import json
+import math
+import sys
+from array import array
+
+from point_store import PointStore
+
+LEAF_SIZE = 16  # Points scanned directly instead of split further
+
+
+class KDTree:
+    def __init__(self, points, leaf_size=LEAF_SIZE):
+        # The tree only reorders its own index array, so it reads the
+        # store's columns in place
+        store = PointStore.from_points(points)
+        xs = memoryview(store.xs)
+        ys = memoryview(store.ys)
+        self.xs = xs
+        self.ys = ys
+        self.count = len(xs)
+        self.leaf_size = leaf_size
+
+        # Node i covers order[lo[i]:hi[i]]; inner nodes have two children
+        # and leaves have left == -1. Bounding boxes drive the pruning.
+        self.order = array("l", range(self.count))
+        self.lo = array("l")
+        self.hi = array("l")
+        self.left = array("l")
+        self.right = array("l")
+        self.min_x = array("d")
+        self.min_y = array("d")
+        self.max_x = array("d")
+        self.max_y = array("d")
+        if self.count:
+            self._build()
+
+    def _build(self):
+        xs, ys, order = self.xs, self.ys, self.order
+        stack = [(self._new_node(0, self.count), 0, self.count)]
+        while stack:
+            node, lo, hi = stack.pop()
+            if hi - lo <= self.leaf_size:
+                continue
+            # Split the wider side of the bounding box at its median
+            coords = xs if self.max_x[node] - self.min_x[node] >= self.max_y[node] - self.min_y[node] else ys
+            order[lo:hi] = array("l", sorted(order[lo:hi], key=coords.__getitem__))
+            mid = (lo + hi) // 2
+            left = self._new_node(lo, mid)
+            right = self._new_node(mid, hi)
+            self.left[node] = left
+            self.right[node] = right
+            stack.append((left, lo, mid))
+            stack.append((right, mid, hi))
+
+    def _new_node(self, lo, hi):
+        node_xs = [self.xs[i] for i in self.order[lo:hi]]
+        node_ys = [self.ys[i] for i in self.order[lo:hi]]
+        self.lo.append(lo)
+        self.hi.append(hi)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.min_x.append(min(node_xs))
+        self.min_y.append(min(node_ys))
+        self.max_x.append(max(node_xs))
+        self.max_y.append(max(node_ys))
+        return len(self.lo) - 1
+
+    def _box_distance2(self, node, x, y):
+        dx = max(self.min_x[node] - x, 0.0, x - self.max_x[node])
+        dy = max(self.min_y[node] - y, 0.0, y - self.max_y[node])
+        return dx * dx + dy * dy
+
+    def knn(self, x, y, m, exclude=-1):
+        """The m points nearest to (x, y) as [(distance, index)], nearest first"""
+        if m <= 0 or not self.count:
+            return []
+        xs, ys, order = self.xs, self.ys, self.order
+        best = []  # Max-heap of (-d2, -index) holding the m nearest so far
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if len(best) == m and self._box_distance2(node, x, y) > -best[0][0]:
+                continue
+            left = self.left[node]
+            if left < 0:
+                for k in range(self.lo[node], self.hi[node]):
+                    i = order[k]
+                    if i == exclude:
+                        continue
+                    dx = xs[i] - x
+                    dy = ys[i] - y
+                    item = (-(dx * dx + dy * dy), -i)
+                    if len(best) < m:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+                continue
+            right = self.right[node]
+            # Visit the nearer child first so the bound tightens early
+            if self._box_distance2(left, x, y) <= self._box_distance2(right, x, y):
+                stack.append(right)
+                stack.append(left)
+            else:
+                stack.append(left)
+                stack.append(right)
+        return [(math.sqrt(-d2), -i) for d2, i in sorted(best, reverse=True)]
+
+    def nearest(self, x, y, exclude=-1):
+        """(distance, index) of the point nearest to (x, y), or None if empty"""
+        found = self.knn(x, y, 1, exclude)
+        return found[0] if found else None
+
+    def within(self, x, y, r):
+        """Indices of the points at distance <= r from (x, y)"""
+        xs, ys, order = self.xs, self.ys, self.order
+        r2 = r * r
+        found = []
+        stack = [0] if self.count else []
+        while stack:
+            node = stack.pop()
+            if self._box_distance2(node, x, y) > r2:
+                continue
+            if self.left[node] < 0:
+                for k in range(self.lo[node], self.hi[node]):
+                    i = order[k]
+                    dx = xs[i] - x
+                    dy = ys[i] - y
+                    if dx * dx + dy * dy <= r2:
+                        found.append(i)
+                continue
+            stack.append(self.left[node])
+            stack.append(self.right[node])
+        return found
+
+    def all_nearest_neighbors(self):
+        """For every point, (distance, index) of its nearest other point"""
+        xs, ys = self.xs, self.ys
+        return [self.nearest(xs[i], ys[i], exclude=i) for i in range(self.count)]
+
+    def pairs_within(self, r):
+        """All pairs (distance, i, j) with i < j at distance <= r, closest first"""
+        xs, ys = self.xs, self.ys
+        pairs = []
+        for i in range(self.count):
+            for j in self.within(xs[i], ys[i], r):
+                if j > i:
+                    dx = xs[i] - xs[j]
+                    dy = ys[i] - ys[j]
+                    pairs.append((math.sqrt(dx * dx + dy * dy), i, j))
+        pairs.sort()
+        return pairs
+
+    def closest_pairs(self, k):
+        """The k closest pairs (distance, i, j) with i < j, closest first
+
+        Every point offers its nearest unused neighbour to a heap; popping a
+        pair pulls that point's next neighbour. Each of the k closest pairs
+        is a j-th neighbour of its endpoints with j <= k, so neighbour lists
+        are fetched in doubling batches and most points never need more than
+        the first one.
+        """
+        xs, ys = self.xs, self.ys
+        k = min(k, self.count * (self.count - 1) // 2)
+        if k <= 0:
+            return []
+        neighbours = {}
+        heap = []
+        for i in range(self.count):
+            first = self.nearest(xs[i], ys[i], exclude=i)
+            heap.append((first[0], min(i, first[1]), max(i, first[1]), i, 0))
+        heapq.heapify(heap)
+
+        pairs = []
+        seen = set()
+        while heap and len(pairs) < k:
+            dist, a, b, i, rank = heapq.heappop(heap)
+            if (a, b) not in seen:
+                seen.add((a, b))
+                pairs.append((dist, a, b))
+            rank += 1
+            found = neighbours.get(i)
+            if found is None or rank >= len(found):
+                # Fetch twice as many neighbours as we have so far
+                found = self.knn(xs[i], ys[i], max(2, 2 * (rank + 1)), exclude=i)
+                neighbours[i] = found
+            if rank < len(found):
+                dist, j = found[rank]
+                heapq.heappush(heap, (dist, min(i, j), max(i, j), i, rank))
+        return pairs
+
+
+def main(argv=None):
+    import argparse
+    from point_io import load_points
+
+    parser = argparse.ArgumentParser(description="Proximity queries over a point file")
+    parser.add_argument("file")
+    parser.add_argument("--k", type=int, default=10, help="number of closest pairs")
+    parser.add_argument("--radius", type=float, help="also list all pairs within this distance")
+    parser.add_argument("--neighbors", action="store_true", help="also list every point's nearest neighbour")
+    args = parser.parse_args(argv)
+
+    tree = KDTree(load_points(args.file))
+    report = {"points": tree.count,
+              "closest_pairs": [list(p) for p in tree.closest_pairs(args.k)]}
+    if args.radius is not None:
+        report["pairs_within"] = [list(p) for p in tree.pairs_within(args.radius)]
+    if args.neighbors:
+        report["nearest_neighbors"] = [list(nn) if nn else None for nn in tree.all_nearest_neighbors()]
+    json.dump(report, sys.stdout)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Bounded memo of Karatsuba sub-products
+
+Operands built from repeated digit or limb blocks (integer5.txt is
+"1122334455..." over and over) split into identical halves, so the same
+sub-products come up again and again across the recursion tree. The
+Karatsuba recursions look every split up here before recursing.
+
+Entries are keyed on the operand pair (in either order) and the split
+size, and evicted least recently used once their estimated size passes
+max_bytes. On random operands nothing repeats, so once PROBE_LOOKUPS
+lookups have found (almost) nothing the cache turns itself off and the
+recursions stop consulting it.
+
+Example:
+    engine = DivideConquerEngine(trace=False)
+    engine.memo = SubproductCache(max_bytes=16 << 20)
+    engine.karatsuba_multiply(x, y, 0)
+    engine.memo.hits, engine.memo.misses
+"""
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 64 << 20
+# Smaller operands are multiplied again: their lookups cost about as much
+# as they save, and small values repeat by chance in any input
+MIN_BITS = 16
+# Lookups before the hit rate is judged, and the rate below which the
+# cache turns itself off
+PROBE_LOOKUPS = 512
+MIN_HIT_RATE = 0.02
+# Rough cost of a dict entry, its tuple and the int headers
+ENTRY_OVERHEAD = 200
+
+
+class SubproductCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, min_bits=MIN_BITS):
+        self.max_bytes = max_bytes
+        self.min_bits = min_bits
+        self.entries = OrderedDict()  # hash -> (x, y, product, size)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Cleared when the probe finds nothing worth remembering
+        self.active = True
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key(self, x, y, split):
+        """Lookup key of the product of x and y split at split, for get and put
+
+        Ints don't cache their hash and hashing is linear in their size, so
+        the operands are hashed once here and entries are keyed on that hash.
+        """
+        if x > y:
+            x, y = y, x
+        return hash((x, y, split)), x, y
+
+    def get(self, key):
+        """The cached product for key, or None"""
+        h, x, y = key
+        entry = self.entries.get(h)
+        # Two pairs with one hash share the slot; the operands tell them apart
+        if entry is None or entry[0] != x or entry[1] != y:
+            self.misses += 1
+            if self.misses == PROBE_LOOKUPS and self.hits < MIN_HIT_RATE * (self.hits + self.misses):
+                self.active = False
+                self.clear()
+            return None
+        self.entries.move_to_end(h)
+        self.hits += 1
+        return entry[2]
+
+    def put(self, key, product):
+        h, x, y = key
+        size = (x.bit_length() + y.bit_length() + product.bit_length()) // 8 + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        old = self.entries.pop(h, None)
+        if old is not None:
+            self.nbytes -= old[3]
+        self.entries[h] = (x, y, product, size)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            evicted = self.entries.popitem(last=False)[1]
+            self.nbytes -= evicted[3]
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        return {"memo_hits": self.hits, "memo_misses": self.misses,
+                "memo_evictions": self.evictions, "memo_entries": len(self.entries),
+                "memo_bytes": self.nbytes, "memo_active": self.active}
@@ -0,0 +1,940 @@
+"""Run with: python -m unittest test_engine"""
+import asyncio
+import json
+import math
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from decimal_io import to_decimal
+from dynamic_closest import DynamicClosestPair
+from engine import DivideConquerEngine, RunCancelled, RunMonitor, detect_algorithm, run_file
+import fast_multiply
+import grid_engine
+from multiply_stream import multiply_lines
+import nd_engine
+import parallel
+import point_io
+from point_io import (file_preview, load_points, load_points_binary, load_points_text,
+                      save_points_binary)
+import point_store
+from point_store import PointMatrix, PointStore
+from profiler import RecursionProfile
+import render
+from render import PointView, density_ppm
+from replay import CHECKPOINT_EVERY, EventLog, ReplayState
+from result_cache import ResultCache
+import service
+from service import ComputeService, http_request, parse_points_body, start_server
+from spatial_index import KDTree
+from subproduct_cache import SubproductCache
+from tracing import DEPTH, Tracer
+
+
+def brute_force(points):
+    """Smallest distance between two of points, by comparing every pair"""
+    return min((math.dist(p, q) for i, p in enumerate(points) for q in points[i + 1:]),
+               default=math.inf)
+
+
+def point_cases(seed):
+    """(name, points) of random and degenerate 2-D inputs"""
+    rng = random.Random(seed)
+    yield "random", [(rng.uniform(0, 1000), rng.uniform(0, 1000)) for _ in range(600)]
+    yield "duplicates", [(float(rng.randrange(8)), float(rng.randrange(8))) for _ in range(300)]
+    yield "vertical line", [(5.0, rng.uniform(0, 100)) for _ in range(200)]
+    yield "horizontal line", [(rng.uniform(0, 100), 5.0) for _ in range(200)]
+    yield "diagonal", [(t, 2 * t + 1) for t in (rng.uniform(0, 100) for _ in range(200))]
+    for n in range(4):
+        yield f"{n} points", [(rng.random(), rng.random()) for _ in range(n)]
+
+
+def baseline_closest(points):
+    """(distance, pair, comparisons) of the original slicing recursion"""
+    comparisons = 0
+
+    def brute(pts):
+        nonlocal comparisons
+        best, pair = math.inf, None
+        for i in range(len(pts)):
+            for j in range(i + 1, len(pts)):
+                comparisons += 1
+                d = math.dist(pts[i], pts[j])
+                if d < best:
+                    best, pair = d, (pts[i], pts[j])
+        return best, pair
+
+    def recurse(pts):
+        nonlocal comparisons
+        if len(pts) <= 3:
+            return brute(pts)
+        mid = len(pts) // 2
+        dleft, pair_left = recurse(pts[:mid])
+        dright, pair_right = recurse(pts[mid:])
+        d = min(dleft, dright)
+        pair = pair_left if dleft < dright else pair_right
+        strip = sorted((p for p in pts if abs(p[0] - pts[mid][0]) < d), key=lambda p: p[1])
+        for i in range(len(strip)):
+            for j in range(i + 1, min(i + 7, len(strip))):
+                comparisons += 1
+                dist = math.dist(strip[i], strip[j])
+                if dist < d:
+                    d, pair = dist, (strip[i], strip[j])
+        return d, pair
+
+    d, pair = recurse(sorted(points, key=lambda p: p[0]))
+    return d, pair, comparisons
+
+
+class ClosestPairTest(unittest.TestCase):
+    def test_matches_baseline(self):
+        # The traced recursion and the index-range recursion both report the
+        # original pair and comparison count
+        for name, points in point_cases(2):
+            with self.subTest(name):
+                dist, pair, comparisons = baseline_closest(points)
+                for trace in (True, False):
+                    engine = DivideConquerEngine(trace=trace)
+                    got_dist, got_pair = engine.closest_pair(points)
+                    self.assertEqual(engine.last_engine, "recursive" if trace else "fast")
+                    self.assertEqual(got_pair, pair)
+                    self.assertEqual(engine.comparisons, comparisons)
+                    self.assertAlmostEqual(got_dist, dist)
+                    self.assertAlmostEqual(got_dist, brute_force(points))
+                    if pair is None:
+                        self.assertIsNone(engine.last_pair_indices)
+                    else:
+                        i, j = engine.last_pair_indices
+                        self.assertEqual((points[i], points[j]), pair)
+
+    def test_large_input_in_place(self):
+        # Past LIST_COLUMNS_MAX the recursion reads the memoryviews directly
+        rng = random.Random(3)
+        points = [(rng.random(), rng.random()) for _ in range(400)]
+        engine = DivideConquerEngine(trace=False)
+        engine.LIST_COLUMNS_MAX = 10
+        dist, pair, comparisons = baseline_closest(points)
+        got_dist, got_pair = engine.closest_pair(points)
+        self.assertEqual(got_pair, pair)
+        self.assertAlmostEqual(got_dist, dist)
+        self.assertEqual(engine.comparisons, comparisons)
+
+
+class GridEngineTest(unittest.TestCase):
+    def check(self, points, dist, indices):
+        self.assertAlmostEqual(dist, brute_force(points))
+        if len(points) < 2:
+            self.assertIsNone(indices)
+        else:
+            i, j = indices
+            self.assertNotEqual(i, j)
+            self.assertAlmostEqual(math.dist(points[i], points[j]), dist)
+
+    def test_matches_brute_force(self):
+        for name, points in point_cases(3):
+            for seed in range(3):
+                with self.subTest(name, seed=seed):
+                    dist, indices, _ = grid_engine.closest_pair_indices(points, seed)
+                    self.check(points, dist, indices)
+                    # Without NumPy, or when the sweep gives up
+                    store = PointStore.from_points(points)
+                    if len(points) >= 2:
+                        dist, indices, _ = grid_engine._closest_pair_hashing(
+                            list(store.xs), list(store.ys), seed)
+                        self.check(points, dist, indices)
+
+    def test_sweep_fallback(self):
+        _, points = next(point_cases(4))
+        with mock.patch.object(grid_engine, "MAX_SWEEP_OFFSETS", 0):
+            dist, indices, comparisons = grid_engine.closest_pair_indices(points)
+        self.check(points, dist, indices)
+        self.assertGreater(comparisons, 0)
+
+    def test_engine_selection(self):
+        _, points = next(point_cases(5))
+        engine = DivideConquerEngine(trace=False, grid_threshold=100)
+        dist, pair = engine.closest_pair(points)
+        self.assertIn(engine.last_engine, ("numpy-sweep", "grid-hash"))
+        self.check(points, dist, engine.last_pair_indices)
+        self.assertEqual(pair, tuple(points[i] for i in engine.last_pair_indices))
+        # Recording a replay needs the recursion
+        engine.events = EventLog()
+        engine.closest_pair(points)
+        self.assertEqual(engine.last_engine, "fast")
+
+
+class ParallelClosestPairTest(unittest.TestCase):
+    def test_matches_baseline(self):
+        # Slabs are the serial subtrees, so pair and count are the serial ones
+        for name, points in point_cases(10):
+            with self.subTest(name):
+                dist, pair, comparisons = baseline_closest(points)
+                got_dist, indices, got_comparisons = parallel.closest_pair_parallel(points, 2)
+                self.assertAlmostEqual(got_dist, dist)
+                self.assertEqual(got_comparisons, comparisons)
+                if pair is None:
+                    self.assertIsNone(indices)
+                else:
+                    self.assertEqual((points[indices[0]], points[indices[1]]), pair)
+
+    def test_engine_selection(self):
+        _, points = next(point_cases(11))
+        engine = DivideConquerEngine(trace=False, workers=2)
+        with mock.patch.object(parallel, "PARALLEL_MIN_POINTS", 100):
+            dist, pair = engine.closest_pair(points)
+        self.assertEqual(engine.last_engine, "parallel-2")
+        self.assertEqual(engine.comparisons, baseline_closest(points)[2])
+        self.assertAlmostEqual(dist, brute_force(points))
+
+    def test_cancel(self):
+        _, points = next(point_cases(12))
+        monitor = RunMonitor()
+        monitor.cancel()
+        with self.assertRaises(RunCancelled):
+            parallel.closest_pair_parallel(points, 2, monitor)
+
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def write(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def test_run_file(self):
+        cache = ResultCache()
+        path = self.write("closest_a.txt", "0 0\n3 4\n10 10\n")
+        first = run_file(path, "closest", cache=cache)
+        self.assertFalse(first["cached"])
+        second = run_file(path, "closest", cache=cache)
+        self.assertTrue(second["cached"])
+        for key in ("pair", "indices", "distance", "operations", "engine"):
+            self.assertEqual(second[key], first[key])
+        # Keyed on the contents, not the name
+        copy = self.write("closest_b.txt", "0 0\n3 4\n10 10\n")
+        self.assertTrue(run_file(copy, "closest", cache=cache)["cached"])
+        changed = self.write("closest_a.txt", "0 0\n3 4\n10 11\n")
+        self.assertFalse(run_file(changed, "closest", cache=cache)["cached"])
+        # Traced runs always recompute
+        self.assertNotIn("cached", run_file(path, "closest", trace=True, cache=cache))
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+    def test_memory_lru(self):
+        cache = ResultCache(max_entries=2)
+        for key in "abc":
+            cache.put(key, {"value": key})
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), {"value": "b"})
+        cache.put("d", {"value": "d"})
+        self.assertIsNone(cache.get("c"))
+        self.assertEqual(cache.get("b"), {"value": "b"})
+
+    def test_disk_store(self):
+        disk = os.path.join(self.dir, "cache")
+        ResultCache(disk_dir=disk).put("a", {"value": 1})
+        cache = ResultCache(disk_dir=disk)
+        self.assertEqual(cache.get("a"), {"value": 1})
+        # Entries past the size cap are evicted, least recently used first
+        cache = ResultCache(disk_dir=disk, disk_limit_bytes=100)
+        for k in range(10):
+            cache.put(f"k{k}", {"value": "x" * 20})
+        size = sum(entry.stat().st_size for entry in os.scandir(disk))
+        self.assertLessEqual(size, 100)
+        self.assertEqual(ResultCache(disk_dir=disk).get("k9"), {"value": "x" * 20})
+
+
+class KDTreeTest(unittest.TestCase):
+    def assertDistances(self, got, expected):
+        self.assertEqual(len(got), len(expected))
+        for a, b in zip(got, expected):
+            self.assertAlmostEqual(a, b)
+
+    def test_queries_match_brute_force(self):
+        # Radii fall between the distances of the integer-grid cases
+        for name, points in point_cases(13):
+            points = points[:200]
+            n = len(points)
+            tree = KDTree(points, leaf_size=4)
+            all_pairs = sorted((math.dist(points[i], points[j]), i, j)
+                               for i in range(n) for j in range(i + 1, n))
+            rng = random.Random(n)
+            with self.subTest(name):
+                for q in points[:5] + [(rng.uniform(-10, 110), rng.uniform(-10, 110))]:
+                    found = tree.knn(*q, 5)
+                    self.assertDistances([d for d, _ in found],
+                                         sorted(math.dist(q, p) for p in points)[:5])
+                    self.assertDistances([d for d, _ in found], [math.dist(q, points[i]) for _, i in found])
+                    self.assertEqual(sorted(tree.within(*q, 2.5)),
+                                     [i for i, p in enumerate(points) if math.dist(q, p) <= 2.5])
+                pairs = tree.closest_pairs(10)
+                self.assertDistances([d for d, _, _ in pairs], [d for d, _, _ in all_pairs[:10]])
+                for d, i, j in pairs:
+                    self.assertLess(i, j)
+                    self.assertAlmostEqual(math.dist(points[i], points[j]), d)
+                within = tree.pairs_within(1.5)
+                self.assertEqual(sorted((i, j) for _, i, j in within),
+                                 sorted((i, j) for d, i, j in all_pairs if d <= 1.5))
+                self.assertEqual(within, sorted(within))
+                for i, nn in enumerate(tree.all_nearest_neighbors()):
+                    if n < 2:
+                        self.assertIsNone(nn)
+                    else:
+                        self.assertAlmostEqual(nn[0], min(math.dist(points[i], p)
+                                                          for j, p in enumerate(points) if j != i))
+
+    def test_closest_pair_agrees(self):
+        _, points = next(point_cases(14))
+        dist, pair = DivideConquerEngine(trace=False).closest_pair(points)
+        self.assertAlmostEqual(KDTree(points).closest_pairs(1)[0][0], dist)
+
+
+class DynamicClosestPairTest(unittest.TestCase):
+    def check(self, dynamic):
+        points, _ = dynamic.snapshot()
+        dist, pair = dynamic.closest()
+        self.assertAlmostEqual(dist, brute_force(points))
+        if len(dynamic) < 2:
+            self.assertIsNone(pair)
+        else:
+            a, b = pair
+            self.assertLess(a, b)
+            self.assertAlmostEqual(math.dist(dynamic.point(a), dynamic.point(b)), dist)
+
+    def test_updates_match_brute_force(self):
+        for name, points in point_cases(14):
+            points = points[:150]
+            rng = random.Random(len(points))
+            with self.subTest(name):
+                dynamic = DynamicClosestPair(points[:len(points) // 2])
+                self.check(dynamic)
+                for p in points[len(points) // 2:]:
+                    dynamic.insert(*p)
+                    self.check(dynamic)
+                    if rng.random() < 0.4:
+                        dynamic.delete(rng.choice(dynamic.snapshot()[1]))
+                        self.check(dynamic)
+                # Down to nothing, then back up
+                for pid in list(dynamic.snapshot()[1]):
+                    dynamic.delete(pid)
+                    self.check(dynamic)
+                for p in points[:5]:
+                    dynamic.insert(*p)
+                    self.check(dynamic)
+
+    def test_deleting_the_closest_pair(self):
+        rng = random.Random(15)
+        dynamic = DynamicClosestPair((rng.random(), rng.random()) for _ in range(300))
+        while len(dynamic) > 1:
+            dynamic.delete(dynamic.closest()[1][0])
+            self.check(dynamic)
+
+
+def operand_cases(seed):
+    """(x, y) pairs of mixed sizes, signs and bit patterns"""
+    rng = random.Random(seed)
+    yield 0, 12345
+    yield 1, -1
+    yield -(1 << 5000), (1 << 5000) - 1
+    yield (1 << 20000) - 1, (1 << 20000) - 1  # All ones, squared
+    for bits_x, bits_y in ((3000, 3000), (20000, 20000), (50000, 1200), (777, 65536)):
+        x = rng.getrandbits(bits_x) | 1 << (bits_x - 1)
+        y = rng.getrandbits(bits_y) | 1 << (bits_y - 1)
+        yield x, -y
+        yield -x, -y
+
+
+class FastMultiplyTest(unittest.TestCase):
+    def test_toom3(self):
+        for x, y in operand_cases(15):
+            for cutoff in (64, 1024):
+                with self.subTest(bits=(x.bit_length(), y.bit_length()), cutoff=cutoff):
+                    product, _ = fast_multiply.toom3_multiply(x, y, cutoff)
+                    self.assertEqual(product, x * y)
+
+    def test_ntt(self):
+        for x, y in operand_cases(16):
+            with self.subTest(bits=(x.bit_length(), y.bit_length())):
+                product, stats = fast_multiply.ntt_multiply(x, y)
+                self.assertEqual(product, x * y)
+                self.assertEqual(stats["pointwise_products"], stats["transform_length"])
+
+    def test_engine_selection(self):
+        x, y = (1 << 40000) - 3, (1 << 39000) + 7
+        for thresholds, name in (({"toom3_bits": 1 << 30, "ntt_bits": 1 << 30}, "karatsuba-binary"),
+                                 ({"toom3_bits": 1 << 12, "ntt_bits": 1 << 30}, "toom3"),
+                                 ({"toom3_bits": 1 << 12, "ntt_bits": 1 << 14}, "ntt")):
+            engine = DivideConquerEngine(trace=False, multiply_thresholds=thresholds)
+            self.assertEqual(engine.multiply(x, y), x * y)
+            self.assertEqual(engine.last_engine, name)
+
+    def test_thresholds_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "thresholds.json")
+            self.assertEqual(fast_multiply.load_thresholds(path), fast_multiply.DEFAULT_THRESHOLDS)
+            fast_multiply.save_thresholds({"toom3_bits": 4096, "ntt_bits": None}, path)
+            self.assertEqual(fast_multiply.load_thresholds(path),
+                             {"toom3_bits": 4096, "ntt_bits": math.inf})
+
+
+class ProfileTest(unittest.TestCase):
+    def test_closest_pair_levels(self):
+        _, points = next(point_cases(17))
+        dist, pair, comparisons = baseline_closest(points)
+        engine = DivideConquerEngine(trace=False)
+        engine.profile = RecursionProfile()
+        self.assertEqual(engine.closest_pair(points)[1], pair)
+        self.assertEqual(engine.comparisons, comparisons)
+        rows = engine.profile.rows()
+        self.assertEqual([row["depth"] for row in rows], list(range(len(rows))))
+        self.assertEqual((rows[0]["calls"], rows[0]["size_max"]), (1, len(points)))
+        # Every point is in exactly one base case
+        base_points = sum(size for name, _, _, _, size, _ in engine.profile.events
+                          if name == "closest base")
+        self.assertEqual(base_points, len(points))
+        self.assertIsNotNone(rows[0]["strip_avg"])
+        self.assertIn("points", engine.profile.format_table())
+
+    def test_multiply_levels(self):
+        x, y = (1 << 70000) - 1, (1 << 69000) + 12345
+        engine = DivideConquerEngine(trace=False, multiply_thresholds={"toom3_bits": 1 << 30,
+                                                                       "ntt_bits": 1 << 30})
+        engine.profile = RecursionProfile()
+        self.assertEqual(engine.multiply(x, y), x * y)
+        self.assertEqual(engine.profile.unit, "bits")
+        self.assertGreater(len(engine.profile.rows()), 1)
+        self.assertEqual(sum(row["calls"] for row in engine.profile.rows()),
+                         len(engine.profile.events))
+
+    def test_chrome_trace(self):
+        profile = RecursionProfile(max_events=3)
+        for k in range(5):
+            profile.node("closest", k % 2, 10, profile.origin + k, profile.origin + k + 0.5, strip=2)
+        self.assertEqual(profile.dropped, 2)
+        self.assertEqual(profile.rows()[0]["calls"], 3)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.json")
+            profile.save_chrome_trace(path)
+            with open(path, encoding="utf-8") as f:
+                trace = json.load(f)
+        events = trace["traceEvents"]
+        self.assertEqual(len(events), 3)
+        self.assertEqual(events[1]["ts"], 1e6)
+        self.assertEqual(events[1]["dur"], 0.5e6)
+        self.assertEqual(events[1]["args"], {"depth": 1, "points": 10, "strip": 2})
+        self.assertEqual(trace["otherData"]["dropped_events"], 2)
+
+    def test_run_file(self):
+        path = os.path.join(os.path.dirname(__file__), "closetpair1.txt")
+        result = run_file(path, "closest", profile=RecursionProfile())
+        self.assertEqual(result["profile"][0]["size_max"], result["points"])
+
+
+class PointStoreTest(unittest.TestCase):
+    def layouts(self, points):
+        # The NumPy columns, and the array('d') ones used without NumPy
+        yield "numpy", PointStore.from_points(points)
+        with mock.patch.object(point_store, "np", None):
+            yield "array", PointStore.from_points(points)
+
+    def test_layouts(self):
+        for name, points in point_cases(19):
+            for layout, store in self.layouts(points):
+                with self.subTest(name, layout=layout):
+                    self.assertEqual(len(store), len(points))
+                    self.assertEqual(list(store), points)
+                    if points:
+                        self.assertEqual(store[len(points) - 1], points[-1])
+                    xs, ys, order = store.sorted_columns()
+                    expected = sorted(range(len(points)), key=lambda i: points[i][0])
+                    self.assertEqual(list(order), expected)
+                    self.assertEqual(list(zip(xs, ys)), [points[i] for i in expected])
+                    self.assertIs(store.sorted_columns(), store.sorted_columns())
+                    self.assertEqual(store.nbytes, 36 * len(points))
+                    flat = [c for p in points for c in p]
+                    self.assertEqual(list(PointStore.from_flat(flat)), points)
+
+    def test_engines_read_both_layouts(self):
+        _, points = next(point_cases(20))
+        dist, pair, comparisons = baseline_closest(points)
+        for layout, store in self.layouts(points):
+            for grid_threshold in (None, 100):
+                with self.subTest(layout, grid_threshold=grid_threshold):
+                    engine = DivideConquerEngine(trace=False, grid_threshold=grid_threshold)
+                    got_dist, got_pair = engine.closest_pair(store)
+                    self.assertAlmostEqual(got_dist, dist)
+                    if grid_threshold is None:
+                        self.assertEqual(got_pair, pair)
+                        self.assertEqual(engine.comparisons, comparisons)
+
+    def test_odd_coordinates(self):
+        with self.assertRaises(ValueError):
+            PointStore.from_flat([1.0, 2.0, 3.0])
+
+    def test_binary_round_trip(self):
+        _, points = next(point_cases(21))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "points.pts")
+            for layout, store in self.layouts(points):
+                save_points_binary(path, store)
+                self.assertEqual(list(load_points(path)), points)
+                self.assertEqual(file_preview(path)[2], len(points))
+            save_points_binary(path, [])
+            self.assertEqual(len(load_points_binary(path)), 0)
+            with self.assertRaises(ValueError):
+                save_points_binary(path, PointMatrix.from_points([(1.0, 2.0, 3.0)]))
+
+
+def nd_point_cases(seed):
+    """(name, points) of random and degenerate d-dimensional inputs"""
+    rng = random.Random(seed)
+    for dims in (3, 5, 8, 20):
+        yield f"random {dims}-D", [tuple(rng.uniform(0, 100) for _ in range(dims)) for _ in range(300)]
+    yield "duplicates", [tuple(float(rng.randrange(4)) for _ in range(3)) for _ in range(200)]
+    direction = [rng.uniform(-1, 1) for _ in range(4)]
+    yield "collinear", [tuple(t * c for c in direction) for t in (rng.uniform(0, 50) for _ in range(200))]
+    yield "flat", [(rng.uniform(0, 100), 7.0, rng.uniform(0, 100)) for _ in range(200)]
+    for n in range(4):
+        yield f"{n} points", [tuple(rng.random() for _ in range(4)) for _ in range(n)]
+
+
+class NdEngineTest(unittest.TestCase):
+    def check(self, points, result):
+        dist, indices, _ = result
+        self.assertAlmostEqual(dist, brute_force(points))
+        if len(points) < 2:
+            self.assertIsNone(indices)
+        else:
+            i, j = indices
+            self.assertLess(i, j)
+            self.assertAlmostEqual(math.dist(points[i], points[j]), dist)
+
+    def test_matches_brute_force(self):
+        for name, points in nd_point_cases(22):
+            with self.subTest(name):
+                self.check(points, nd_engine.closest_pair_nd(points))
+                # Pure Python grid, and matrix product tiles for every cell pair
+                with mock.patch.object(nd_engine, "HAVE_NUMPY", False):
+                    self.check(points, nd_engine.closest_pair_nd(points))
+                with mock.patch.object(nd_engine, "TILE_MIN_PAIRS", 1):
+                    self.check(points, nd_engine.closest_pair_nd(points))
+
+    def test_engine(self):
+        _, points = next(nd_point_cases(23))
+        engine = DivideConquerEngine(trace=True)
+        dist, pair = engine.closest_pair(points)
+        self.assertIn(engine.last_engine, ("nd-grid", "nd-grid-hash"))
+        self.assertAlmostEqual(dist, brute_force(points))
+        self.assertEqual(pair, tuple(points[i] for i in engine.last_pair_indices))
+        # Two coordinates stay on the 2-D engines
+        engine.closest_pair([p[:2] for p in points])
+        self.assertEqual(engine.last_engine, "recursive")
+
+    def test_point_matrix(self):
+        points = [(0.0, 5.0, 1.0), (10.0, 5.5, -1.0), (3.0, 5.0, 4.0)]
+        matrix = PointMatrix.from_points(points)
+        self.assertEqual((len(matrix), matrix.dims, list(matrix)), (3, 3, points))
+        self.assertEqual(matrix.spans(), [10.0, 0.5, 5.0])
+        self.assertEqual(matrix.widest_axes(), [0, 2])
+        self.assertEqual(list(matrix.projection()), [(p[0], p[2]) for p in points])
+        flat = [c for p in points for c in p]
+        self.assertEqual(list(PointMatrix.from_flat(flat, 3)), points)
+        with self.assertRaises(ValueError):
+            PointMatrix.from_flat(flat, 4)
+        with self.assertRaises(ValueError):
+            PointMatrix.from_points([(1.0, 2.0, 3.0), (1.0, 2.0)])
+
+
+class RenderTest(unittest.TestCase):
+    def views(self, points):
+        # The NumPy path and the array('f') one used without NumPy
+        yield "numpy", PointView(points)
+        with mock.patch.object(render, "np", None), mock.patch.object(point_store, "np", None):
+            yield "array", PointView(points)
+
+    def test_visible_points(self):
+        for name, points in point_cases(8):
+            if not points:
+                continue
+            for layout, view in self.views(points):
+                for scale in (0.5, 1.0, 3.0):
+                    with self.subTest(name, layout=layout, scale=scale):
+                        indices, sx, sy = view.visible(600, 400, scale)
+                        expected = []
+                        for i, p in enumerate(points):
+                            px, py = view.scale_point(*p, 600, 400, scale)
+                            # float32 coordinates: points right on an edge may go either way
+                            if 1e-3 < px < 600 - 1e-3 and 1e-3 < py < 400 - 1e-3:
+                                expected.append(i)
+                                self.assertAlmostEqual(view.unscale_point(px, py, 600, 400, scale)[0],
+                                                       p[0], delta=1e-9 * (1 + abs(p[0])))
+                        self.assertTrue(set(expected) <= set(map(int, indices)))
+                        for i, x, y in zip(indices, sx, sy):
+                            px, py = view.scale_point(*points[i], 600, 400, scale)
+                            self.assertAlmostEqual(float(x), px, delta=1e-3)
+                            self.assertAlmostEqual(float(y), py, delta=1e-3)
+                        if scale == 1.0:
+                            self.assertEqual(len(indices), len(points))
+
+    def test_density(self):
+        rng = random.Random(8)
+        sx = [rng.uniform(0, 40) for _ in range(500)] + [5.5] * 100
+        sy = [rng.uniform(0, 30) for _ in range(500)] + [7.5] * 100
+        images = [density_ppm(sx, sy, 40, 30)]
+        with mock.patch.object(render, "np", None):
+            images.append(density_ppm(sx, sy, 40, 30))
+        header = b"P6 40 30 255\n"
+        for image in images:
+            self.assertTrue(image.startswith(header))
+            self.assertEqual(len(image), len(header) + 40 * 30 * 3)
+            pixels = image[len(header):]
+            self.assertEqual(pixels[3 * (7 * 40 + 5) + 1], 255)  # Densest pixel
+            self.assertEqual(pixels[0::3], bytes(40 * 30))  # No red
+        self.assertEqual(images[0], images[1])
+        self.assertEqual(density_ppm([], [], 4, 3)[len(b"P6 4 3 255\n"):], bytes(36))
+
+
+class TracedMultiplyTest(unittest.TestCase):
+    # Well past Python's 4300-digit str()/int() limit
+    BITS = 17000
+
+    def operands(self):
+        rng = random.Random(18)
+        return rng.getrandbits(self.BITS) | 1 << (self.BITS - 1), rng.getrandbits(self.BITS)
+
+    def test_trace_lines(self):
+        x, y = self.operands()
+        engine = DivideConquerEngine(trace=True)
+        self.assertEqual(engine.multiply(x, y), x * y)
+        lines = engine.steps
+        self.assertTrue(any("Result:" in line for line in lines))
+        # Operands are abbreviated, never written out in full
+        self.assertLess(max(map(len, lines)), 1000)
+
+    # The top levels carry the largest operands; tracing only those keeps
+    # the next tests quick
+    def test_streamed_trace(self):
+        x, y = self.operands()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "steps.txt")
+            engine = DivideConquerEngine(tracer=Tracer(DEPTH, max_depth=2, buffer_size=0,
+                                                    stream_path=path))
+            self.assertEqual(engine.multiply(x, y), x * y)
+            engine.tracer.close()
+            with open(path, encoding="utf-8") as f:
+                self.assertIn("Result:", f.read())
+
+    def test_run_file(self):
+        x, y = self.operands()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "integer_big.txt")
+            with open(path, "w") as f:
+                f.write(f"{to_decimal(x)}\n{to_decimal(y)}\n")
+            result = run_file(path, "integer", trace=True, tracer=Tracer(DEPTH, max_depth=2))
+        self.assertTrue(result["correct"])
+        self.assertEqual(result["product"], to_decimal(x * y))
+        self.assertTrue(result["steps"])
+
+
+class MemoStatsTest(unittest.TestCase):
+    def operands(self):
+        block = int("1122334455" * 40)
+        return block * (10 ** 400 + 1), block * (10 ** 800 + 1)
+
+    def multiply_stats(self, workers=1):
+        x, y = self.operands()
+        engine = DivideConquerEngine(trace=False, workers=workers, multiply_thresholds={
+            "toom3_bits": 1 << 30, "ntt_bits": 1 << 30})
+        engine.memo = SubproductCache()
+        self.assertEqual(engine.multiply(x, y), x * y)
+        return engine.last_engine, engine.multiply_stats
+
+    def test_karatsuba_reports_memo(self):
+        name, stats = self.multiply_stats()
+        self.assertEqual(name, "karatsuba-binary")
+        self.assertIn("memo_hits", stats)
+
+    def test_parallel_does_not(self):
+        # The workers multiply without the memo
+        with mock.patch.object(parallel, "PARALLEL_MIN_BITS", 0):
+            name, stats = self.multiply_stats(workers=2)
+        self.assertEqual(name, "karatsuba-parallel-2")
+        self.assertNotIn("memo_hits", stats)
+
+    def test_products_with_memo(self):
+        x, y = self.operands()
+        for memo in (SubproductCache(), SubproductCache(max_bytes=4096)):
+            engine = DivideConquerEngine(trace=False)
+            engine.memo = memo
+            self.assertEqual(engine.karatsuba_binary(x, y), x * y)
+            self.assertEqual(engine.karatsuba_multiply(x, y, 0), x * y)
+            self.assertGreater(memo.hits, 0)
+            self.assertLessEqual(memo.nbytes, memo.max_bytes)
+        self.assertGreater(memo.evictions, 0)
+
+    def test_random_operands_turn_it_off(self):
+        rng = random.Random(23)
+        engine = DivideConquerEngine(trace=False, karatsuba_cutoff=32)
+        engine.memo = SubproductCache()
+        x, y = rng.getrandbits(1 << 15), rng.getrandbits(1 << 15)
+        self.assertEqual(engine.karatsuba_binary(x, y), x * y)
+        self.assertFalse(engine.memo.active)
+        self.assertEqual((len(engine.memo), engine.memo.nbytes), (0, 0))
+
+
+class MultiplyStreamTest(unittest.TestCase):
+    def test_prefixed_digits(self):
+        out, digits, errors = multiply_lines(["0xff 0b101", "-0o17, +12"])
+        self.assertEqual(out, ["1275", "-180"])
+        self.assertEqual((digits, errors), (2 + 3 + 2 + 2, 0))
+
+
+class PointFileTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        rng = random.Random(22)
+        self.points = [tuple(round(rng.uniform(0, 100), 3) for _ in range(6)) for _ in range(400)]
+
+    def write(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def test_multi_pair_lines_are_2d(self):
+        # Pairs wrapped two or three to a line, past the first 4 KiB too
+        coords = [f"{c}" for p in self.points for c in p]
+        for per_line in (4, 6):
+            text = "".join(" ".join(coords[k:k + per_line]) + "\n"
+                           for k in range(0, len(coords), per_line))
+            path = self.write(f"pairs{per_line}.txt", text)
+            points = load_points(path)
+            self.assertIsInstance(points, PointStore)
+            self.assertEqual(len(points), len(coords) // 2)
+            self.assertEqual(detect_algorithm(path), "closest")
+            result = run_file(path, "closest")
+            self.assertEqual(result["dims"], 2)
+            self.assertAlmostEqual(result["distance"], brute_force(list(points)))
+
+    def test_dims_header(self):
+        text = "# dims 3\n" + "".join(f"{p[0]} {p[1]} {p[2]}\n" for p in self.points)
+        path = self.write("points3.txt", text)
+        points = load_points(path)
+        self.assertIsInstance(points, PointMatrix)
+        self.assertEqual(list(points), [p[:3] for p in self.points])
+        self.assertEqual(detect_algorithm(path), "closest")
+        result = run_file(path, "closest")
+        self.assertEqual(result["dims"], 3)
+        self.assertAlmostEqual(result["distance"], brute_force([p[:3] for p in self.points]))
+        self.assertIsInstance(parse_points_body(text.encode(), "text/plain"), PointMatrix)
+
+    def test_preview_count(self):
+        texts = ["1 2\n\n3 4\n\n\n", "1 2 3 4\n5 6", "  1\t2\r\n3   4 \n", "",
+                 "# dims 3\n1 2 3\n4 5 6\n"]
+        paths = [self.write(f"preview{k}.txt", text) for k, text in enumerate(texts)]
+        paths.append(os.path.join(os.path.dirname(__file__), "closetpair1.txt"))
+        for path in paths:
+            expected = len(load_points(path))
+            self.assertEqual(file_preview(path)[2], expected)
+            # Tokens split across read chunks are counted once
+            with mock.patch.object(point_io, "CHUNK_BYTES", 3):
+                self.assertEqual(file_preview(path)[2], expected)
+
+    def test_chunked_parse(self):
+        text = "".join(f"{p[0]} {p[1]}\n\n\n" for p in self.points)
+        path = self.write("chunks.txt", text)
+        expected = [p[:2] for p in self.points]
+        for chunk_bytes in (5, 64, 1 << 20):
+            self.assertEqual(list(load_points_text(path, chunk_bytes)), expected)
+        path = self.write("bad.txt", "1 2\n3 x\n")
+        with self.assertRaises(ValueError):
+            load_points_text(path)
+
+    def test_bad_dims(self):
+        path = self.write("points4.txt", "# dims 4\n1 2 3 4\n5 6 7\n")
+        with self.assertRaises(ValueError):
+            load_points(path)
+        path = self.write("bad_header.txt", "# dims three\n1 2 3\n")
+        with self.assertRaises(ValueError):
+            load_points(path)
+        self.assertIsNone(detect_algorithm(path))
+
+
+class ServiceTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.service = ComputeService(jobs=1)
+        self.server = await start_server(self.service, port=0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.service.close()
+        await self.server.wait_closed()
+
+    async def raw_status(self, data):
+        # Status of the response to raw request bytes; the server must answer
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        try:
+            writer.write(data)
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), 10)
+            return int(line.split()[1])
+        finally:
+            writer.close()
+
+    async def request(self, method, path, body=b"", content_type="application/json"):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        try:
+            return await http_request(reader, writer, method, path, body, content_type)
+        finally:
+            writer.close()
+
+    async def test_closest(self):
+        _, points = next(point_cases(21))
+        dist, pair, comparisons = baseline_closest(points)
+        json_body = json.dumps({"points": points}).encode()
+        text_body = "\n".join(f"{x!r} {y!r}" for x, y in points).encode()
+        for body, content_type in ((json_body, "application/json"), (text_body, "text/plain")):
+            status, result = await self.request("POST", "/closest", body, content_type)
+            self.assertEqual(status, 200)
+            self.assertEqual(result["points"], len(points))
+            self.assertAlmostEqual(result["distance"], dist)
+            self.assertEqual([tuple(p) for p in result["pair"]], list(pair))
+            self.assertEqual(result["operations"], comparisons)
+        status, result = await self.request("POST", "/closest", b"# dims 3\n0 0 0 5 5 5 0 0 2",
+                                            "text/plain")
+        self.assertEqual((status, result["dims"], result["distance"]), (200, 3, 2.0))
+
+    async def test_multiply(self):
+        x, y = 3 ** 5000, -(7 ** 3000)
+        body = json.dumps({"x": str(x), "y": hex(y)}).encode()
+        status, result = await self.request("POST", "/multiply", body)
+        self.assertEqual((status, result["product"]), (200, to_decimal(x * y)))
+        status, result = await self.request("POST", "/multiply", b"0b101, 12", "text/plain")
+        self.assertEqual((status, result["product"]), (200, "60"))
+        status, stats = await self.request("GET", "/stats")
+        self.assertEqual(status, 200)
+        self.assertEqual(stats["multiply"]["completed"], 2)
+
+    async def test_bad_requests(self):
+        cases = [("POST", "/closest", b"{not json", "application/json", 400),
+                 ("POST", "/closest", b'{"points": [[0, 0], [1]]}', "application/json", 400),
+                 ("POST", "/closest", b'{"points": [[0, 0], [NaN, 1]]}', "application/json", 400),
+                 ("POST", "/closest", b"0 0 1", "text/plain", 400),
+                 ("POST", "/closest", b"0 0 x 1", "text/plain", 400),
+                 ("POST", "/closest", b"0 0", "text/plain", 400),
+                 ("POST", "/closest", b"# dims 3\n0 0 0 1", "text/plain", 400),
+                 ("POST", "/multiply", b"12", "text/plain", 400),
+                 ("POST", "/multiply", b'{"x": "1.5", "y": "2"}', "application/json", 400),
+                 ("GET", "/closest", b"", "text/plain", 405),
+                 ("POST", "/stats", b"", "text/plain", 405),
+                 ("GET", "/nowhere", b"", "text/plain", 404)]
+        for method, path, body, content_type, expected in cases:
+            with self.subTest(body=body, path=path):
+                status, result = await self.request(method, path, body, content_type)
+                self.assertEqual(status, expected)
+                self.assertIn("error", result)
+        for length in (b"abc", b"-5", str(service.MAX_BODY_BYTES + 1).encode()):
+            with self.subTest(length=length):
+                status = await self.raw_status(b"POST /closest HTTP/1.1\r\nContent-Length: " + length
+                                               + b"\r\n\r\n")
+                self.assertEqual(status, 413 if length[:1].isdigit() else 400)
+
+    async def test_overlong_lines(self):
+        long = b"x" * (1 << 17)
+        self.assertEqual(await self.raw_status(b"GET /" + long + b" HTTP/1.1\r\n\r\n"), 400)
+        self.assertEqual(await self.raw_status(b"GET /stats HTTP/1.1\r\nX-Long: " + long + b"\r\n\r\n"),
+                         431)
+        headers = b"".join(b"X-%d: 1\r\n" % k for k in range(service.MAX_HEADERS + 1))
+        self.assertEqual(await self.raw_status(b"GET /stats HTTP/1.1\r\n" + headers + b"\r\n"), 431)
+
+
+class ReplaySeekTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(20)
+        points = [(rng.random(), rng.random()) for _ in range(3000)]
+        engine = DivideConquerEngine(trace=False)
+        engine.events = EventLog()
+        engine.closest_pair(points)
+        self.log = engine.events
+        self.assertGreater(len(self.log.checkpoints), 1)
+
+    def assertSameState(self, state, expected):
+        self.assertEqual(state.pos, expected.pos)
+        self.assertEqual(state.event, expected.event)
+        self.assertEqual(state.best, expected.best)
+        self.assertEqual(state.compare, expected.compare)
+
+    def test_final_state(self):
+        # Traced and index-range recursions record the same log, and its
+        # end holds the distance the engine returned
+        for name, points in point_cases(24):
+            with self.subTest(name):
+                logs = []
+                for trace in (True, False):
+                    engine = DivideConquerEngine(trace=trace)
+                    engine.events = EventLog()
+                    dist, pair = engine.closest_pair(points)
+                    logs.append(engine.events)
+                self.assertEqual(logs[0].words, logs[1].words)
+                log = logs[1]
+                state = ReplayState(log)
+                rng = random.Random(len(points))
+                for pos in [rng.randrange(len(log) + 1) for _ in range(5)] + [len(log)]:
+                    state.seek(pos)
+                self.assertTrue(state.finished)
+                self.assertEqual(state.stack, [])
+                if pair is None:
+                    self.assertIsNone(state.best)
+                    continue
+                # Ties may leave another pair at the same distance
+                xs, ys, _ = PointStore.from_points(points).sorted_columns()
+                i, j, best = state.best
+                self.assertAlmostEqual(best, dist)
+                self.assertAlmostEqual(math.dist((xs[i], ys[i]), (xs[j], ys[j])), dist)
+
+    def test_truncated_log(self):
+        engine = DivideConquerEngine(trace=False)
+        engine.events = EventLog(max_words=500)
+        engine.closest_pair(next(point_cases(25))[1])
+        log = engine.events
+        self.assertTrue(log.truncated)
+        self.assertLessEqual(len(log.words), 500)
+        state = ReplayState(log)
+        while not state.finished:
+            self.assertGreater(state.advance(7), 0)
+        state.seek(len(log) // 2)
+        self.assertEqual(state.pos, len(log) // 2)
+
+    def test_seek_matches_stepping(self):
+        # Seeks that land on checkpoints, and ones that skip through runs
+        targets = set(self.log.checkpoint_steps)
+        targets.update(range(1, len(self.log), CHECKPOINT_EVERY // 3))
+        stepped = ReplayState(self.log)
+        seeked = ReplayState(self.log)
+        for pos in sorted(targets):
+            while stepped.pos < pos:
+                stepped.advance(1)
+            seeked.seek(pos)
+            self.assertSameState(seeked, stepped)
+
+    def test_batched_advance(self):
+        stepped = ReplayState(self.log)
+        batched = ReplayState(self.log)
+        while not batched.finished:
+            batched.advance(37)
+            while stepped.pos < batched.pos:
+                stepped.advance(1)
+            self.assertSameState(batched, stepped)
+
+
+if __name__ == "__main__":
+    unittest.main()
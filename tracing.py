@@ -0,0 +1,75 @@
+"""Step tracing for the divide & conquer engine
+
+Steps are recorded as (depth, template, args) and only turned into text when
+something reads them, so a disabled or filtered level costs a single
+comparison on the hot path. Templates use str.format syntax and may refer to
+{indent}, which expands to two spaces per recursion depth.
+"""
+from collections import deque
+from itertools import islice
+
+# Trace levels
+OFF = 0       # record nothing
+SUMMARY = 1   # headers and final results only
+DEPTH = 2     # recursion steps down to max_depth
+FULL = 3      # every recursion step
+
+LEVEL_NAMES = {"off": OFF, "summary": SUMMARY, "depth": DEPTH, "full": FULL}
+
+
+class Tracer:
+    def __init__(self, level=FULL, max_depth=3, buffer_size=None, stream_path=None):
+        self.level = level
+        self.max_depth = max_depth
+        # With a buffer_size only the most recent steps are kept in memory
+        self.buffer = deque(maxlen=buffer_size)
+        self.total = 0
+        self.stream = open(stream_path, "w", encoding="utf-8") if stream_path else None
+
+    def enabled(self, depth=0):
+        """True if steps at this recursion depth should be recorded"""
+        return self.level == FULL or (self.level == DEPTH and depth <= self.max_depth)
+
+    def summary(self, template, *args):
+        if self.level >= SUMMARY:
+            self._record(0, template, args)
+
+    def step(self, depth, template, *args):
+        # Callers check enabled(depth) first so the arguments are never
+        # computed for a filtered step
+        self._record(depth, template, args)
+
+    def _record(self, depth, template, args):
+        entry = (depth, template, args)
+        self.buffer.append(entry)
+        self.total += 1
+        if self.stream is not None:
+            self.stream.write(self.format(entry))
+            self.stream.write("\n")
+
+    @staticmethod
+    def format(entry):
+        depth, template, args = entry
+        return template.format(*args, indent="  " * depth)
+
+    @property
+    def dropped(self):
+        """Number of steps that fell out of the bounded buffer"""
+        return self.total - len(self.buffer)
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def lines(self, start=0, count=None):
+        """Formatted steps from the in-memory buffer, optionally one page of them"""
+        stop = None if count is None else start + count
+        return [self.format(entry) for entry in islice(self.buffer, start, stop)]
+
+    def clear(self):
+        self.buffer.clear()
+        self.total = 0
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None